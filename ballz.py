@@ -1,9 +1,11 @@
 import os
 import pygame
 import sys
-import random
 import math
 import time
+from engine.output import OutputWorker
+from engine.balls import BallArray
+from engine.dirty import DirtyRects
 
 
 pygame.init()
@@ -27,35 +29,39 @@ rect_height = 400
 rect_x = (screen_width - rect_width) // 2
 rect_y = (screen_height - rect_height) // 2
 
-# Classe pour reprÃƒÂ©senter une balle
-class Ball:
-    def __init__(self, x, y, radius, color, speed_x, speed_y):
-        self.x = x
-        self.y = y
-        self.radius = radius
-        self.color = color
-        self.speed_x = speed_x
-        self.speed_y = speed_y
+# Toutes les balles dans des tableaux NumPy (x, y, vitesse, rayon, couleur)
+balls = BallArray()
+rect = (rect_x, rect_y, rect_width, rect_height)
 
+# Nombre maximal de paires de balles en collision traitées par image
+max_collision_pairs = 1 << 16
 
-# Initialisation de la premiÃƒÂ¨re balle
-main_ball = Ball(rect_x + rect_width//2,
-                 rect_y + rect_height//2,
-                 10,
-                 (255,0,0),
-                 0.5, 0.5)
+# Initialisation de la première balle
+balls.add(rect_x + rect_width//2,
+          rect_y + rect_height//2,
+          10,
+          (255,0,0),
+          0.5, 0.5)
 
+# Chargement du son de rebond
+bounce_sound = pygame.mixer.Sound("sounds/bubble.wav")
 
-# Liste pour stocker les balles
-balls = [main_ball]
+# Les sons sont joués sur un thread de sortie, la boucle ne fait que les mettre en file
+audio_output = OutputWorker()
 
-# Chargement du son de rebond
-bounce_sound = pygame.mixer.Sound("bubble.wav")
+# Fond statique (rectangles compris) : seule la zone couverte par les balles est redessinée,
+# enabled=False redessine et rafraîchit toute la fenêtre à chaque image
+dirty = DirtyRects(screen, enabled=True)
+screen.fill((0, 0, 0))
+pygame.draw.rect(screen, (255, 255, 255), (rect_x, rect_y, rect_width, rect_height), 1)  # Dessiner le rectangle
+pygame.draw.rect(screen, (255, 255, 255), (rect_x - 5, rect_y - 5, rect_width + 10, rect_height + 10), 5)  # Dessiner le rectangle
+dirty.capture()
 
 # Boucle principale
 while True:
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
+            audio_output.stop()
             pygame.quit()
 
         if event.type == pygame.KEYDOWN and event.key == pygame.K_q:
@@ -63,42 +69,29 @@ while True:
 
     if animation_started:
         # Mise Ãƒ  jour de la position de chaque balle
-        for ball in balls:
-            ball.x += ball.speed_x
-            ball.y += ball.speed_y
-
-        # Rebondissement sur les bords du rectangle
-        for ball in balls:
-            if ball.x - ball.radius < rect_x or ball.x + ball.radius > rect_x + rect_width:
-                ball.speed_x = -ball.speed_x
-                bounce_sound.play()  # Jouer le son de rebond
-                speedy = random.uniform(-1, 1)
-                speedx = random.uniform(-1, 1)
-                new_ball = Ball(random.randint(rect_x + ball.radius, rect_x + rect_width - ball.radius), random.randint(rect_y + ball.radius, rect_y + rect_height - ball.radius), 10,
-                                (random.randint(0, 255), random.randint(0, 255), random.randint(0, 255)), speedx, speedy)
-                balls.append(new_ball)
-
-            if ball.y - ball.radius < rect_y or ball.y + ball.radius > rect_y + rect_height:
-                ball.speed_y = -ball.speed_y
-                bounce_sound.play()  # Jouer le son de rebond
-                speedx = random.uniform(-1, 1)
-                speedy = random.uniform(-1, 1)
-                new_ball = Ball(random.randint(rect_x + ball.radius, rect_x + rect_width - ball.radius), random.randint(rect_y + ball.radius, rect_y + rect_height - ball.radius), 10,
-                                (random.randint(0, 255), random.randint(0, 255), random.randint(0, 255)), speedx, speedy)
-                balls.append(new_ball)
+        balls.move()
 
-        # RafraÃƒÂ®chissement de l'ÃƒÂ©cran
-        screen.fill((0, 0, 0))
-        pygame.draw.rect(screen, (255, 255, 255), (rect_x, rect_y, rect_width, rect_height), 1)  # Dessiner le rectangle
-        pygame.draw.rect(screen, (255, 255, 255), (rect_x - 5, rect_y - 5, rect_width + 10, rect_height + 10), 5)  # Dessiner le rectangle
+        # Collisions entre balles, limitées à max_collision_pairs paires par image : une fois
+        # la boîte pleine, les paires en trop attendent l'image suivante
+        balls.collide(bounds=rect, max_pairs=max_collision_pairs)
 
+        # Rebondissement sur les bords du rectangle, une nouvelle balle par rebond
+        hits = balls.reflect(rect)
+        if hits:
+            audio_output.play(bounce_sound)  # Jouer le son de rebond
+            balls.spawn(hits, rect, 10)
+
+        # RafraÃƒÂ®chissement de l'ÃƒÂ©cran
+        dirty.begin()
+        dirty.mark(balls.bounds())
 
         # Dessiner chaque balle
-        for ball in balls:
-            pygame.draw.circle(screen, ball.color, (ball.x, ball.y), ball.radius)
+        pixels = pygame.surfarray.pixels2d(screen)
+        balls.stamp(pixels, screen.get_shifts())
+        del pixels  # Libérer la surface avant flip()
 
         # Mettre Ãƒ  jour l'affichage
-        pygame.display.flip()
+        dirty.present()
 
         # ContrÃƒÂ´ler la frÃƒÂ©quence de rafraÃƒÂ®chissement de l'ÃƒÂ©cran
         clock.tick(60)
\ No newline at end of file
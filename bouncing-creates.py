@@ -3,7 +3,13 @@ import sys
 import math
 import random
 import pygame.midi
-from mido import MidiFile
+from engine.notes import NoteSequence
+from engine.output import OutputWorker
+from engine.voices import NoteScheduler
+from engine.arc_cache import ArcCache
+from engine.broadphase import resolve_collisions
+from engine.tails import TailCache
+from engine.text import TextCache
 
 # Initialize Pygame
 pygame.init()
@@ -12,6 +18,10 @@ output_device_id = 0
 midi_output = pygame.midi.Output(output_device_id)
 midi_output.set_instrument(38)
 
+# MIDI notes are sent from a background thread
+audio_output = OutputWorker(midi_output)
+note_scheduler = NoteScheduler(audio_output)
+
 # Screen dimensions
 WIDTH, HEIGHT = 800, 800
 screen = pygame.display.set_mode((WIDTH, HEIGHT))
@@ -27,30 +37,15 @@ big_ball_center = (WIDTH // 2, HEIGHT // 2)
 gravity = pygame.Vector2(0, 0.25)
 
 # Load MIDI file
-midi_file = MidiFile("midi/faded.mid")
-midi_iterator = iter(midi_file)
+note_sequence = NoteSequence.load("midi/faded.mid")
+note_cursor = note_sequence.cursor()
 
 # Font initialization
 font = pygame.font.Font(None, 36)
+text_cache = TextCache()
 
-class Particle:
-    def __init__(self, position, velocity, color, lifespan):
-        self.position = pygame.Vector2(position)
-        self.velocity = pygame.Vector2(velocity)
-        self.color = color
-        self.lifespan = lifespan
-
-    def update(self):
-        self.position += self.velocity
-        self.lifespan -= 2
-        if self.lifespan < 0:
-            self.lifespan = 0
-
-    def draw(self, screen):
-        if self.lifespan > 0:
-            alpha = int(255 * (self.lifespan / 50))
-            color = self.color + (alpha,)
-            pygame.draw.circle(screen, color, (int(self.position.x), int(self.position.y)), 3)
+# Faded tail sprites for MiniBall.draw_tail
+tail_cache = TailCache()
 
 class MiniBall:
     def __init__(self, color, initial_position, radius, velocity):
@@ -76,13 +71,7 @@ class MiniBall:
             self.tail.pop(0)
 
     def draw_tail(self, screen):
-        tail_length = len(self.tail)
-        for i in range(tail_length):
-            alpha = int(255 * (i / tail_length))  # Fading effect
-            tail_color = (*self.color[:3], alpha)
-            tail_surface = pygame.Surface((2 * self.radius, 2 * self.radius), pygame.SRCALPHA)
-            pygame.draw.circle(tail_surface, tail_color, (self.radius, self.radius), self.radius)
-            screen.blit(tail_surface, (self.tail[i].x - self.radius, self.tail[i].y - self.radius))
+        tail_cache.draw(screen, "circle", self.radius, self.color, self.tail)
 
     def check_collision(self, mask, rect):
         mini_ball_rect = self.image.get_rect(center=(int(self.position.x), int(self.position.y)))
@@ -90,21 +79,12 @@ class MiniBall:
         return mask.overlap(self.mask, offset) is not None
 
     def play_collision_note(self):
-        global midi_iterator
-        msg = next(midi_iterator, None)
-        while msg and msg.type != "note_on":
-            msg = next(midi_iterator, None)
-
-        if msg is None:
-            midi_iterator = iter(midi_file)
-            msg = next(midi_iterator, None)
-            while msg and msg.type != "note_on":
-                msg = next(midi_iterator, None)
+        msg = note_cursor.next()
 
         if msg:
             velocity = 100  # Volume (0-127)
             pitch = msg.note + 14  # Transpose up one octave
-            midi_output.note_on(pitch, velocity)
+            note_scheduler.note_on(pitch, velocity, msg.duration)
 
     def bounce(self, normal):
         self.position = self.prevPos.copy()
@@ -120,25 +100,15 @@ class MiniBall:
         pygame.draw.circle(screen, WHITE, (self.position.x, self.position.y), self.radius, 3)
 
 def drawText(text, font, color, surface, x, y, size=36, alpha=255):
-    font = pygame.font.Font(None, size)
-    textobj = font.render(text, True, color)
-    textobj.set_alpha(alpha)
-    textrect = textobj.get_rect()
-    textrect.center = (x, y)
-    surface.blit(textobj, textrect)
+    text_cache.draw(surface, text, size, color, (x, y), alpha)
+
+# Spinning arcs only visit a fixed set of angles, reuse the rasterized ones
+arc_cache = ArcCache()
 
 # Create the ball mask with an arc and a customizable gap
 def create_ball_mask(radius, color, arc_width=10, start_angle=0.5, end_angle=2 * math.pi):
-    inner_radius = radius - arc_width // 2
     outer_radius = radius + arc_width // 2
-
-    mask_image = pygame.Surface((2 * outer_radius, 2 * outer_radius), pygame.SRCALPHA)
-    rect = mask_image.get_rect()
-    pygame.draw.arc(mask_image, color, rect, start_angle, end_angle, arc_width)
-
-    mask = pygame.mask.from_surface(mask_image)
-
-    return mask, mask_image
+    return arc_cache.get(outer_radius, color, arc_width, start_angle, end_angle)
 
 # Main loop
 clock = pygame.time.Clock()
@@ -152,7 +122,6 @@ colorDir = 1
 
 # Start with one mini ball
 mini_balls = [MiniBall((color.r, color.g, color.b), (WIDTH / 2 - 10, HEIGHT / 2 - 90), radius=15, velocity=[-4, -4])]
-particles = []
 
 running = False
 
@@ -162,9 +131,12 @@ angle_increment = 0.01
 
 while True:
     clock.tick(60)
+    note_scheduler.update()
 
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
+            note_scheduler.flush()
+            audio_output.stop()
             pygame.quit()
             midi_output.close()
             sys.exit(0)
@@ -199,6 +171,9 @@ while True:
                 mini_ball.bounce(normal)
                 mini_ball.play_collision_note()
 
+        # Mini balls knock each other around as well as the big ball
+        resolve_collisions(mini_balls)
+
         # Check if any ball is out of bounds and handle spawning
         out_of_bounds_balls = [mini_ball for mini_ball in mini_balls if mini_ball.position.x < 0 or mini_ball.position.x > WIDTH or mini_ball.position.y < 0 or mini_ball.position.y > HEIGHT]
         if out_of_bounds_balls:
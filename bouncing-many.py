@@ -1,9 +1,14 @@
 import math
 import pygame
 import pygame.midi
-from mido import MidiFile
+from engine.notes import NoteSequence
+from engine.output import OutputWorker
+from engine.voices import NoteScheduler
 import time
 import random
+from engine.broadphase import resolve_collisions
+from engine.swept import circle_in_circle_impact, sweep
+from engine.particles import ParticlePool
 
 width = 800  # Screen width
 height = 800  # Screen height
@@ -21,38 +26,23 @@ midi_output = pygame.midi.Output(pygame.midi.get_default_output_id())
 
 midi_output.set_instrument(38)
 
+# MIDI notes and sound effects are sent from a background thread
+audio_output = OutputWorker(midi_output)
+note_scheduler = NoteScheduler(audio_output)
+
 clock = pygame.time.Clock()
 
 screen = pygame.display.set_mode((width, height))
 screen.fill(screen_color)
 
 # MIDI file
-midi_file = MidiFile("midi/kerosene12.mid")
+note_sequence = NoteSequence.load("midi/kerosene12.mid")
 
 # Font initialization
 font = pygame.font.Font(None, 36)
 
 eat_sound = pygame.mixer.Sound("sounds/yeppe.mp3")
 
-class Particle:
-    def __init__(self, position, velocity, color, lifespan):
-        self.position = pygame.Vector2(position)
-        self.velocity = pygame.Vector2(velocity)
-        self.color = color
-        self.lifespan = lifespan
-
-    def update(self):
-        self.position += self.velocity
-        self.lifespan -= 2
-        if self.lifespan < 0:
-            self.lifespan = 0
-
-    def draw(self, screen):
-        if self.lifespan > 0:
-            alpha = int(255 * (self.lifespan / 50))
-            color = self.color + (alpha,)
-            pygame.draw.circle(screen, color, (int(self.position.x), int(self.position.y)), 3)
-
 class VoidBall:
     def __init__(self, radius):
         self.radius = radius
@@ -81,16 +71,26 @@ class Ball:
         self.previous_positions = []
         self.max_tail_length = 5
         self.fade_rate = 20
-        self.note_iterator = iter(midi_file)
+        self.note_cursor = note_sequence.cursor()
         self.collided = False
         self.age = 147.7
 
     def update(self, main_circle_radius, particles):
         self.prevPos = pygame.Vector2(self.position.x, self.position.y)
 
-        # Movement
+        # Movement, swept through the whole step so a fast ball bounces where
+        # it actually reaches the wall instead of tunnelling through it
         self.velocity += self.gravity
-        self.position += self.velocity
+
+        def impact(position, displacement):
+            return circle_in_circle_impact(position, displacement, self.radius, (width / 2, height / 2), main_circle_radius + 2)
+
+        def bounce(position, velocity, normal):
+            return self.bounce(position, velocity, normal, main_circle_radius, particles)
+
+        position, velocity, bounces = sweep(self.position, self.velocity, impact, bounce)
+        self.position = pygame.Vector2(position)
+        self.velocity = pygame.Vector2(velocity)
 
         # Add the current position with a full alpha value to the previous positions list
         self.previous_positions.append((self.prevPos, 255))
@@ -98,76 +98,39 @@ class Ball:
             self.previous_positions.pop(0)
         self.previous_positions = [(pos, max(alpha - self.fade_rate, 0)) for pos, alpha in self.previous_positions]
 
-        dirToCenter = pygame.Vector2(
-            self.position.x - (width / 2), self.position.y - (height / 2)
-        )
-
-        if self.isCollide(main_circle_radius):
-            self.collided = True
-
-            # Play MIDI note upon collision
-            self.playCollisionNote()
-
-            # Calculate collision point on the main circle's edge
-            main_circle_center = pygame.Vector2(width / 2, height / 2)
-            collision_vector = pygame.Vector2(self.position) - main_circle_center
-            collision_vector.normalize_ip()
-            collision_point = main_circle_center + collision_vector * main_circle_radius
+        self.collided = bounces > 0
 
-            self.collisions.append((collision_point, self.color))
+    def bounce(self, position, velocity, normal, main_circle_radius, particles):
+        # Play MIDI note upon collision
+        self.playCollisionNote()
 
-            # Create particles at the collision point
-            self.createParticles(collision_point, particles)
+        # Calculate collision point on the main circle's edge
+        main_circle_center = pygame.Vector2(width / 2, height / 2)
+        collision_point = main_circle_center - pygame.Vector2(normal) * main_circle_radius
 
-            # Handle collision physics
-            self.position = pygame.Vector2(self.prevPos.x, self.prevPos.y)
-            v = math.sqrt(self.velocity.x * self.velocity.x + self.velocity.y * self.velocity.y)
-            angleToCollisionPoint = math.atan2(-dirToCenter.y, dirToCenter.x)
-            oldAngle = math.atan2(-self.velocity.y, self.velocity.x)
-            newAngle = 2 * angleToCollisionPoint - oldAngle
+        self.collisions.append((collision_point, self.color))
 
-            # Add randomness to the bounce
-            random_angle = random.uniform(-0.1, 0.1)
-            newAngle += random_angle
+        # Create particles at the collision point
+        self.createParticles(collision_point, particles)
 
-            self.velocity = pygame.Vector2(
-                -v * math.cos(newAngle), v * math.sin(newAngle)
-            )
+        # Reflect off the wall and add randomness to the bounce
+        velocity = pygame.Vector2(velocity).reflect(normal)
+        velocity.rotate_rad_ip(random.uniform(-0.1, 0.1))
 
-            # Speed up
-            self.velocity *= 1.05
+        # Speed up
+        velocity *= 1.05
 
-            self.counter += 1
-        else:
-            self.collided = False
+        self.counter += 1
+        return velocity
 
     def createParticles(self, collision_point, particles):
-        num_particles = 20
-        for _ in range(num_particles):
-            velocity = pygame.Vector2(random.uniform(-3, 3), random.uniform(-3, 3))
-            color = (random.randint(200, 255), random.randint(100, 255), random.randint(100, 255))
-            lifespan = random.randint(30, 50)
-            particles.append(Particle(collision_point, velocity, color, lifespan))
+        particles.emit(collision_point, 20, 3)
 
     def playCollisionNote(self):
-        msg = next(self.note_iterator, None)
-        while msg and msg.type != "note_on":
-            msg = next(self.note_iterator, None)
-
-        if msg is None:
-            self.note_iterator = iter(midi_file)
-            msg = next(self.note_iterator, None)
-            while msg and msg.type != "note_on":
-                msg = next(self.note_iterator, None)
+        msg = self.note_cursor.next()
 
         if msg:
-            midi_output.note_on(msg.note + 10, 50)
-
-    def isCollide(self, main_circle_radius):
-        return self.distance(self.position.x, self.position.y, width / 2, height / 2) > main_circle_radius - self.radius + 2
-
-    def distance(self, x1, y1, x2, y2):
-        return math.sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2)
+            note_scheduler.note_on(msg.note + 10, 50, msg.duration)
 
     def draw(self, screen):
         pygame.draw.circle(
@@ -194,7 +157,7 @@ balls = [main_ball]
 # Create the void
 void = VoidBall(40)
 
-particles = []
+particles = ParticlePool()
 
 running = False
 
@@ -202,9 +165,12 @@ counter_spawn = 3
 
 while True:
     clock.tick(60)
+    note_scheduler.update()
 
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
+            note_scheduler.flush()
+            audio_output.stop()
             pygame.quit()
             midi_output.close()
             exit(0)
@@ -238,18 +204,18 @@ while True:
             if void.eats(ball):
                 void.grow(1.5)
                 balls.remove(ball)
-                eat_sound.play()
+                audio_output.play(eat_sound)
+
+        # Balls knock each other around as well as the circle
+        resolve_collisions(balls)
 
         screen.fill(screen_color)  # Clear the screen
 
         for ball in balls:
             ball.draw(screen)
 
-        for particle in particles:
-            particle.update()
-            particle.draw(screen)
-
-        particles = [particle for particle in particles if particle.lifespan > 0]
+        particles.update()
+        particles.draw(screen)
 
         # Draw the main circle
         drawMainCircle(screen, (0, 0, 0), (width / 2, height / 2), main_circle_radius, 15)
@@ -1,9 +1,14 @@
 import math
 import pygame
 import pygame.midi
-from mido import MidiFile
+from engine.notes import NoteSequence
+from engine.output import OutputWorker
+from engine.voices import NoteScheduler
 import time
 import random
+from engine.tails import TailCache
+from engine.text import TextCache
+from engine.particles import ParticlePool
 
 # Initialize Pygame
 pygame.init()
@@ -12,6 +17,10 @@ output_device_id = 0
 midi_output = pygame.midi.Output(output_device_id)
 midi_output.set_instrument(10)
 
+# MIDI notes and sound effects are sent from a background thread
+audio_output = OutputWorker(midi_output)
+note_scheduler = NoteScheduler(audio_output)
+
 # Screen dimensions
 WIDTH, HEIGHT = 800, 800
 screen = pygame.display.set_mode((WIDTH, HEIGHT))
@@ -27,32 +36,17 @@ big_ball_center = (WIDTH // 2, HEIGHT // 2)
 gravity = pygame.Vector2(0, 1.03)
 
 # Load MIDI file
-midi_file = MidiFile("midi/kerosene12.mid")
-midi_iterator = iter(midi_file)
+note_sequence = NoteSequence.load("midi/kerosene12.mid")
+note_cursor = note_sequence.cursor()
 
 sound = pygame.mixer.Sound("sounds/nom.wav")
 
 # Font initialization
 font = pygame.font.Font(None, 36)
+text_cache = TextCache()
 
-class Particle:
-    def __init__(self, position, velocity, color, lifespan):
-        self.position = pygame.Vector2(position)
-        self.velocity = pygame.Vector2(velocity)
-        self.color = color
-        self.lifespan = lifespan
-
-    def update(self):
-        self.position += self.velocity
-        self.lifespan -= 2
-        if self.lifespan < 0:
-            self.lifespan = 0
-
-    def draw(self, screen):
-        if self.lifespan > 0:
-            alpha = int(255 * (self.lifespan / 50))
-            color = self.color + (alpha,)
-            pygame.draw.circle(screen, color, (int(self.position.x), int(self.position.y)), 3)
+# Faded tail sprites for MiniBall.draw_tail
+tail_cache = TailCache()
 
 class SmallBall:
     def __init__(self, main_circle_radius):
@@ -97,7 +91,7 @@ class MiniBall:
 
         # Check collision with the mini ball
         if self.isCollideMiniBall(mini_ball):
-            sound.play()
+            audio_output.play(sound)
             self.radius += 8
             mini_ball.position = mini_ball.random_position_within_circle(big_ball_radius)
 
@@ -132,21 +126,12 @@ class MiniBall:
         return math.sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2)
 
     def play_collision_note(self):
-        global midi_iterator
-        msg = next(midi_iterator, None)
-        while msg and msg.type != "note_on":
-            msg = next(midi_iterator, None)
-
-        if msg is None:
-            midi_iterator = iter(midi_file)
-            msg = next(midi_iterator, None)
-            while msg and msg.type != "note_on":
-                msg = next(midi_iterator, None)
+        msg = note_cursor.next()
 
         if msg:
             velocity = 100  # Volume (0-127)
             pitch = msg.note + 5  # Transpose up one octave
-            midi_output.note_on(pitch, velocity)
+            note_scheduler.note_on(pitch, velocity, msg.duration)
 
     def bounce(self, particles, normal):
         # Calculate the collision point
@@ -166,21 +151,10 @@ class MiniBall:
 
     def draw_tail(self, screen):
         if self.is_moving:
-            tail_length = len(self.tail)
-            for i in range(tail_length):
-                alpha = int(255 * (i / tail_length))  # Fading effect
-                tail_color = (*self.color[:3], alpha)
-                tail_surface = pygame.Surface((2 * self.radius, 2 * self.radius), pygame.SRCALPHA)
-                pygame.draw.circle(tail_surface, tail_color, (self.radius, self.radius), self.radius)
-                screen.blit(tail_surface, (self.tail[i].x - self.radius, self.tail[i].y - self.radius))
+            tail_cache.draw(screen, "circle", self.radius, self.color, self.tail)
 
     def createParticles(self, collision_point, particles):
-        num_particles = 20
-        for _ in range(num_particles):
-            velocity = pygame.Vector2(random.uniform(-3, 3), random.uniform(-3, 3))
-            color = (random.randint(200, 255), random.randint(100, 255), random.randint(100, 255))
-            lifespan = random.randint(30, 50)
-            particles.append(Particle(collision_point, velocity, color, lifespan))
+        particles.emit(collision_point, 20, 3)
 
     def update_color(self, h):
         self.color.hsla = (h, self.saturation, self.lightness, 100)
@@ -197,12 +171,7 @@ class MiniBall:
         pygame.draw.circle(screen, WHITE, (self.position.x, self.position.y), self.radius, 5)
 
 def drawText(text, font, color, surface, x, y, size=36, alpha=255):
-    font = pygame.font.Font(None, size)
-    textobj = font.render(text, True, color)
-    textobj.set_alpha(alpha)
-    textrect = textobj.get_rect()
-    textrect.center = (x, y)
-    surface.blit(textobj, textrect)
+    text_cache.draw(surface, text, size, color, (x, y), alpha)
 
 # Create the big ball mask with an arc and a customizable gap
 def create_big_ball_mask(radius, color, arc_width=10, start_angle=0.5, end_angle=2 * math.pi):
@@ -222,7 +191,7 @@ colorDir = 1
 
 # Create the main ball
 mini_balls = [MiniBall((color.r, color.g, color.b), (WIDTH / 2 -10, HEIGHT / 2 - 90), radius=20, velocity=[-4, -4], lifespan=random.uniform(1, 4))]
-particles = []
+particles = ParticlePool()
 
 eat_ball = SmallBall(big_ball_radius)
 
@@ -233,9 +202,12 @@ clock = pygame.time.Clock()
 
 while True:
     clock.tick(60)
+    note_scheduler.update()
 
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
+            note_scheduler.flush()
+            audio_output.stop()
             pygame.quit()
             midi_output.close()
             exit(0)
@@ -271,9 +243,7 @@ while True:
                 break
 
             # Update and draw particles
-            for particle in particles:
-                particle.update()
-            particles = [particle for particle in particles if particle.lifespan > 0]
+            particles.update()
 
             # Draw everything
             screen.fill(BLACK)
@@ -281,8 +251,7 @@ while True:
 
             for mini_ball in mini_balls:
                 mini_ball.draw(screen)
-            for particle in particles:
-                particle.draw(screen)
+            particles.draw(screen)
 
             eat_ball.draw(screen)
 
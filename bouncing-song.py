@@ -1,9 +1,13 @@
-import math
 import pygame
 import pygame.midi
-from mido import MidiFile
+from engine.notes import NoteSequence
+from engine.output import OutputWorker
+from engine.voices import NoteScheduler
 import time
 import random
+from engine.swept import circle_in_circle_impact, sweep
+from engine.fan import LineFan
+from engine.text import TextCache
 
 width = 900  # Screen width
 height = 900  # Screen height
@@ -19,6 +23,10 @@ midi_output = pygame.midi.Output(output_device_id)
 
 midi_output.set_instrument(38)
 
+# MIDI notes are sent from a background thread
+audio_output = OutputWorker(midi_output)
+note_scheduler = NoteScheduler(audio_output)
+
 clock = pygame.time.Clock()
 
 screen = pygame.display.set_mode((width, height))
@@ -27,10 +35,11 @@ ball_color = (255, 255, 255)
 screen.fill(screen_color)
 
 # MIDI file
-midi_file = MidiFile("midi/imbluee.mid")
+note_sequence = NoteSequence.load("midi/imbluee.mid")
 
 # Font initialization
 font = pygame.font.Font(None, 36)
+text_cache = TextCache()
 
 class Ball:
     def __init__(self, initial_position, initial_velocity, color):
@@ -41,10 +50,10 @@ class Ball:
         self.prevPos = pygame.Vector2(self.position.x, self.position.y)
         self.radius = 18
         self.counter = 0
-        self.collisions = []
+        self.collisions = LineFan(cap=1024)
 
         # MIDI note iterator
-        self.note_iterator = iter(midi_file)
+        self.note_cursor = note_sequence.cursor()
 
         # Collision flag
         self.collided = False
@@ -57,88 +66,57 @@ class Ball:
 
         self.color = color
 
-        # Movement
+        # Movement, swept through the whole step so a fast ball bounces where
+        # it actually reaches the wall instead of tunnelling through it
         self.velocity += self.gravity
-        self.position += self.velocity
-
-        dirToCenter = pygame.Vector2(
-            self.position.x - (width / 2), self.position.y - (height / 2)
-        )
-
-        if self.isCollide():
-            self.collided = True
 
-            # Play MIDI note upon collision
-            self.playCollisionNote()
+        def impact(position, displacement):
+            return circle_in_circle_impact(position, displacement, self.radius, (width / 2, height / 2), main_circle_width / 2 + 2)
 
-            self.radius += 1.5
+        position, velocity, bounces = sweep(self.position, self.velocity, impact, self.bounce)
+        self.position = pygame.Vector2(position)
+        self.velocity = pygame.Vector2(velocity)
+        self.collided = bounces > 0
 
-            # Calculate collision point on the main circle's edge
-            main_circle_center = pygame.Vector2(width / 2, height / 2)
-            main_circle_radius = main_circle_width / 2
-            collision_vector = pygame.Vector2(self.position) - main_circle_center
-            collision_vector.normalize_ip()
-            collision_point = main_circle_center + collision_vector * main_circle_radius
+    def bounce(self, position, velocity, normal):
+        # Play MIDI note upon collision
+        self.playCollisionNote()
 
-            self.collisions.append(collision_point)
+        self.radius += 1.5
 
-            # Handle collision physics
-            self.position = pygame.Vector2(self.prevPos.x, self.prevPos.y)
-            v = math.sqrt(self.velocity.x * self.velocity.x + self.velocity.y * self.velocity.y)
-            angleToCollisionPoint = math.atan2(-dirToCenter.y, dirToCenter.x)
-            oldAngle = math.atan2(-self.velocity.y, self.velocity.x)
-            newAngle = 2 * angleToCollisionPoint - oldAngle
+        # Calculate collision point on the main circle's edge
+        main_circle_center = pygame.Vector2(width / 2, height / 2)
+        main_circle_radius = main_circle_width / 2
+        collision_point = main_circle_center - pygame.Vector2(normal) * main_circle_radius
 
-            # Add randomness to the bounce
-            random_angle = random.uniform(-0.1, 0.1)
-            newAngle += random_angle
+        self.collisions.add(collision_point)
 
-            self.velocity = pygame.Vector2(
-                -v * math.cos(newAngle), v * math.sin(newAngle)
-            )
+        # Reflect off the wall and add randomness to the bounce
+        velocity = pygame.Vector2(velocity).reflect(normal)
+        velocity.rotate_rad_ip(random.uniform(-0.1, 0.1))
 
-            # Speed up
-            # self.velocity *= 1.01
+        # Speed up
+        # velocity *= 1.01
 
-            self.counter += 1
-        else:
-            self.collided = False
+        self.counter += 1
+        return velocity
 
     def playCollisionNote(self):
-        # Get the next MIDI message (note) from the midi_file iterator
-        msg = next(self.note_iterator, None)
-        while msg and msg.type != "note_on":
-            msg = next(self.note_iterator, None)
-
-        # If we have reached the end of the file, reset the iterator
-        if msg is None:
-            self.note_iterator = iter(midi_file)
-            msg = next(self.note_iterator, None)
-            while msg and msg.type != "note_on":
-                msg = next(self.note_iterator, None)
+        # Get the next note of the song, wrapping around at the end
+        msg = self.note_cursor.next()
 
         if msg:
             # Modify the velocity (volume)
             velocity = 100  # Change this value to adjust the volume (0-127)
             # Modify the pitch (note number)
             pitch = msg.note + 24  # Transpose up one octave
-            midi_output.note_on(pitch, velocity)
+            note_scheduler.note_on(pitch, velocity, msg.duration)
 
             # midi_output.note_on(msg.note, msg.velocity)
 
-    def isCollide(self):
-        main_circle_radius = main_circle_width / 2
-        if self.distance(self.position.x, self.position.y, (width / 2), (height / 2)) > ((main_circle_radius) - self.radius + 2):
-            return True
-        return False
-
-    def distance(self, x1, y1, x2, y2):
-        return math.sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2)
-
     def draw(self, screen):
         # Draw lines
-        for point in self.collisions:
-            pygame.draw.line(screen, color, (self.position.x, self.position.y), point)
+        self.collisions.draw(screen, color, self.position)
 
         pygame.draw.circle(
             screen,
@@ -148,12 +126,7 @@ class Ball:
         )
 
 def drawText(text, font, color, surface, x, y, size=36, alpha=255):
-    font = pygame.font.Font(None, size)
-    textobj = font.render(text, True, color)
-    textobj.set_alpha(alpha)
-    textrect = textobj.get_rect()
-    textrect.center = (x, y)
-    surface.blit(textobj, textrect)
+    text_cache.draw(surface, text, size, color, (x, y), alpha)
 
 def drawMainCircle(screen, color, coordinates, radius, width):
     # pygame.draw.circle(screen, color, coordinates, radius + 25, width)
@@ -173,9 +146,12 @@ running = False
 
 while True:
     clock.tick(60)
+    note_scheduler.update()
 
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
+            note_scheduler.flush()
+            audio_output.stop()
             pygame.quit()
             midi_output.close()
             exit(0)
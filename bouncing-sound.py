@@ -4,6 +4,9 @@ import pygame.midi
 from mido import MidiFile
 import time
 import random
+from engine.output import OutputWorker
+from engine.fan import LineFan
+from engine.text import TextCache
 
 width = 900  # Screen width
 height = 900  # Screen height
@@ -24,8 +27,12 @@ screen.fill((0, 0, 0))
 
 bounce_sound = pygame.mixer.Sound("bubble.wav")
 
+# Sounds play on a background thread, the frame only queues them
+audio_output = OutputWorker()
+
 # Font initialization
 font = pygame.font.Font(None, 36)
+text_cache = TextCache()
 
 class Ball:
     def __init__(self, initial_position, initial_velocity):
@@ -36,7 +43,7 @@ class Ball:
         self.prevPos = pygame.Vector2(self.position.x, self.position.y)
         self.radius = 18
         self.counter = 0
-        self.collisions = []
+        self.collisions = LineFan(cap=1024)
         # Collision flag
         self.collided = False
 
@@ -61,7 +68,7 @@ class Ball:
 
             # Play MIDI note upon collision
             # self.playCollisionNote()
-            bounce_sound.play()
+            audio_output.play(bounce_sound)
 
             self.radius += 1.3
 
@@ -72,7 +79,7 @@ class Ball:
             collision_vector.normalize_ip()
             collision_point = main_circle_center + collision_vector * main_circle_radius
 
-            self.collisions.append(collision_point)
+            self.collisions.add(collision_point)
 
             # Handle collision physics
             self.position = pygame.Vector2(self.prevPos.x, self.prevPos.y)
@@ -114,16 +121,10 @@ class Ball:
         )
 
         # Draw lines
-        for point in self.collisions:
-            pygame.draw.line(screen, color, (self.position.x, self.position.y), point)
+        self.collisions.draw(screen, color, self.position)
 
 def drawText(text, font, color, surface, x, y, size=36, alpha=255):
-    font = pygame.font.Font(None, size)
-    textobj = font.render(text, True, color)
-    textobj.set_alpha(alpha)
-    textrect = textobj.get_rect()
-    textrect.center = (x, y)
-    surface.blit(textobj, textrect)
+    text_cache.draw(surface, text, size, color, (x, y), alpha)
 
 def drawMainCircle(screen, color, coordinates, radius, width):
     # pygame.draw.circle(screen, color, coordinates, radius + 5, width)
@@ -146,6 +147,7 @@ while True:
 
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
+            audio_output.stop()
             pygame.quit()
             midi_output.close()
             exit(0)
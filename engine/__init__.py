@@ -0,0 +1,5 @@
+from engine.broadphase import collide, overlapping_pairs, resolve_collisions
+from engine.clock import FixedStep
+from engine.collision import RingSector
+from engine.core import Body, Event, Ring, World
+from engine.spatial import SpatialHash
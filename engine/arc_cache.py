@@ -0,0 +1,90 @@
+"""Cache of pre-rasterized arc images and masks for spinning rings.
+
+A ring spinning by a fixed angle_increment only ever visits a finite set of
+angles, so after one turn every frame can reuse an image drawn earlier.
+Entries are stored as 8-bit surfaces with a colour key: the geometry is
+rasterized once and the colour is applied through the palette, so hue-cycling
+rings keep hitting the cache.
+"""
+import math
+from collections import OrderedDict
+
+import pygame
+
+TAU = 2 * math.pi
+
+# Palette slots of the cached 8-bit surfaces
+TRANSPARENT = 0
+INK = 1
+
+
+class ArcCache:
+    # max_bytes should cover a full turn of every ring sharing the cache, a
+    # cyclic access pattern larger than the budget misses on every lookup.
+    def __init__(self, max_bytes=256 * 1024 * 1024, angle_step=0.01):
+        self.max_bytes = max_bytes
+        self.angle_step = angle_step
+        self.steps = max(int(round(TAU / angle_step)), 1)
+        self.entries = OrderedDict()
+        self.used_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def quantize(self, start_angle, end_angle):
+        span = end_angle - start_angle
+        if span < 0:
+            span += TAU
+        start = int(round((start_angle % TAU) / self.angle_step)) % self.steps
+        return start, min(int(round(span / self.angle_step)), self.steps)
+
+    def get(self, radius, color, arc_width, start_angle, end_angle):
+        # Same return value as the scenes' create_ball_mask: (mask, image)
+        return self.get_arcs(radius, color, arc_width, [(start_angle, end_angle)])
+
+    def get_arcs(self, radius, color, arc_width, arcs):
+        # The image is shared between calls and recoloured on every lookup, so
+        # blit it before asking for the same arc in another colour.
+        key = (radius, arc_width, tuple(self.quantize(start, end) for start, end in arcs))
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            entry = self.rasterize(radius, arc_width, key[2])
+            self.entries[key] = entry
+            self.used_bytes += entry[2]
+            self.evict()
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+
+        mask, image, _ = entry
+        image.set_palette_at(INK, pygame.Color(color)[:3])
+        return mask, image
+
+    def rasterize(self, radius, arc_width, arcs):
+        image = pygame.Surface((2 * radius, 2 * radius), 0, 8)
+        image.set_palette([(0, 0, 0), (255, 255, 255)] + [(0, 0, 0)] * 254)
+        image.set_colorkey(TRANSPARENT)
+        image.fill(TRANSPARENT)
+        rect = image.get_rect()
+        for start, span in arcs:
+            start_angle = start * self.angle_step
+            # A full turn is closed exactly, steps * angle_step can fall just short of TAU
+            end_angle = start_angle + (TAU if span >= self.steps else span * self.angle_step)
+            pygame.draw.arc(image, (255, 255, 255), rect, start_angle, end_angle, arc_width)
+
+        mask = pygame.mask.from_surface(image)
+        size = image.get_pitch() * image.get_height() + (image.get_width() + 7) // 8 * image.get_height()
+        return mask, image, size
+
+    def evict(self):
+        # Drop least recently used entries, but always keep the newest one
+        while self.used_bytes > self.max_bytes and len(self.entries) > 1:
+            _, (_, _, size) = self.entries.popitem(last=False)
+            self.used_bytes -= size
+
+    def clear(self):
+        self.entries.clear()
+        self.used_bytes = 0
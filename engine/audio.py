@@ -0,0 +1,215 @@
+"""Offline audio tracks mixed from recorded simulation events.
+
+Live runs only ever play sound on the MIDI device or the mixer, so clip
+exports came out silent. AudioTrack is a World sink that records which sample
+each event triggers and on which frame, and render() mixes the whole track
+afterwards with NumPy, one slice add per hit, or one FFT convolution per
+sample when hits are dense enough for that to be cheaper. No audio device is
+involved and a minute with thousands of hits mixes in a fraction of a second.
+
+WAV files are read directly (integer PCM and float). Anything else, the mp3s
+in sounds/ for instance, is decoded through pygame.mixer, which is started on
+SDL's dummy driver when the machine has no sound card.
+"""
+import os
+import struct
+import wave
+
+import numpy as np
+
+# Format tags of the WAV "fmt " chunk
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+def read_wav(path):
+    # (samples, rate) with samples as float32 in [-1, 1], shaped (frames, channels)
+    with open(path, "rb") as file:
+        data = file.read()
+    if data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        raise ValueError(f"Not a WAV file: {path}")
+
+    fmt = None
+    frames = None
+    position = 12
+    while position + 8 <= len(data):
+        chunk, size = struct.unpack_from("<4sI", data, position)
+        body = data[position + 8:position + 8 + size]
+        if chunk == b"fmt ":
+            fmt = struct.unpack_from("<HHIIHH", body)
+            if fmt[0] == WAVE_FORMAT_EXTENSIBLE and len(body) >= 26:
+                fmt = (struct.unpack_from("<H", body, 24)[0],) + fmt[1:]
+        elif chunk == b"data":
+            frames = body
+        position += 8 + size + (size & 1)
+    if fmt is None or frames is None:
+        raise ValueError(f"WAV file without fmt or data chunk: {path}")
+
+    tag, channels, rate, _, block, bits = fmt
+    width = bits // 8
+    frames = frames[:len(frames) - len(frames) % block]
+    if tag == WAVE_FORMAT_IEEE_FLOAT:
+        samples = np.frombuffer(frames, dtype=f"<f{width}").astype(np.float32)
+    elif tag == WAVE_FORMAT_PCM and width == 1:
+        samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif tag == WAVE_FORMAT_PCM and width == 3:
+        raw = np.frombuffer(frames, dtype=np.uint8).reshape(-1, 3)
+        packed = raw[:, 0].astype(np.int32) | (raw[:, 1].astype(np.int32) << 8) | (raw[:, 2].astype(np.int32) << 16)
+        samples = ((packed << 8) >> 8).astype(np.float32) / (1 << 23)
+    elif tag == WAVE_FORMAT_PCM and width in (2, 4):
+        samples = np.frombuffer(frames, dtype=f"<i{width}").astype(np.float32) / (1 << (bits - 1))
+    else:
+        raise ValueError(f"Unsupported WAV encoding {tag} with {bits} bits: {path}")
+    return samples.reshape(-1, channels), rate
+
+
+def write_wav(path, samples, rate):
+    # float samples in [-1, 1], shaped (frames, channels), to 16-bit PCM
+    pcm = np.clip(np.rint(samples * 32767), -32768, 32767).astype("<i2")
+    with wave.open(path, "wb") as file:
+        file.setnchannels(pcm.shape[1])
+        file.setsampwidth(2)
+        file.setframerate(rate)
+        file.writeframes(pcm.tobytes())
+
+
+def decode(path, rate, channels):
+    # Anything SDL_mixer reads, at the rate and channel count asked for
+    import pygame
+
+    if not pygame.mixer.get_init():
+        try:
+            pygame.mixer.init(rate, -16, channels)
+        except pygame.error:
+            os.environ["SDL_AUDIODRIVER"] = "dummy"
+            pygame.mixer.init(rate, -16, channels)
+    mixer_rate, size, _ = pygame.mixer.get_init()
+    samples = pygame.sndarray.array(pygame.mixer.Sound(path)).astype(np.float32)
+    if samples.ndim == 1:
+        samples = samples[:, None]
+    return samples / (1 << (abs(size) - 1)), mixer_rate
+
+
+def convert(samples, rate, target_rate, channels):
+    # Linear resampling and mono/stereo conversion
+    if rate != target_rate and len(samples):
+        count = int(round(len(samples) * target_rate / rate))
+        source = np.arange(count) * (rate / target_rate)
+        positions = np.arange(len(samples))
+        samples = np.stack([np.interp(source, positions, column) for column in samples.T], axis=1)
+    if samples.shape[1] != channels:
+        if samples.shape[1] == 1:
+            samples = np.repeat(samples, channels, axis=1)
+        else:
+            samples = samples.mean(axis=1, keepdims=True).repeat(channels, axis=1)
+    return samples.astype(np.float32)
+
+
+class SampleBank:
+    # Decoded one-shot samples, converted to the track's rate and channels
+    def __init__(self, rate=44100, channels=2):
+        self.rate = rate
+        self.channels = channels
+        self.samples = {}
+
+    def get(self, path):
+        samples = self.samples.get(path)
+        if samples is None:
+            if path.lower().endswith(".wav"):
+                try:
+                    samples, rate = read_wav(path)
+                except ValueError:
+                    samples, rate = decode(path, self.rate, self.channels)
+            else:
+                samples, rate = decode(path, self.rate, self.channels)
+            samples = convert(samples, rate, self.rate, self.channels)
+            self.samples[path] = samples
+        return samples
+
+
+def mix(track, sample, offsets, gains):
+    # Add `sample` into `track` starting at every offset (in audio frames).
+    # Each hit is one slice add, which is the cheapest way for the usual
+    # handful of hits per second. When hits pile up so much that this costs
+    # more than a few FFTs of the whole track, the hits become one impulse
+    # train convolved with the sample instead.
+    length = len(track)
+    inside = (offsets >= 0) & (offsets < length)
+    offsets, gains = offsets[inside], gains[inside]
+    if len(offsets) == 0 or len(sample) == 0:
+        return
+    size = 1 << (length + len(sample) - 2).bit_length()  # Full convolution length, rounded up to a power of two
+    if len(offsets) * len(sample) * sample.shape[1] < 10 * size * size.bit_length():
+        for offset, gain in zip(offsets.tolist(), gains.tolist()):
+            part = sample[:length - offset]
+            track[offset:offset + len(part)] += gain * part
+        return
+
+    train = np.zeros(length)
+    np.add.at(train, offsets, gains)
+    spectrum = np.fft.rfft(train, size)
+    for channel in range(sample.shape[1]):
+        wet = np.fft.irfft(spectrum * np.fft.rfft(sample[:, channel], size), size)
+        track[:, channel] += wet[:length]
+
+
+class AudioTrack:
+    # World sink: `sounds` maps event kinds to sample paths, e.g.
+    # {"bounce": "sounds/bubble.wav", "escape": "sounds/explode.wav"}
+    def __init__(self, sounds=None, fps=60, rate=44100, channels=2, gain=1.0):
+        self.sounds = dict(sounds or {})
+        self.fps = fps
+        self.bank = SampleBank(rate, channels)
+        self.gain = gain
+        self.frames = []
+        self.paths = []
+        self.gains = []
+        self.last_frame = 0
+
+    def __len__(self):
+        return len(self.frames)
+
+    def handle(self, world, events):
+        self.last_frame = world.frame
+        for event in events:
+            path = self.sounds.get(event.kind)
+            if path is not None:
+                self.record(event.frame, path)
+
+    def record(self, frame, path, gain=1.0):
+        # Scenes without a World can call this directly with their frame count
+        self.frames.append(frame)
+        self.paths.append(path)
+        self.gains.append(gain)
+        self.last_frame = max(self.last_frame, frame)
+
+    def render(self, frames=None):
+        # The mixed track as float samples, `frames` video frames long (by
+        # default until the last recorded frame, plus the longest sample)
+        rate = self.bank.rate
+        hit_frames = np.asarray(self.frames, dtype=np.int64)
+        offsets = hit_frames * rate // self.fps
+        paths = np.asarray(self.paths, dtype=object)
+        gains = np.asarray(self.gains, dtype=np.float64) * self.gain
+        unique = sorted(set(self.paths))
+        samples = {path: self.bank.get(path) for path in unique}
+        if frames is None:
+            tail = max((len(sample) for sample in samples.values()), default=0)
+            length = self.last_frame * rate // self.fps + tail
+        else:
+            length = frames * rate // self.fps
+
+        track = np.zeros((length, self.bank.channels), dtype=np.float32)
+        for path in unique:
+            same = paths == path
+            mix(track, samples[path], offsets[same], gains[same].astype(np.float32))
+
+        # Pile-ups are scaled down as a whole rather than clipped
+        peak = np.abs(track).max(initial=0.0)
+        if peak > 1:
+            track /= peak
+        return track
+
+    def write(self, path, frames=None):
+        write_wav(path, self.render(frames), self.bank.rate)
@@ -0,0 +1,193 @@
+"""Structure-of-arrays ball store.
+
+Positions, velocities, radii and colours live in contiguous NumPy arrays so
+moving, bouncing and spawning are one vectorized operation per frame instead
+of a Python loop over Ball objects. Arrays are over-allocated and grow by
+doubling; only the first `count` rows are live.
+"""
+import numpy as np
+
+from engine.broadphase import MAX_PAIRS, grid_pairs
+
+
+class BallArray:
+    def __init__(self, capacity=1024, seed=None):
+        self.count = 0
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.vx = np.zeros(capacity)
+        self.vy = np.zeros(capacity)
+        self.radius = np.zeros(capacity, dtype=np.int32)
+        self.color = np.zeros((capacity, 3), dtype=np.uint8)
+        self.rng = np.random.default_rng(seed)
+        self.stamps = {}
+
+    def __len__(self):
+        return self.count
+
+    def reserve(self, count):
+        capacity = len(self.x)
+        if count <= capacity:
+            return
+        while capacity < count:
+            capacity *= 2
+        for name in ("x", "y", "vx", "vy", "radius", "color"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def add(self, x, y, radius, color, vx, vy):
+        self.reserve(self.count + 1)
+        i = self.count
+        self.x[i], self.y[i], self.vx[i], self.vy[i] = x, y, vx, vy
+        self.radius[i] = radius
+        self.color[i] = color
+        self.count += 1
+
+    def spawn(self, n, rect, radius, speed=1.0):
+        # Add n balls at random whole-pixel positions inside rect with random
+        # colours and velocities in [-speed, speed], like ballz.py's new_ball
+        if n <= 0:
+            return
+        left, top, width, height = rect
+        self.reserve(self.count + n)
+        live = slice(self.count, self.count + n)
+        self.x[live] = self.rng.integers(left + radius, left + width - radius, n, endpoint=True)
+        self.y[live] = self.rng.integers(top + radius, top + height - radius, n, endpoint=True)
+        self.vx[live] = self.rng.uniform(-speed, speed, n)
+        self.vy[live] = self.rng.uniform(-speed, speed, n)
+        self.radius[live] = radius
+        self.color[live] = self.rng.integers(0, 255, (n, 3), endpoint=True)
+        self.count += n
+
+    def move(self):
+        n = self.count
+        self.x[:n] += self.vx[:n]
+        self.y[:n] += self.vy[:n]
+
+    def reflect(self, rect):
+        # Flip the velocity of every ball touching a wall of rect and return
+        # how many wall hits there were (a corner counts twice)
+        n = self.count
+        left, top, width, height = rect
+        x, y, r = self.x[:n], self.y[:n], self.radius[:n]
+        hit_x = (x - r < left) | (x + r > left + width)
+        hit_y = (y - r < top) | (y + r > top + height)
+        self.vx[:n][hit_x] *= -1
+        self.vy[:n][hit_y] *= -1
+        return int(np.count_nonzero(hit_x)) + int(np.count_nonzero(hit_y))
+
+    def bounds(self):
+        # (left, top, width, height) covering every ball, None when empty
+        n = self.count
+        if n == 0:
+            return None
+        r = self.radius[:n]
+        left = int(np.floor((self.x[:n] - r).min())) - 1
+        top = int(np.floor((self.y[:n] - r).min())) - 1
+        right = int(np.ceil((self.x[:n] + r).max())) + 2
+        bottom = int(np.ceil((self.y[:n] + r).max())) + 2
+        return left, top, right - left, bottom - top
+
+    def collide(self, restitution=1.0, bounds=None, max_pairs=MAX_PAIRS):
+        # Vectorized version of engine.broadphase.resolve_collisions: pairs
+        # come from the uniform grid in grid_pairs, impulses for balls touching
+        # several others are accumulated with np.add.at. Each push apart is at
+        # most the smaller radius, and with `bounds` (left, top, width, height)
+        # the push never moves a ball into a wall, so separating a pile does
+        # not spawn wall hits of its own. Returns the pair count.
+        n = self.count
+        if n < 2:
+            return 0
+        x, y, vx, vy = self.x[:n], self.y[:n], self.vx[:n], self.vy[:n]
+        r = self.radius[:n].astype(np.float64)
+        a, b = grid_pairs(x, y, r, max_pairs)
+        if len(a) == 0:
+            return 0
+
+        dx, dy = x[b] - x[a], y[b] - y[a]
+        reach = r[a] + r[b]
+
+        distance = np.hypot(dx, dy)
+        stacked = distance == 0
+        distance[stacked] = 1.0
+        nx, ny = dx / distance, dy / distance
+        nx[stacked], ny[stacked], distance[stacked] = 1.0, 0.0, 0.0
+
+        # Mass goes with area, so big balls shove small ones
+        inv_a, inv_b = 1 / (r[a] * r[a]), 1 / (r[b] * r[b])
+        inv_sum = inv_a + inv_b
+
+        closing = (vx[b] - vx[a]) * nx + (vy[b] - vy[a]) * ny
+        impulse = np.where(closing < 0, -(1 + restitution) * closing / inv_sum, 0.0)
+        np.add.at(vx, a, -impulse * inv_a * nx)
+        np.add.at(vy, a, -impulse * inv_a * ny)
+        np.add.at(vx, b, impulse * inv_b * nx)
+        np.add.at(vy, b, impulse * inv_b * ny)
+
+        overlap = np.minimum(reach - distance, np.minimum(r[a], r[b])) / inv_sum
+        if bounds is not None:
+            before_x, before_y = x.copy(), y.copy()
+        np.add.at(x, a, -overlap * inv_a * nx)
+        np.add.at(y, a, -overlap * inv_a * ny)
+        np.add.at(x, b, overlap * inv_b * nx)
+        np.add.at(y, b, overlap * inv_b * ny)
+        if bounds is not None:
+            # A ball may end up no further past a wall than the move already
+            # put it, so reflect() still sees the hits that really happened
+            left, top, width, height = bounds
+            np.clip(x, np.minimum(before_x, left + r), np.maximum(before_x, left + width - r), out=x)
+            np.clip(y, np.minimum(before_y, top + r), np.maximum(before_y, top + height - r), out=y)
+        return len(a)
+
+    def disc(self, radius):
+        # Pixel offsets covered by a filled circle of the given radius
+        offsets = self.stamps.get(radius)
+        if offsets is None:
+            span = np.arange(-radius, radius + 1)
+            dx, dy = np.meshgrid(span, span, indexing="ij")
+            inside = dx * dx + dy * dy <= radius * radius
+            offsets = (dx[inside], dy[inside])
+            self.stamps[radius] = offsets
+        return offsets
+
+    def stamp(self, pixels, shifts):
+        # Draw every ball as a filled disc straight into a 2D pixel array
+        # indexed [x, y] (pygame.surfarray.pixels2d). `shifts` are the red,
+        # green and blue bit shifts of the target surface. Later balls are
+        # drawn over earlier ones, one vectorized write per disc pixel offset.
+        n = self.count
+        if n == 0:
+            return
+        w, h = pixels.shape
+        row = pixels.strides[1] // pixels.itemsize
+        flat = np.lib.stride_tricks.as_strided(pixels, shape=((h - 1) * row + w,), strides=(pixels.itemsize,))
+        mapped = (
+            (self.color[:n, 0].astype(np.uint32) << shifts[0])
+            | (self.color[:n, 1].astype(np.uint32) << shifts[1])
+            | (self.color[:n, 2].astype(np.uint32) << shifts[2])
+        )
+        cx = np.rint(self.x[:n]).astype(np.intp)
+        cy = np.rint(self.y[:n]).astype(np.intp)
+        radii = self.radius[:n]
+
+        for radius in np.unique(radii):
+            dx, dy = self.disc(int(radius))
+            same = radii == radius
+            inside = same & (cx >= radius) & (cx < w - radius) & (cy >= radius) & (cy < h - radius)
+
+            # Whole disc on screen: write through the flat view without clipping
+            base = cy[inside] * row + cx[inside]
+            colors = mapped[inside]
+            for offset in (dy * row + dx).tolist():
+                flat[base + offset] = colors
+
+            # Discs crossing the edge of the surface are clipped pixel by pixel
+            edge = np.flatnonzero(same & ~inside)
+            if len(edge):
+                px = (cx[edge, None] + dx).ravel()
+                py = (cy[edge, None] + dy).ravel()
+                colors = np.repeat(mapped[edge], len(dx))
+                visible = (px >= 0) & (px < w) & (py >= 0) & (py < h)
+                pixels[px[visible], py[visible]] = colors[visible]
@@ -0,0 +1,113 @@
+"""Axis-aligned boxes bouncing inside a rectangular container.
+
+Bodies and containers are plain numbers, no Surface or Mask is built to move
+them: the wall tests in rect-rect.py and rect-lines.py were always coordinate
+comparisons, so a box costs a few float operations per frame.
+
+Images are only needed for drawing and come from BoxImages, which keeps one
+8-bit surface per size and applies the colour through the palette. A box that
+changes colour every frame keeps hitting the cache; one that shrinks builds a
+new surface once per size it passes through.
+"""
+from collections import OrderedDict
+
+import pygame
+
+
+class Container:
+    def __init__(self, x, y, width, height, border=0):
+        self.x, self.y = x, y
+        self.width, self.height = width, height
+        self.border = border
+        # Inner walls the boxes bounce on
+        self.left = x + border
+        self.top = y + border
+        self.right = x + width - border
+        self.bottom = y + height - border
+
+    @property
+    def rect(self):
+        return self.x, self.y, self.width, self.height
+
+
+class BoxBody:
+    __slots__ = ("x", "y", "vx", "vy", "width", "height")
+
+    def __init__(self, position, size, velocity):
+        self.x, self.y = position
+        self.width, self.height = size
+        self.vx, self.vy = velocity
+
+    @property
+    def position(self):
+        return self.x, self.y
+
+    @property
+    def size(self):
+        return self.width, self.height
+
+    def resize(self, width, height):
+        self.width, self.height = max(width, 0), max(height, 0)
+
+    def step(self, container):
+        # Move one frame and bounce off the container walls. Returns the number
+        # of walls hit (a corner counts twice) and the point the scenes draw
+        # their collision lines to, None when nothing was hit.
+        self.x += self.vx
+        self.y += self.vy
+        hits = 0
+        point = None
+
+        if self.x <= container.left:
+            self.vx *= -1
+            point = (container.left, self.y)
+            self.x = container.left  # Adjust position to prevent sticking
+            hits += 1
+        elif self.x + self.width >= container.right:
+            self.vx *= -1
+            point = (container.right, self.y)
+            self.x = container.right - self.width
+            hits += 1
+
+        if self.y <= container.top:
+            self.vy *= -1
+            point = (self.x, container.top)
+            self.y = container.top
+            hits += 1
+        elif self.y + self.height >= container.bottom:
+            self.vy *= -1
+            point = (self.x, container.bottom)
+            self.y = container.bottom - self.height
+            hits += 1
+
+        return hits, point
+
+
+class BoxImages:
+    # Images are shared and recoloured on every lookup, so blit one before
+    # asking for the same size in another colour.
+    def __init__(self, max_sizes=512):
+        self.max_sizes = max_sizes
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, size, color):
+        key = (max(int(size[0]), 0), max(int(size[1]), 0))
+        image = self.entries.get(key)
+        if image is None:
+            self.misses += 1
+            # 8-bit surfaces start out as palette index 0 everywhere
+            image = pygame.Surface(key, 0, 8)
+            self.entries[key] = image
+            if len(self.entries) > self.max_sizes:
+                self.entries.popitem(last=False)
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        if image.get_palette_at(0)[:3] != tuple(color[:3]):
+            image.set_palette_at(0, color[:3])
+        return image
@@ -0,0 +1,39 @@
+"""Fixed-timestep simulation clock.
+
+Physics always advances in steps of the same length, however long a rendered
+frame took. The wall-clock time of each frame goes into an accumulator and
+advance() says how many whole steps to run; alpha is the fraction of a step
+left over, for drawing positions between the last two physics states.
+"""
+
+
+class FixedStep:
+    def __init__(self, step=1 / 60, max_steps=5):
+        self.step = step
+        self.max_steps = max_steps  # cap per frame so a stall can't snowball
+        self.accumulator = 0.0
+        self.steps = 0
+
+    @property
+    def time(self):
+        # Simulated seconds, the same for every run with the same step count
+        return self.steps * self.step
+
+    @property
+    def alpha(self):
+        return self.accumulator / self.step
+
+    def advance(self, elapsed):
+        # Add `elapsed` wall-clock seconds and return how many steps to run
+        self.accumulator += elapsed
+        count = int(self.accumulator // self.step)
+        if count > self.max_steps:
+            # Too far behind: run the cap and drop the rest, the simulation
+            # slows down instead of changing its outcome
+            count = self.max_steps
+            self.accumulator = 0.0
+        else:
+            self.accumulator -= count * self.step
+        self.steps += count
+        return count
+
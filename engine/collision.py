@@ -0,0 +1,107 @@
+"""Closed-form collision tests for the containers used by the scenes.
+
+Everything here is plain math on floats so it runs without a display.
+Angles follow pygame.draw.arc: radians, counter-clockwise with y pointing up.
+"""
+import math
+
+TAU = 2 * math.pi
+
+
+class RingSector:
+    # A ring of the given outer radius drawn `thickness` pixels inwards (like
+    # pygame.draw.arc) that only covers the span from start_angle to end_angle.
+    def __init__(self, center, radius, thickness, start_angle=0.0, end_angle=TAU):
+        self.center = (float(center[0]), float(center[1]))
+        self.radius = radius
+        self.thickness = thickness
+        self.start_angle = start_angle
+        self.end_angle = end_angle
+
+    @property
+    def inner_radius(self):
+        return max(self.radius - self.thickness, 0)
+
+    @property
+    def span(self):
+        span = self.end_angle - self.start_angle
+        if span < 0:
+            span += TAU
+        return span
+
+    @property
+    def bounds(self):
+        # (left, top, width, height) of the square the arc is drawn into
+        cx, cy = self.center
+        return (cx - self.radius, cy - self.radius, 2 * self.radius, 2 * self.radius)
+
+    def rotate(self, delta):
+        self.start_angle += delta
+        self.end_angle += delta
+
+    def angle_of(self, position):
+        return math.atan2(self.center[1] - position[1], position[0] - self.center[0])
+
+    def covers(self, angle):
+        span = self.span
+        if span >= TAU:
+            return True
+        return (angle - self.start_angle) % TAU <= span
+
+    def escaped(self, position):
+        # True once the point is beyond the outer edge of the ring
+        return math.hypot(position[0] - self.center[0], position[1] - self.center[1]) > self.radius
+
+    def contact(self, position, radius):
+        # Returns ((nx, ny), depth) for a ball overlapping the ring material, or
+        # None. The normal points from the ring towards the ball's centre.
+        dx = position[0] - self.center[0]
+        dy = position[1] - self.center[1]
+        distance = math.hypot(dx, dy)
+        inner = self.inner_radius
+        outer = self.radius
+
+        if distance + radius < inner or distance - radius > outer:
+            return None
+
+        if distance > 0 and self.covers(math.atan2(-dy, dx)):
+            ux, uy = dx / distance, dy / distance
+            if distance < inner:
+                return (-ux, -uy), radius - (inner - distance)
+            if distance > outer:
+                return (ux, uy), radius - (distance - outer)
+            # Centre is inside the ring material, push out through the nearer face
+            if distance - inner < outer - distance:
+                return (-ux, -uy), radius + (distance - inner)
+            return (ux, uy), radius + (outer - distance)
+
+        # Outside the covered span only the two flat ends of the arc can be hit
+        best = None
+        for angle in (self.start_angle, self.end_angle):
+            ux, uy = math.cos(angle), -math.sin(angle)
+            along = min(max(dx * ux + dy * uy, inner), outer)
+            ex, ey = dx - ux * along, dy - uy * along
+            gap = math.hypot(ex, ey)
+            if gap >= radius or (best is not None and gap >= best[0]):
+                continue
+            if gap > 0:
+                normal = (ex / gap, ey / gap)
+            else:
+                normal = (uy, -ux)
+            best = (gap, normal)
+
+        if best is None:
+            return None
+        return best[1], radius - best[0]
+
+
+def annulus_hits(center, rings, position, radius):
+    # Indices of the full rings, given as (outer_radius, thickness) records
+    # around one shared centre, that a ball at `position` overlaps. Only the
+    # ball's distance from the centre matters, so a whole set of concentric
+    # rings costs one hypot and a comparison per ring.
+    distance = math.hypot(position[0] - center[0], position[1] - center[1])
+    return [
+        i for i, (outer, thickness) in enumerate(rings)
+        if distance - radius < outer and distance + radius > outer - thickness
+    ]
@@ -0,0 +1,160 @@
+"""Headless simulation core.
+
+World.step advances the bodies by one frame and returns what happened as a
+list of events. It does no drawing, sound or MIDI and uses its own seeded
+random generator, so the same seed always gives the same run. Anything with
+side effects is a sink: an object with handle(world, events) that is attached
+to the world and called after every step by World.run.
+"""
+import math
+import random
+from collections import namedtuple
+
+from engine.collision import RingSector
+
+# kind is "bounce", "escape" or "exit"; container is the ring involved, if any
+Event = namedtuple("Event", "kind frame body container x y")
+
+
+class Body:
+    def __init__(self, position, velocity, radius, color=(255, 255, 255)):
+        self.x, self.y = float(position[0]), float(position[1])
+        self.vx, self.vy = float(velocity[0]), float(velocity[1])
+        self.prev_x, self.prev_y = self.x, self.y
+        self.radius = radius
+        self.color = color
+        self.bounce_count = 0
+
+    @property
+    def position(self):
+        return (self.x, self.y)
+
+
+class Ring(RingSector):
+    # A container ring that spins by `spin` radians per step and disappears
+    # once a body escapes through its gap, like the big balls in the gap scenes.
+    def __init__(self, center, radius, thickness, start_angle=0.0, end_angle=2 * math.pi, spin=0.0, color=(255, 255, 255)):
+        super().__init__(center, radius, thickness, start_angle, end_angle)
+        self.spin = spin
+        self.color = color
+        self.visible = True
+
+
+class World:
+    def __init__(self, gravity=(0, 0.25), bounds=None, seed=None, bounce_jitter=0.0):
+        self.gravity = gravity
+        self.bounds = bounds  # (left, top, width, height), bodies leaving it are removed
+        self.bounce_jitter = bounce_jitter  # random deflection in radians added to each bounce
+        self.random = random.Random(seed)
+        self.bodies = []
+        self.rings = []
+        self.sinks = []
+        self.frame = 0
+
+    def add_body(self, body):
+        self.bodies.append(body)
+        return body
+
+    def add_ring(self, ring):
+        self.rings.append(ring)
+        return ring
+
+    def attach(self, sink):
+        self.sinks.append(sink)
+        return sink
+
+    def detach(self, sink):
+        self.sinks.remove(sink)
+
+    def step(self):
+        events = []
+        gx, gy = self.gravity
+
+        for ring in self.rings:
+            if ring.visible:
+                ring.rotate(ring.spin)
+
+        for body in self.bodies[:]:
+            body.prev_x, body.prev_y = body.x, body.y
+            body.vx += gx
+            body.vy += gy
+            body.x += body.vx
+            body.y += body.vy
+
+            for ring in self.rings:
+                if not ring.visible:
+                    continue
+                contact = ring.contact(body.position, body.radius)
+                if contact is not None:
+                    self.bounce(body, contact[0])
+                    events.append(Event("bounce", self.frame, body, ring, body.x, body.y))
+                elif ring.escaped(body.position):
+                    ring.visible = False
+                    events.append(Event("escape", self.frame, body, ring, body.x, body.y))
+
+            if self.bounds is not None:
+                left, top, width, height = self.bounds
+                if not (left <= body.x <= left + width and top <= body.y <= top + height):
+                    self.bodies.remove(body)
+                    events.append(Event("exit", self.frame, body, None, body.x, body.y))
+
+        self.frame += 1
+        return events
+
+    def snapshot(self):
+        # Compact, picklable state of the run. restore() on a world built the
+        # same way (same rings, sinks not included) resumes from this frame
+        # exactly, random generator included.
+        bodies = tuple(
+            (b.x, b.y, b.vx, b.vy, b.prev_x, b.prev_y, b.radius, b.color, b.bounce_count) for b in self.bodies
+        )
+        rings = tuple((r.start_angle, r.end_angle, r.visible) for r in self.rings)
+        return self.frame, self.random.getstate(), bodies, rings
+
+    def restore(self, state):
+        self.frame, random_state, bodies, rings = state
+        self.random.setstate(random_state)
+        self.bodies = []
+        for x, y, vx, vy, prev_x, prev_y, radius, color, bounce_count in bodies:
+            body = Body((x, y), (vx, vy), radius, color)
+            body.prev_x, body.prev_y = prev_x, prev_y
+            body.bounce_count = bounce_count
+            self.bodies.append(body)
+        for ring, (start_angle, end_angle, visible) in zip(self.rings, rings):
+            ring.start_angle, ring.end_angle, ring.visible = start_angle, end_angle, visible
+
+    def bounce(self, body, normal):
+        # Rewind to the previous position and reflect the velocity off the wall
+        nx, ny = normal
+        dot = body.vx * nx + body.vy * ny
+        if dot < 0:
+            body.vx -= 2 * dot * nx
+            body.vy -= 2 * dot * ny
+        if self.bounce_jitter:
+            angle = self.random.uniform(-self.bounce_jitter, self.bounce_jitter)
+            cos, sin = math.cos(angle), math.sin(angle)
+            body.vx, body.vy = body.vx * cos - body.vy * sin, body.vx * sin + body.vy * cos
+        body.x, body.y = body.prev_x + body.vx * 0.1, body.prev_y + body.vy * 0.1
+        body.bounce_count += 1
+
+    def run(self, frames=None):
+        # Step as fast as the CPU allows until the world reaches `frames`
+        # steps, or until a sink returns False from handle(). Every sink still
+        # gets the frame a run stops on, so a video or audio sink attached
+        # after the one that stops the run never misses the last frame.
+        while frames is None or self.frame < frames:
+            events = self.step()
+            stop = False
+            for sink in self.sinks:
+                if sink.handle(self, events) is False:
+                    stop = True
+            if stop:
+                break
+        return self.close()
+
+    def close(self):
+        for sink in self.sinks:
+            close = getattr(sink, "close", None)
+            if close is not None:
+                close()
+        return self.frame
@@ -0,0 +1,56 @@
+"""Dirty-rectangle presentation for scenes with a static backdrop.
+
+The static part of the frame is captured once as the background. Each frame
+begin() restores the background only where something was drawn last frame,
+the scene marks the rects it draws into (pygame's draw functions and blit
+already return them), and present() pushes just those areas to the window
+with pygame.display.update. With enabled=False, or after invalidate(), the
+whole background is restored and the window is flipped as before.
+"""
+import pygame
+
+
+class DirtyRects:
+    def __init__(self, screen, enabled=True):
+        self.screen = screen
+        self.enabled = enabled
+        self.background = None
+        self.previous = []
+        self.current = []
+        self.full = True
+
+    def capture(self, background=None):
+        # Keep a copy of the static frame, the screen as drawn so far by default
+        self.background = (background or self.screen).copy()
+        self.full = True
+
+    def invalidate(self):
+        self.full = True
+
+    def begin(self):
+        if not self.enabled or self.full:
+            self.screen.blit(self.background, (0, 0))
+            return
+        for rect in self.previous:
+            self.screen.blit(self.background, rect, rect)
+
+    def mark(self, rect):
+        if rect:
+            self.current.append(pygame.Rect(rect).clip(self.screen.get_rect()))
+        return rect
+
+    def mark_frame(self, rect, width):
+        # The four edges of an outline drawn with pygame.draw.rect(..., width)
+        rect = pygame.Rect(rect)
+        self.mark((rect.left, rect.top, rect.width, width))
+        self.mark((rect.left, rect.bottom - width, rect.width, width))
+        self.mark((rect.left, rect.top, width, rect.height))
+        self.mark((rect.right - width, rect.top, width, rect.height))
+
+    def present(self):
+        if not self.enabled or self.full:
+            pygame.display.flip()
+            self.full = False
+        else:
+            pygame.display.update(self.previous + self.current)
+        self.previous, self.current = self.current, []
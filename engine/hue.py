@@ -0,0 +1,24 @@
+"""Lookup table for the scenes' hue cycling.
+
+The gap scenes fade rings and particles through hsla(hue, 100, 50) every
+frame. HUE_TABLE holds that colour for every whole hue, so the animation is
+a list lookup instead of a pygame.Color.hsla conversion.
+"""
+import pygame
+
+
+def _hue_table():
+    table = []
+    color = pygame.Color(0)
+    for hue in range(360):
+        color.hsla = (hue, 100, 50, 100)
+        table.append((color.r, color.g, color.b))
+    return table
+
+
+HUE_TABLE = _hue_table()
+
+
+def hue_color(hue):
+    # RGB of hsla(hue, 100, 50), hue in degrees
+    return HUE_TABLE[int(hue) % 360]
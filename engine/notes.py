@@ -0,0 +1,145 @@
+"""Note sequences compiled once per MIDI file.
+
+Iterating a mido MidiFile merges its tracks and converts tick times on every
+pass, and the scenes used to do that lazily inside play_collision_note, one
+iterator per ball, stalling on wrap-around while the file was re-merged.
+NoteSequence walks the file once and keeps every note start in compact arrays
+of pitch, velocity, start time and duration (seconds). Consumers each take a
+NoteCursor, whose next() is an index lookup that wraps around for free.
+
+NoteSequence.load also keeps the compiled notes on disk, in a .notes folder
+next to the .mid file, as one .npy record array whose name carries the
+source's size and mtime. Later runs memory-map that file instead of parsing
+the MIDI, which is what batch renders starting many processes pay for.
+"""
+import os
+from collections import defaultdict, deque, namedtuple
+
+import numpy as np
+
+# Same attribute names as mido messages, so scenes can keep reading msg.note
+Note = namedtuple("Note", ("note", "velocity", "time", "duration"))
+
+# One record per note in the on-disk cache
+NOTE_DTYPE = np.dtype([("pitch", "u1"), ("velocity", "u1"), ("time", "<f8"), ("duration", "<f8")])
+
+CACHE_DIR = ".notes"
+
+
+class NoteSequence:
+    def __init__(self, pitch, velocity, time, duration):
+        self.pitch = np.asarray(pitch, dtype=np.uint8)
+        self.velocity = np.asarray(velocity, dtype=np.uint8)
+        self.time = np.asarray(time, dtype=np.float64)
+        self.duration = np.asarray(duration, dtype=np.float64)
+        # Plain tuples for the per-collision lookup, NumPy scalars are slow to
+        # box one at a time
+        self.notes = [Note(*row) for row in zip(
+            self.pitch.tolist(), self.velocity.tolist(), self.time.tolist(), self.duration.tolist()
+        )]
+
+    @classmethod
+    def from_midi(cls, midi_file):
+        # `midi_file` is a mido MidiFile or a path to one. A note_on with
+        # velocity 0 is a note_off, as the MIDI spec has it.
+        if not hasattr(midi_file, "tracks"):
+            from mido import MidiFile
+
+            midi_file = MidiFile(midi_file)
+
+        pitch, velocity, time, duration = [], [], [], []
+        sounding = defaultdict(deque)  # (channel, pitch) -> indices of notes still held
+        now = 0.0
+        for msg in midi_file:
+            now += msg.time
+            if msg.type == "note_on" and msg.velocity > 0:
+                sounding[msg.channel, msg.note].append(len(pitch))
+                pitch.append(msg.note)
+                velocity.append(msg.velocity)
+                time.append(now)
+                duration.append(None)
+            elif msg.type in ("note_on", "note_off"):
+                held = sounding.get((msg.channel, msg.note))
+                if held:
+                    i = held.popleft()
+                    duration[i] = now - time[i]
+
+        # Notes never released ring until the end of the file
+        duration = [now - start if length is None else length for start, length in zip(time, duration)]
+        return cls(pitch, velocity, time, duration)
+
+    @classmethod
+    def load(cls, path, cache=True):
+        # Compile `path`, or map the cached compile when the file hasn't
+        # changed since. A cache that can't be read or written is skipped.
+        if not cache:
+            return cls.from_midi(path)
+        stat = os.stat(path)
+        folder, name = os.path.split(os.path.abspath(path))
+        stem = os.path.splitext(name)[0]
+        cache_dir = os.path.join(folder, CACHE_DIR)
+        cache_path = os.path.join(cache_dir, f"{stem}.{stat.st_size}.{stat.st_mtime_ns}.npy")
+
+        try:
+            records = np.load(cache_path, mmap_mode="r")
+        except (OSError, ValueError):
+            records = None
+        if records is not None and records.dtype == NOTE_DTYPE:
+            return cls(records["pitch"], records["velocity"], records["time"], records["duration"])
+
+        sequence = cls.from_midi(path)
+        try:
+            sequence.save(cache_path)
+            # Compiles of older versions of the same file are stale for good
+            for entry in os.listdir(cache_dir):
+                if entry.startswith(stem + ".") and entry.endswith(".npy") and entry.count(".") == 3:
+                    if os.path.join(cache_dir, entry) != cache_path:
+                        os.remove(os.path.join(cache_dir, entry))
+        except OSError:
+            pass
+        return sequence
+
+    def save(self, path):
+        records = np.empty(len(self.notes), dtype=NOTE_DTYPE)
+        records["pitch"] = self.pitch
+        records["velocity"] = self.velocity
+        records["time"] = self.time
+        records["duration"] = self.duration
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write aside and rename, so a process starting alongside never maps
+        # a half-written file
+        partial = f"{path}.{os.getpid()}.tmp"
+        with open(partial, "wb") as file:
+            np.save(file, records)
+        os.replace(partial, path)
+
+    def __len__(self):
+        return len(self.notes)
+
+    def __getitem__(self, index):
+        return self.notes[index]
+
+    def cursor(self, start=0):
+        return NoteCursor(self, start)
+
+
+class NoteCursor:
+    # One consumer's position in a shared NoteSequence
+    def __init__(self, sequence, start=0):
+        self.sequence = sequence
+        self.index = start
+
+    def next(self):
+        # The next note, starting over after the last one. None when the file
+        # has no notes at all.
+        notes = self.sequence.notes
+        if not notes:
+            return None
+        if self.index >= len(notes):
+            self.index = 0
+        note = notes[self.index]
+        self.index += 1
+        return note
+
+    def reset(self):
+        self.index = 0
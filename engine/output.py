@@ -0,0 +1,104 @@
+"""Background thread for MIDI and mixer output.
+
+PortMidi writes and pygame.mixer channel allocation take a varying amount of
+time, and a busy frame can make hundreds of them. OutputWorker takes that off
+the frame: note_on, note_off and play() only append a timestamped event to a
+bounded queue, and a daemon thread makes the device calls.
+
+When the queue is full a new note_on or play() is folded into a pending one
+for the same pitch or sound ("coalesce", keeping the louder velocity) or
+thrown away ("drop"). note_offs are never dropped, a lost one would leave a
+voice stuck on. Events that waited longer than `max_latency` seconds are
+skipped too, a late bounce sound is worse than none.
+
+The worker has the same note_on / note_off / close methods as a
+pygame.midi.Output, so a NoteScheduler can sit on top of it unchanged.
+"""
+import threading
+import time
+from collections import deque
+
+NOTE_ON = 0
+NOTE_OFF = 1
+PLAY = 2
+
+
+class OutputWorker:
+    def __init__(self, midi_output=None, maxsize=256, policy="coalesce", max_latency=0.1, clock=time.monotonic):
+        if policy not in ("coalesce", "drop"):
+            raise ValueError(f"Unknown output queue policy: {policy}")
+        self.midi_output = midi_output
+        self.maxsize = maxsize
+        self.policy = policy
+        self.max_latency = max_latency
+        self.clock = clock
+        self.events = deque()  # [kind, time, target, value, channel]
+        self.pending = {}  # (kind, target, channel) -> queued note_on/play event
+        self.ready = threading.Condition()
+        self.running = True
+        self.dropped = 0
+        self.coalesced = 0
+        self.thread = threading.Thread(target=self.run, name="output", daemon=True)
+        self.thread.start()
+
+    def note_on(self, pitch, velocity, channel=0):
+        self.push(NOTE_ON, pitch, velocity, channel)
+
+    def note_off(self, pitch, velocity=0, channel=0):
+        self.push(NOTE_OFF, pitch, velocity, channel)
+
+    def play(self, sound):
+        self.push(PLAY, sound, 0, 0)
+
+    def push(self, kind, target, value, channel):
+        key = (kind, target, channel)
+        with self.ready:
+            if kind != NOTE_OFF and len(self.events) >= self.maxsize:
+                queued = self.pending.get(key) if self.policy == "coalesce" else None
+                if queued is None:
+                    self.dropped += 1
+                else:
+                    queued[3] = max(queued[3], value)
+                    self.coalesced += 1
+                return
+            event = [kind, self.clock(), target, value, channel]
+            self.events.append(event)
+            if kind != NOTE_OFF:
+                self.pending[key] = event
+            self.ready.notify()
+
+    def run(self):
+        while True:
+            with self.ready:
+                while self.running and not self.events:
+                    self.ready.wait()
+                if not self.events:
+                    return
+                event = self.events.popleft()
+                kind, stamp, target, value, channel = event
+                key = (kind, target, channel)
+                if self.pending.get(key) is event:
+                    del self.pending[key]
+
+            if kind == NOTE_OFF:
+                self.midi_output.note_off(target, value, channel)
+            elif self.clock() - stamp > self.max_latency:
+                with self.ready:
+                    self.dropped += 1  # push() counts its drops under the same lock
+            elif kind == NOTE_ON:
+                self.midi_output.note_on(target, value, channel)
+            else:
+                target.play()
+
+    def stop(self):
+        # Send what is still queued and end the thread. The MIDI port stays
+        # open for whoever owns it.
+        with self.ready:
+            self.running = False
+            self.ready.notify()
+        self.thread.join()
+
+    def close(self):
+        self.stop()
+        if self.midi_output is not None:
+            self.midi_output.close()
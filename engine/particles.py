@@ -0,0 +1,144 @@
+"""Pooled particles stored in NumPy arrays.
+
+Replaces the per-scene Particle class: instead of one object with two
+Vector2s and a Color per spark, every particle is a row in fixed-capacity
+arrays. Live particles are kept packed at the front in the order they were
+emitted, so one vectorized step moves them all and dead ones are squeezed
+out in place. When a burst does not fit, the oldest particles are recycled
+first, ring-buffer style, rather than growing the pool.
+
+Drawing goes through a SpriteAtlas of small pre-rendered per-pixel-alpha
+discs, so the fade actually shows on the opaque display surface and the
+whole pool is a single blits call.
+"""
+import numpy as np
+import pygame
+
+# Colour range the scenes' createParticles/createExplosion pick from
+SPARK_LOW = (200, 100, 100)
+SPARK_HIGH = (255, 255, 255)
+
+
+class SpriteAtlas:
+    # Pre-rendered discs bucketed by colour (16 levels per channel) and alpha
+    # (`levels` steps), built the first time each bucket is needed
+    def __init__(self, radius=3, levels=16):
+        self.radius = radius
+        self.levels = levels
+        self.sprites = {}
+
+    def keys(self, colors, alpha):
+        # One integer bucket key per particle, alpha in [0, 1]
+        level = np.clip((alpha * self.levels).astype(np.int64), 0, self.levels - 1)
+        c = colors.astype(np.int64) >> 4
+        return (((c[:, 0] << 8) | (c[:, 1] << 4) | c[:, 2]) * self.levels) + level
+
+    def sprite(self, key):
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            rgb, level = divmod(key, self.levels)
+            color = (((rgb >> 8) & 15) << 4 | 8, ((rgb >> 4) & 15) << 4 | 8, (rgb & 15) << 4 | 8,
+                     255 * (level + 1) // self.levels)
+            size = 2 * self.radius + 1
+            sprite = pygame.Surface((size, size), pygame.SRCALPHA)
+            pygame.draw.circle(sprite, color, (self.radius, self.radius), self.radius)
+            self.sprites[key] = sprite
+        return sprite
+
+    def draw(self, surface, x, y, colors, alpha):
+        # Blit one sprite per particle in a single call
+        if len(x) == 0:
+            return
+        unique, inverse = np.unique(self.keys(colors, alpha), return_inverse=True)
+        sprites = [self.sprite(key) for key in unique.tolist()]
+        left = (x - self.radius).astype(int).tolist()
+        top = (y - self.radius).astype(int).tolist()
+        sequence = [(sprites[i], (px, py)) for i, px, py in zip(inverse.tolist(), left, top)]
+        fblits = getattr(surface, "fblits", None)
+        if fblits is not None:
+            fblits(sequence)
+        else:
+            surface.blits(sequence, doreturn=False)
+
+
+class ParticlePool:
+    def __init__(self, capacity=4096, gravity=(0, 0), decay=2, max_life=50, seed=None, atlas=None):
+        self.capacity = capacity
+        self.count = 0
+        self.gravity = gravity
+        self.decay = decay
+        self.max_life = max_life
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.vx = np.zeros(capacity)
+        self.vy = np.zeros(capacity)
+        self.life = np.zeros(capacity)
+        self.color = np.zeros((capacity, 3), dtype=np.uint8)
+        self.rng = np.random.default_rng(seed)
+        self.atlas = atlas or SpriteAtlas()
+
+    def __len__(self):
+        return self.count
+
+    def __bool__(self):
+        return self.count > 0
+
+    def allocate(self, n):
+        # Slice of n free rows at the end of the live block, recycling the
+        # oldest particles if the pool is full
+        n = min(n, self.capacity)
+        overflow = self.count + n - self.capacity
+        if overflow > 0:
+            keep = slice(overflow, self.count)
+            for values in (self.x, self.y, self.vx, self.vy, self.life, self.color):
+                values[:self.count - overflow] = values[keep]
+            self.count -= overflow
+        rows = slice(self.count, self.count + n)
+        self.count += n
+        return rows
+
+    def emit(self, position, n, speed, color=None, life=(30, 50)):
+        # Burst of n particles from position (or one position per particle)
+        # with velocities uniform in [-speed, speed] on each axis. Without a
+        # colour each particle gets a random one between SPARK_LOW and SPARK_HIGH.
+        rows = self.allocate(n)
+        n = rows.stop - rows.start
+        position = np.asarray(position, dtype=np.float64)
+        if position.ndim == 2:
+            position = position[-n:]
+            self.x[rows], self.y[rows] = position[:, 0], position[:, 1]
+        else:
+            self.x[rows], self.y[rows] = position
+        self.vx[rows] = self.rng.uniform(-speed, speed, n)
+        self.vy[rows] = self.rng.uniform(-speed, speed, n)
+        self.life[rows] = self.rng.integers(life[0], life[1], n, endpoint=True)
+        if color is None:
+            self.color[rows] = self.rng.integers(SPARK_LOW, SPARK_HIGH, (n, 3), endpoint=True)
+        else:
+            self.color[rows] = tuple(color)[:3]
+
+    def emit_ring(self, center, radius, n, speed, color=None, life=(30, 50)):
+        # Burst of n particles scattered around the edge of a circle
+        angles = self.rng.uniform(0, 2 * np.pi, n)
+        positions = np.column_stack((center[0] + np.cos(angles) * radius, center[1] + np.sin(angles) * radius))
+        self.emit(positions, n, speed, color, life)
+
+    def update(self):
+        n = self.count
+        self.x[:n] += self.vx[:n]
+        self.y[:n] += self.vy[:n]
+        self.vx[:n] += self.gravity[0]
+        self.vy[:n] += self.gravity[1]
+        self.life[:n] -= self.decay
+
+        # Compact the survivors to the front, keeping emission order
+        alive = np.flatnonzero(self.life[:n] > 0)
+        if len(alive) < n:
+            for values in (self.x, self.y, self.vx, self.vy, self.life, self.color):
+                values[:len(alive)] = values[alive]
+            self.count = len(alive)
+
+    def draw(self, surface):
+        n = self.count
+        alpha = np.minimum(self.life[:n], self.max_life) / self.max_life
+        self.atlas.draw(surface, self.x[:n], self.y[:n], self.color[:n], alpha)
@@ -0,0 +1,97 @@
+"""Optional sinks that give a World a window, sound or MIDI output.
+
+Nothing here is needed to step a World. Each sink has handle(world, events)
+and an optional close(), and is attached with world.attach(sink).
+"""
+import pygame
+
+from engine.voices import NoteScheduler
+
+
+class PygameRenderer:
+    # Draws the world onto `screen`. Leave fps as None to render as fast as
+    # the simulation runs, or pass 60 to watch it at the scenes' usual speed.
+    def __init__(self, screen, background=(1, 10, 15), outline=(255, 255, 255), fps=None):
+        self.screen = screen
+        self.background = background
+        self.outline = outline
+        self.fps = fps
+        self.clock = pygame.time.Clock()
+
+    def handle(self, world, events):
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                return False
+
+        self.draw(world)
+        pygame.display.flip()
+        if self.fps:
+            self.clock.tick(self.fps)
+
+    def draw(self, world):
+        self.screen.fill(self.background)
+        for ring in world.rings:
+            if ring.visible:
+                pygame.draw.arc(self.screen, ring.color, ring.bounds, ring.start_angle, ring.end_angle, ring.thickness)
+        for body in world.bodies:
+            pygame.draw.circle(self.screen, body.color, body.position, body.radius)
+            pygame.draw.circle(self.screen, self.outline, body.position, body.radius, 2)
+
+
+class VideoSink:
+    # Draws every frame off-screen with `renderer` and hands it to a writer
+    # from engine.video. No window, no event pumping and no frame limiting.
+    def __init__(self, renderer, writer):
+        self.renderer = renderer
+        self.writer = writer
+
+    def handle(self, world, events):
+        self.renderer.draw(world)
+        self.writer.write(self.renderer.screen)
+
+    def close(self):
+        self.writer.close()
+
+
+class MidiSink:
+    # Plays the next note of `notes` on every event of the given kinds, each
+    # released after `duration` seconds by an engine.voices.NoteScheduler
+    def __init__(self, midi_output, notes, transpose=0, velocity=100, kinds=("bounce",), duration=0.25):
+        self.midi_output = midi_output
+        self.scheduler = NoteScheduler(midi_output, default_duration=duration)
+        self.notes = list(notes)
+        self.transpose = transpose
+        self.velocity = velocity
+        self.kinds = kinds
+        self.note_index = 0
+
+    @classmethod
+    def from_file(cls, midi_output, path, **kwargs):
+        from engine.notes import NoteSequence
+
+        return cls(midi_output, NoteSequence.load(path).pitch.tolist(), **kwargs)
+
+    def handle(self, world, events):
+        self.scheduler.update()
+        if not self.notes:
+            return
+        for event in events:
+            if event.kind in self.kinds:
+                pitch = self.notes[self.note_index % len(self.notes)] + self.transpose
+                self.note_index += 1
+                self.scheduler.note_on(pitch, self.velocity)
+
+    def close(self):
+        self.scheduler.close()
+
+
+class SoundSink:
+    # Plays a pygame.mixer.Sound for every event of the given kinds
+    def __init__(self, sound, kinds=("escape",)):
+        self.sound = sound
+        self.kinds = kinds
+
+    def handle(self, world, events):
+        for event in events:
+            if event.kind in self.kinds:
+                self.sound.play()
@@ -0,0 +1,56 @@
+"""Uniform-grid spatial hash for bodies that have stopped moving.
+
+Frozen balls and triangles are inserted once, into every cell their bounding
+circle overlaps. A moving body then only looks at the bodies in the cells it
+overlaps itself, so a collision check costs the same with ten settled bodies
+as with ten thousand.
+"""
+import math
+
+
+class SpatialHash:
+    def __init__(self, cell_size=64):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def cells_for(self, position, radius):
+        size = self.cell_size
+        left = math.floor((position[0] - radius) / size)
+        right = math.floor((position[0] + radius) / size)
+        top = math.floor((position[1] - radius) / size)
+        bottom = math.floor((position[1] + radius) / size)
+        for cx in range(left, right + 1):
+            for cy in range(top, bottom + 1):
+                yield cx, cy
+
+    def insert(self, item, position, radius):
+        for cell in self.cells_for(position, radius):
+            self.cells.setdefault(cell, []).append(item)
+        self.count += 1
+
+    def remove(self, item, position, radius):
+        for cell in self.cells_for(position, radius):
+            bucket = self.cells.get(cell)
+            if bucket and item in bucket:
+                bucket.remove(item)
+                if not bucket:
+                    del self.cells[cell]
+        self.count -= 1
+
+    def query(self, position, radius):
+        # Bodies sharing a cell with the given circle, each reported once in
+        # the order they were inserted into that cell
+        seen = set()
+        for cell in self.cells_for(position, radius):
+            for item in self.cells.get(cell, ()):
+                if id(item) not in seen:
+                    seen.add(id(item))
+                    yield item
+
+    def clear(self):
+        self.cells.clear()
+        self.count = 0
@@ -0,0 +1,161 @@
+"""The gap-alot-bounces scene as a World.
+
+Four counter-spinning, hue-cycling rings around one centre. A ball freezes
+into an obstacle for the others after 10 bounces and a new ball is spawned
+in its place, and each ring bursts into particles once a ball escapes it.
+gap-alot-bounces.py plays this world in a window with MIDI and headless.py
+runs and exports it, so there is only one copy of the rules.
+"""
+import math
+
+import pygame
+
+from engine.core import Body, Event, Ring, World
+from engine.hue import hue_color
+from engine.particles import ParticlePool
+from engine.sinks import PygameRenderer
+from engine.spatial import SpatialHash
+from engine.tails import TailCache
+
+WIDTH, HEIGHT = 800, 800
+CENTER = (WIDTH // 2, HEIGHT // 2)
+
+
+class StackWorld(World):
+    spawn = ((WIDTH / 2 - 10, HEIGHT / 2 - 90), (-4, -4), 15)
+    freeze_after = 10
+    tail_length = 10
+
+    def __init__(self, seed=None, center=CENTER):
+        # No bounds: a ball that gets out of every ring just keeps falling
+        super().__init__(gravity=(0, 0.15), seed=seed)
+        self.center = center
+        self.obstacles = []  # Frozen balls, obstacles for the moving ones
+        self.obstacle_index = SpatialHash()  # Grid of obstacles for collision lookups
+        self.hues = []  # Starting hue of every ring, advanced one step per frame
+        self.particles = ParticlePool(gravity=self.gravity, seed=seed)
+
+    def add_ring(self, ring, hue=0):
+        self.hues.append(hue)
+        return super().add_ring(ring)
+
+    def freeze(self, body):
+        self.bodies.remove(body)
+        self.obstacles.append(body)
+        self.obstacle_index.insert(body, body.position, body.radius)
+
+    def bounce(self, body, normal):
+        # Reflect about the line from the centre whichever face of the ring
+        # was hit, then go back to the previous position, a tenth of the new
+        # velocity forward and one pixel outwards
+        dx, dy = body.x - self.center[0], body.y - self.center[1]
+        distance = math.hypot(dx, dy) or 1.0
+        nx, ny = dx / distance, dy / distance
+        dot = body.vx * nx + body.vy * ny
+        body.vx -= 2 * dot * nx
+        body.vy -= 2 * dot * ny
+        body.x = body.prev_x + body.vx * 0.1 + nx
+        body.y = body.prev_y + body.vy * 0.1 + ny
+        body.bounce_count += 1
+
+    def step(self):
+        events = super().step()
+        for ring, hue in zip(self.rings, self.hues):
+            ring.color = hue_color(hue + self.frame)
+
+        for event in events:
+            if event.kind == "escape":
+                ring = event.container
+                self.particles.emit_ring(ring.center, ring.radius, 100, 2, ring.color)
+
+        for body in self.bodies[:]:
+            for obstacle in self.obstacle_index.query(body.position, body.radius):
+                dx, dy = body.x - obstacle.x, body.y - obstacle.y
+                distance = math.hypot(dx, dy)
+                if distance > body.radius + obstacle.radius:
+                    continue
+                if distance == 0:
+                    dx, distance = 0.1, 0.1  # Prevent division by zero
+                nx, ny = dx / distance, dy / distance
+                overlap = body.radius + obstacle.radius - distance
+                body.x += nx * overlap
+                body.y += ny * overlap
+                dot = body.vx * nx + body.vy * ny
+                body.vx -= 2 * dot * nx
+                body.vy -= 2 * dot * ny
+                body.bounce_count += 1
+                events.append(Event("bounce", self.frame - 1, body, obstacle, body.x, body.y))
+                break
+
+            body.tail = (getattr(body, "tail", ()) + ((body.x, body.y),))[-self.tail_length:]
+            if body.bounce_count >= self.freeze_after:
+                self.freeze(body)
+
+        if not self.bodies:
+            color = tuple(self.random.randint(0, 255) for _ in range(3))
+            position, velocity, radius = self.spawn
+            self.add_body(Body(position, velocity, radius, color))
+
+        self.particles.update()
+        return events
+
+    def snapshot(self):
+        particles = self.particles
+        n = particles.count
+        pool = (n, particles.rng.bit_generator.state) + tuple(
+            values[:n].copy() for values in (particles.x, particles.y, particles.vx, particles.vy, particles.life, particles.color)
+        )
+        obstacles = tuple((b.x, b.y, b.radius, b.color) for b in self.obstacles)
+        tails = tuple(getattr(b, "tail", ()) for b in self.bodies)
+        return super().snapshot(), obstacles, tails, pool
+
+    def restore(self, state):
+        world, obstacles, tails, pool = state
+        super().restore(world)
+        self.obstacles = []
+        self.obstacle_index.clear()
+        for x, y, radius, color in obstacles:
+            body = Body((x, y), (0, 0), radius, color)
+            self.obstacles.append(body)
+            self.obstacle_index.insert(body, body.position, body.radius)
+        for body, tail in zip(self.bodies, tails):
+            body.tail = tail
+        for ring, hue in zip(self.rings, self.hues):
+            ring.color = hue_color(hue + self.frame)
+
+        particles = self.particles
+        n, particles.rng.bit_generator.state = pool[0], pool[1]
+        for values, saved in zip((particles.x, particles.y, particles.vx, particles.vy, particles.life, particles.color), pool[2:]):
+            values[:n] = saved
+        particles.count = n
+
+
+def build_stack_world(seed=None):
+    world = StackWorld(seed)
+    for radius, start, spin, hue in ((150, 1.0, 0.02, 200), (200, 10.2, -0.02, 180),
+                                     (250, 6.5, 0.02, 160), (300, 8.5, -0.02, 140)):
+        world.add_ring(Ring(CENTER, radius, 5, start, start - 0.5 + 2 * math.pi, spin), hue)
+    world.add_body(Body(StackWorld.spawn[0], (-2, -2), 15, (255, 0, 0)))
+    return world
+
+
+class StackRenderer(PygameRenderer):
+    # Moving balls with their tails, then the frozen ones, the rings and the
+    # particles on top
+    def __init__(self, screen, fps=None):
+        super().__init__(screen, fps=fps)
+        self.tails = TailCache()
+
+    def draw(self, world):
+        self.screen.fill(self.background)
+        for body in world.bodies:
+            pygame.draw.circle(self.screen, body.color, body.position, body.radius)
+            self.tails.draw(self.screen, "circle", body.radius, body.color, getattr(body, "tail", ()), 128)
+            pygame.draw.circle(self.screen, self.outline, body.position, body.radius, 4)
+        for body in world.obstacles:
+            pygame.draw.circle(self.screen, body.color, body.position, body.radius)
+            pygame.draw.circle(self.screen, self.outline, body.position, body.radius, 4)
+        for ring in world.rings:
+            if ring.visible:
+                pygame.draw.arc(self.screen, ring.color, ring.bounds, ring.start_angle, ring.end_angle, ring.thickness)
+        world.particles.draw(self.screen)
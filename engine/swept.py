@@ -0,0 +1,87 @@
+"""Continuous (swept) collision for balls inside containers.
+
+The scenes integrate with position += velocity once per frame, so within a
+step a ball moves in a straight line. These helpers find the exact fraction
+of that step at which the ball first touches the container wall, so a fast
+ball bounces where it actually hit instead of tunnelling through the wall or
+being caught late and rewound to its previous position.
+"""
+import math
+
+
+def circle_in_circle_impact(position, velocity, radius, center, container_radius):
+    # Returns (t, normal) for the first time t in [0, 1] that a ball moving by
+    # `velocity` this step touches the inside of the container, or None.
+    # The normal points back into the container.
+    limit = container_radius - radius
+    dx, dy = position[0] - center[0], position[1] - center[1]
+    vx, vy = velocity
+    a = vx * vx + vy * vy
+    b = 2 * (dx * vx + dy * vy)
+    c = dx * dx + dy * dy - limit * limit
+
+    if c >= 0 and b > 0:
+        t = 0.0  # On or past the wall and still moving outwards
+    else:
+        # Inside, or on the wall moving back in (as after every bounce): the
+        # hit is where the path leaves the circle again, the far root
+        discriminant = b * b - 4 * a * c
+        if a == 0 or discriminant < 0:
+            return None
+        t = (-b + math.sqrt(discriminant)) / (2 * a)
+        if t <= 0 or t > 1:
+            return None
+
+    hx, hy = dx + vx * t, dy + vy * t
+    distance = math.hypot(hx, hy) or 1.0
+    return t, (-hx / distance, -hy / distance)
+
+
+def circle_in_rect_impact(position, velocity, radius, rect):
+    # Same as circle_in_circle_impact for a rectangular container given as
+    # (left, top, width, height).
+    left, top, width, height = rect
+    best = None
+    for axis, low, high in ((0, left + radius, left + width - radius), (1, top + radius, top + height - radius)):
+        p, v = position[axis], velocity[axis]
+        if v > 0 and p + v >= high:
+            t, side = max((high - p) / v, 0.0), -1.0
+        elif v < 0 and p + v <= low:
+            t, side = max((low - p) / v, 0.0), 1.0
+        else:
+            continue
+        if best is None or t < best[0]:
+            normal = (side, 0.0) if axis == 0 else (0.0, side)
+            best = (t, normal)
+    return best
+
+
+def reflect(velocity, normal):
+    dot = velocity[0] * normal[0] + velocity[1] * normal[1]
+    return (velocity[0] - 2 * dot * normal[0], velocity[1] - 2 * dot * normal[1])
+
+
+def sweep(position, velocity, impact, on_bounce, max_bounces=8):
+    # Move a ball through one whole step, bouncing as often as it hits.
+    # impact(position, displacement) is one of the functions above with the
+    # container bound in; on_bounce(position, velocity, normal) returns the
+    # velocity after the bounce. Returns (position, velocity, bounces).
+    x, y = position
+    vx, vy = velocity
+    remaining = 1.0
+    bounces = 0
+    while remaining > 0:
+        hit = impact((x, y), (vx * remaining, vy * remaining))
+        if hit is None:
+            x += vx * remaining
+            y += vy * remaining
+            break
+        if bounces >= max_bounces:
+            break  # Stuck in a corner, stay on the wall for the rest of the step
+        t, normal = hit
+        x += vx * remaining * t
+        y += vy * remaining * t
+        remaining *= 1 - t
+        vx, vy = on_bounce((x, y), (vx, vy), normal)
+        bounces += 1
+    return (x, y), (vx, vy), bounces
@@ -0,0 +1,88 @@
+"""Shared cache of faded tail sprites.
+
+A tail segment is a ball's shape in its colour at some alpha. Instead of
+allocating and rasterizing a fresh SRCALPHA surface per segment per frame,
+segments are drawn from sprites keyed by (shape, size, colour, alpha step)
+and the whole tail goes to the screen in one blits call. Hue-cycling scenes
+keep producing new colours, so the cache is bounded and evicts the least
+recently used sprites.
+"""
+from collections import OrderedDict
+
+import pygame
+
+
+class TailCache:
+    # Shapes: "circle" and "triangle" take the radius / side length and are
+    # centred on the tail point, "ring" takes (radius, line width) and is
+    # centred too, "rect" takes (width, height) and the tail point is its
+    # top-left corner, matching the scenes' draw_tail.
+    def __init__(self, alpha_step=8, max_sprites=4096):
+        self.alpha_step = alpha_step
+        self.max_sprites = max_sprites
+        self.sprites = OrderedDict()
+
+    def __len__(self):
+        return len(self.sprites)
+
+    def sprite(self, shape, size, color, alpha):
+        key = (shape, size, tuple(color[:3]), alpha // self.alpha_step)
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            sprite = self.rasterize(shape, size, (*key[2], key[3] * self.alpha_step))
+            self.sprites[key] = sprite
+            if len(self.sprites) > self.max_sprites:
+                self.sprites.popitem(last=False)
+        else:
+            self.sprites.move_to_end(key)
+        return sprite
+
+    @staticmethod
+    def rasterize(shape, size, color):
+        if shape == "circle":
+            sprite = pygame.Surface((2 * size, 2 * size), pygame.SRCALPHA)
+            pygame.draw.circle(sprite, color, (size, size), size)
+        elif shape == "ring":
+            radius, width = size
+            sprite = pygame.Surface((2 * radius, 2 * radius), pygame.SRCALPHA)
+            pygame.draw.circle(sprite, color, (radius, radius), radius, width)
+        elif shape == "triangle":
+            sprite = pygame.Surface((2 * size, 2 * size), pygame.SRCALPHA)
+            pygame.draw.polygon(sprite, color, [(size, 0), (0, 2 * size), (2 * size, 2 * size)])
+        elif shape == "rect":
+            sprite = pygame.Surface(size, pygame.SRCALPHA)
+            sprite.fill(color)
+        else:
+            raise ValueError(f"Unknown tail shape: {shape}")
+        return sprite
+
+    def draw(self, surface, shape, size, color, points, max_alpha=255, colors=None):
+        # Oldest point first, fading from transparent up to max_alpha.
+        # `colors`, one per point, replaces `color` for tails whose hue changes
+        # along their length. Returns the bounding rect of the tail.
+        tail_length = len(points)
+        if tail_length == 0:
+            return None
+        if shape == "rect":
+            size, offset = tuple(size), 0
+        elif shape == "ring":
+            size = tuple(size)
+            offset = size[0]
+        else:
+            offset = size
+        if colors is None:
+            colors = [color] * tail_length
+        sequence = [
+            (self.sprite(shape, size, c, int(max_alpha * (i / tail_length))), (point[0] - offset, point[1] - offset))
+            for i, (point, c) in enumerate(zip(points, colors))
+        ]
+        fblits = getattr(surface, "fblits", None)
+        if fblits is not None:
+            fblits(sequence)
+        else:
+            surface.blits(sequence, doreturn=False)
+        xs = [position[0] for _, position in sequence]
+        ys = [position[1] for _, position in sequence]
+        width, height = sequence[0][0].get_size()
+        left, top = int(min(xs)), int(min(ys))
+        return pygame.Rect(left, top, int(max(xs)) - left + width + 1, int(max(ys)) - top + height + 1)
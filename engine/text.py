@@ -0,0 +1,82 @@
+"""Cached text rendering for the scenes' drawText and HUD overlays.
+
+Fonts are loaded once per size, rendered strings are kept in an LRU keyed by
+(text, font, colour, alpha) so HUD text that does not change between frames
+is never re-rendered, and strings made only of digits (countdowns, counters)
+are assembled from a per-font, per-colour strip of pre-rendered digits so
+they do not fill the LRU with one entry per value.
+"""
+from collections import OrderedDict
+
+import pygame
+
+DIGITS = "0123456789"
+
+
+class TextCache:
+    def __init__(self, max_entries=256, font_name=None):
+        self.max_entries = max_entries
+        self.font_name = font_name
+        self.fonts = {}
+        self.entries = OrderedDict()
+        self.strips = {}
+
+    def font(self, font):
+        # A size is looked up in the registry, a Font object is used as is
+        if not isinstance(font, int):
+            return font
+        loaded = self.fonts.get(font)
+        if loaded is None:
+            if not pygame.font.get_init():
+                pygame.font.init()
+            loaded = pygame.font.Font(self.font_name, font)
+            self.fonts[font] = loaded
+        return loaded
+
+    def render(self, text, font, color, alpha=255):
+        alpha = min(max(int(alpha), 0), 255)
+        key = (text, font, tuple(color), alpha)
+        surface = self.entries.get(key)
+        if surface is None:
+            surface = self.font(font).render(text, True, color)
+            surface.set_alpha(alpha)
+            self.entries[key] = surface
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        else:
+            self.entries.move_to_end(key)
+        return surface
+
+    def strip(self, font, color):
+        # Every digit rendered once side by side, with each digit's area
+        key = (font, tuple(color))
+        entry = self.strips.get(key)
+        if entry is None:
+            loaded = self.font(font)
+            glyphs = [loaded.render(digit, True, color) for digit in DIGITS]
+            image = pygame.Surface((sum(glyph.get_width() for glyph in glyphs), loaded.get_height()), pygame.SRCALPHA)
+            areas = {}
+            x = 0
+            for digit, glyph in zip(DIGITS, glyphs):
+                image.blit(glyph, (x, 0), special_flags=pygame.BLEND_RGBA_ADD)
+                areas[digit] = pygame.Rect(x, 0, glyph.get_width(), glyph.get_height())
+                x += glyph.get_width()
+            entry = (image, areas)
+            self.strips[key] = entry
+        return entry
+
+    def draw(self, surface, text, font, color, center, alpha=255):
+        # Blit text centred on `center`, like the scenes' drawText, and return
+        # the area drawn
+        if text.isdigit() and text.isascii():
+            image, areas = self.strip(font, color)
+            image.set_alpha(min(max(int(alpha), 0), 255))
+            rect = pygame.Rect(0, 0, sum(areas[digit].width for digit in text), image.get_height())
+            rect.center = center
+            x, y = rect.topleft
+            for digit in text:
+                surface.blit(image, (x, y), areas[digit])
+                x += areas[digit].width
+            return rect
+        image = self.render(text, font, color, alpha)
+        return surface.blit(image, image.get_rect(center=center))
@@ -0,0 +1,34 @@
+"""Retained off-screen layer for trails that never get cleared.
+
+Each new trail segment is stamped onto the layer once, so drawing the trail
+costs one blit per frame however long the history is. The layer is kept in
+white so the whole trail can be tinted to the current colour with one
+multiply, and an optional fade subtracts alpha from every pixel per frame.
+"""
+import pygame
+
+
+class TrailCanvas:
+    def __init__(self, size, fade=0):
+        self.surface = pygame.Surface(size, pygame.SRCALPHA)
+        self.tinted = pygame.Surface(size, pygame.SRCALPHA)
+        self.fade = fade  # Alpha removed from every pixel per frame, 0 keeps the trail forever
+
+    def stamp(self, sprite, position):
+        self.surface.blit(sprite, position)
+
+    def decay(self):
+        if self.fade:
+            self.surface.fill((0, 0, 0, self.fade), special_flags=pygame.BLEND_RGBA_SUB)
+
+    def clear(self):
+        self.surface.fill((0, 0, 0, 0))
+
+    def draw(self, target, color=None, position=(0, 0)):
+        if color is None:
+            target.blit(self.surface, position)
+            return
+        self.tinted.fill((0, 0, 0, 0))
+        self.tinted.blit(self.surface, (0, 0), special_flags=pygame.BLEND_RGBA_ADD)
+        self.tinted.fill((*color[:3], 255), special_flags=pygame.BLEND_RGBA_MULT)
+        target.blit(self.tinted, position)
@@ -0,0 +1,134 @@
+"""Frame writers for exporting a rendered scene as video.
+
+Frames are taken straight from the Surface's pixel buffer (get_buffer), not
+copied out through pygame.image.tobytes. Every write blocks until the frame
+is handed over, so a slow encoder slows the export down instead of dropping
+frames, and a fast one lets it run as quickly as the CPU can render.
+"""
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pygame
+
+
+def raw_pixel_format(surface):
+    # ffmpeg -pix_fmt name for the surface's in-memory byte order, None if
+    # the rows are padded or the layout has no raw format
+    bytesize = surface.get_bytesize()
+    if bytesize not in (3, 4) or surface.get_pitch() != surface.get_width() * bytesize:
+        return None
+    channels = ["0"] * bytesize
+    for name, shift, mask in zip("rgba", surface.get_shifts(), surface.get_masks()):
+        if mask:
+            channels[shift // 8] = name
+    if sys.byteorder == "big":
+        channels.reverse()
+    layout = "".join(channels)
+    if bytesize == 3:
+        return {"rgb": "rgb24", "bgr": "bgr24"}.get(layout)
+    return layout if layout in ("rgba", "bgra", "argb", "abgr", "rgb0", "bgr0", "0rgb", "0bgr") else None
+
+
+class FFmpegWriter:
+    # Streams raw frames to ffmpeg on stdin, which encodes them to `path`
+    def __init__(self, path, size, fps=60, pixel_format="bgr0", codec_args=("-c:v", "libx264", "-pix_fmt", "yuv420p")):
+        self.size = size
+        self.frames = 0
+        self.process = subprocess.Popen(
+            ["ffmpeg", "-loglevel", "error", "-y",
+             "-f", "rawvideo", "-pix_fmt", pixel_format, "-s", f"{size[0]}x{size[1]}", "-r", str(fps),
+             "-i", "-", *codec_args, path],
+            stdin=subprocess.PIPE,
+        )
+
+    def write(self, surface):
+        self.process.stdin.write(surface.get_buffer())
+        self.frames += 1
+
+    def close(self):
+        self.process.stdin.close()
+        if self.process.wait() != 0:
+            raise RuntimeError(f"ffmpeg exited with status {self.process.returncode}")
+
+
+class Y4MWriter:
+    # YUV4MPEG2 stream with full-resolution chroma (C444), readable by ffmpeg
+    # and most players without an encoder in the loop
+    def __init__(self, path, size, fps=60, header=True, offset=None):
+        # With an offset, frames are written into an existing file from that
+        # byte on and no header is written: parallel export workers each fill
+        # their own range of one pre-sized output file
+        self.size = size
+        self.frames = 0
+        if offset is None:
+            self.file = open(path, "wb")
+            if header:
+                self.file.write(self.header(size, fps))
+        else:
+            self.file = open(path, "r+b")
+            self.file.seek(offset)
+        self.planes = np.empty((3, size[1], size[0]), dtype=np.uint8)
+
+    @staticmethod
+    def header(size, fps):
+        return f"YUV4MPEG2 W{size[0]} H{size[1]} F{fps}:1 Ip A1:1 C444\n".encode()
+
+    @staticmethod
+    def frame_bytes(size):
+        return len(b"FRAME\n") + 3 * size[0] * size[1]
+
+    def write(self, surface):
+        # BT.601 studio-range conversion in integer arithmetic, reading the
+        # surface buffer in place when its rows are not padded
+        width, height = self.size
+        if surface.get_bytesize() == 4 and surface.get_pitch() == width * 4:
+            pixels = np.frombuffer(surface.get_buffer(), np.uint8).reshape(height, width, 4)
+            index = [shift // 8 if sys.byteorder == "little" else 3 - shift // 8 for shift in surface.get_shifts()[:3]]
+        else:
+            pixels = pygame.surfarray.pixels3d(surface).transpose(1, 0, 2)
+            index = [0, 1, 2]
+        r, g, b = (pixels[..., i].astype(np.int32) for i in index)
+        np.right_shift(66 * r + 129 * g + 25 * b + 4224, 8, out=self.planes[0], casting="unsafe")
+        np.right_shift(-38 * r - 74 * g + 112 * b + 32896, 8, out=self.planes[1], casting="unsafe")
+        np.right_shift(112 * r - 94 * g - 18 * b + 32896, 8, out=self.planes[2], casting="unsafe")
+        self.file.write(b"FRAME\n")
+        self.file.write(self.planes)
+        self.frames += 1
+
+    def close(self):
+        self.file.close()
+
+
+class PNGWriter:
+    # One PNG per frame, `pattern` is a path with a %d style frame number
+    def __init__(self, pattern, size=None, fps=60, start=0):
+        self.pattern = pattern
+        self.frames = start
+        directory = os.path.dirname(pattern)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def write(self, surface):
+        pygame.image.save(surface, self.pattern % self.frames)
+        self.frames += 1
+
+    def close(self):
+        pass
+
+
+def open_writer(path, surface, fps=60):
+    # Pick a writer from the output path: a %d pattern or .png for a PNG
+    # sequence, .y4m for YUV4MPEG2, anything else is encoded by ffmpeg
+    size = surface.get_size()
+    if "%" in path or path.endswith(".png"):
+        if "%" not in path:
+            path = path[:-len(".png")] + "-%05d.png"
+        return PNGWriter(path, size, fps)
+    if path.endswith(".y4m"):
+        return Y4MWriter(path, size, fps)
+    pixel_format = raw_pixel_format(surface)
+    if pixel_format is None:
+        raise ValueError("Surface layout has no matching ffmpeg raw pixel format, export to .y4m or .png instead")
+    return FFmpegWriter(path, size, fps, pixel_format)
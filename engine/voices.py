@@ -0,0 +1,80 @@
+"""note_off scheduling for a pygame.midi.Output.
+
+The scenes used to send note_on for every bounce and never a note_off, so
+voices piled up on the synth until it started stealing or dropping them.
+NoteScheduler sends the note_on, remembers when the note should end in a heap
+and sends the note_off from update(), which the main loop calls once a frame
+and which never blocks. Each pitch holds at most `voices_per_pitch` voices:
+hitting the cap releases that pitch's oldest voice first.
+"""
+import heapq
+import time
+from collections import defaultdict, deque
+
+
+class NoteScheduler:
+    def __init__(self, midi_output, default_duration=0.25, voices_per_pitch=2, channel=0, clock=time.monotonic):
+        self.midi_output = midi_output
+        self.default_duration = default_duration
+        self.voices_per_pitch = voices_per_pitch
+        self.channel = channel
+        self.clock = clock
+        self.pending = []  # (off_time, voice, pitch) heap
+        self.sounding = defaultdict(deque)  # pitch -> voices not yet released, oldest first
+        self.voice = 0
+
+    def __len__(self):
+        # Voices still sounding
+        return sum(len(voices) for voices in self.sounding.values())
+
+    def note_on(self, pitch, velocity, duration=None, now=None):
+        # Duration in seconds, usually a compiled note's; the default otherwise
+        if now is None:
+            now = self.clock()
+        if duration is None:
+            duration = self.default_duration
+
+        voices = self.sounding[pitch]
+        while len(voices) >= self.voices_per_pitch:
+            voices.popleft()  # Its heap entry is skipped when it comes due
+            self.midi_output.note_off(pitch, 0, self.channel)
+
+        self.voice += 1
+        voices.append(self.voice)
+        heapq.heappush(self.pending, (now + duration, self.voice, pitch))
+        self.midi_output.note_on(pitch, velocity, self.channel)
+
+    def update(self, now=None):
+        # Send the note_offs that are due, returns how many were sent
+        if now is None:
+            now = self.clock()
+        sent = 0
+        while self.pending and self.pending[0][0] <= now:
+            _, voice, pitch = heapq.heappop(self.pending)
+            if self.release(pitch, voice):
+                sent += 1
+        return sent
+
+    def flush(self):
+        # Release every voice now, for pygame.QUIT and before closing the port
+        sent = 0
+        while self.pending:
+            _, voice, pitch = heapq.heappop(self.pending)
+            if self.release(pitch, voice):
+                sent += 1
+        return sent
+
+    def release(self, pitch, voice):
+        # Stolen voices were already released when they were stolen
+        voices = self.sounding.get(pitch)
+        if not voices or voice not in voices:
+            return False
+        voices.remove(voice)
+        if not voices:
+            del self.sounding[pitch]
+        self.midi_output.note_off(pitch, 0, self.channel)
+        return True
+
+    def close(self):
+        self.flush()
+        self.midi_output.close()
@@ -1,9 +1,15 @@
 import pygame
 import sys
 import math
-import random
 import pygame.midi
-from mido import MidiFile
+from engine.notes import NoteSequence
+from engine.output import OutputWorker
+from engine.voices import NoteScheduler
+from engine import RingSector
+from engine.tails import TailCache
+from engine.hue import hue_color
+from engine.text import TextCache
+from engine.particles import ParticlePool
 
 # Initialize Pygame and MIDI
 pygame.init()
@@ -12,6 +18,10 @@ output_device_id = 0
 midi_output = pygame.midi.Output(output_device_id)
 midi_output.set_instrument(38)
 
+# MIDI notes are sent from a background thread
+audio_output = OutputWorker(midi_output)
+note_scheduler = NoteScheduler(audio_output)
+
 # Screen dimensions
 WIDTH, HEIGHT = 800, 800
 screen = pygame.display.set_mode((WIDTH, HEIGHT))
@@ -29,43 +39,20 @@ big_ball4_radius = 300
 big_ball_center = (WIDTH // 2, HEIGHT // 2)
 gravity = pygame.Vector2(0, 0.15)
 
-# Load MIDI file and pre-process note_on messages
-midi_file = MidiFile("midi/levelsfive.mid")
-note_on_messages = [msg for msg in midi_file if msg.type == 'note_on']
-note_index = 0
+# Load MIDI file, its notes are compiled once and shared by every cursor
+note_sequence = NoteSequence.load("midi/levelsfive.mid")
+note_cursor = note_sequence.cursor()
 
 # Font initialization
 font = pygame.font.Font(None, 36)
+text_cache = TextCache()
 
-# Create the big ball mask with an arc and a customizable gap
-def create_big_ball_mask(radius, hue, arc_width=10, start_angle=0.5, end_angle=2 * math.pi):
-    color = pygame.Color(0)
-    color.hsla = (hue, 100, 50, 100)
-    image = pygame.Surface((2 * radius, 2 * radius), pygame.SRCALPHA)
-    rect = image.get_rect()
-    pygame.draw.arc(image, color, rect, start_angle, end_angle, arc_width)
-    mask = pygame.mask.from_surface(image)
-    return mask, image
-
-class Particle:
-    def __init__(self, position, velocity, color, lifespan):
-        self.position = pygame.Vector2(position)
-        self.velocity = pygame.Vector2(velocity)
-        self.color = pygame.Color(*color[:3], 255)  # Ensure the color has an alpha value
-        self.lifespan = lifespan
-
-    def update(self):
-        self.position += self.velocity
-        self.velocity += gravity  # Apply gravity to particles
-        self.lifespan -= 2
-        if self.lifespan < 0:
-            self.lifespan = 0
+# Faded tail sprites for MiniBall.draw_tail
+tail_cache = TailCache()
 
-    def draw(self, screen):
-        if self.lifespan > 0:
-            alpha = int(255 * (self.lifespan / 50))
-            color = pygame.Color(self.color.r, self.color.g, self.color.b, alpha)
-            pygame.draw.circle(screen, color, (int(self.position.x), int(self.position.y)), 3)
+# Draw the big ball arc straight onto the screen, collisions are tested analytically
+def draw_big_ball(surface, ring, hue):
+    pygame.draw.arc(surface, hue_color(hue), ring.bounds, ring.start_angle, ring.end_angle, ring.thickness)
 
 class MiniBall:
     def __init__(self, color, initial_position, radius, velocity):
@@ -96,34 +83,19 @@ class MiniBall:
         if len(self.tail) > 10:  # Limit the tail length
             self.tail.pop(0)
 
-    def check_collision(self, big_mask, big_ball_rect):
-        mini_ball_rect = self.image.get_rect(center=(int(self.position.x), int(self.position.y)))
-        offset = (mini_ball_rect.left - big_ball_rect.left, mini_ball_rect.top - big_ball_rect.top)
-        if big_mask.overlap(self.mask, offset):
-            return True
-        return False
+    def check_collision(self, ring):
+        return ring.contact(self.position, self.radius) is not None
     
     def draw_tail(self, screen):
-        tail_length = len(self.tail)
-        for i in range(tail_length):
-            alpha = int(128 * (i / tail_length))  # Fading effect
-            tail_color = (*self.color[:3], alpha)
-            tail_surface = pygame.Surface((2 * self.radius, 2 * self.radius), pygame.SRCALPHA)
-            pygame.draw.circle(tail_surface, tail_color, (self.radius, self.radius), self.radius)
-            screen.blit(tail_surface, (self.tail[i].x - self.radius, self.tail[i].y - self.radius))
+        tail_cache.draw(screen, "circle", self.radius, self.color, self.tail, 128)
 
     @staticmethod
     def play_collision_note():
-        global note_index
-        if note_index >= len(note_on_messages):
-            note_index = 0
-
-        msg = note_on_messages[note_index]
-        note_index += 1
+        msg = note_cursor.next()
 
         velocity = 100  # Volume (0-127)
         pitch = msg.note + 1  # Transpose up one octave
-        midi_output.note_on(pitch, velocity)
+        note_scheduler.note_on(pitch, velocity, msg.duration)
 
     def bounce(self, particles, normal, radius_circle):
         self.position = self.prevPos.copy()
@@ -142,24 +114,10 @@ class MiniBall:
         pygame.draw.circle(screen, WHITE, (self.position.x, self.position.y), self.radius, 4)
 
 def drawText(text, font, color, surface, x, y, size=36, alpha=255):
-    textobj = font.render(text, True, color)
-    textobj.set_alpha(alpha)
-    textrect = textobj.get_rect()
-    textrect.center = (x, y)
-    surface.blit(textobj, textrect)
+    text_cache.draw(surface, text, font, color, (x, y), alpha)
 
 def create_particles_around_circle(center, radius, particles, hue, num_particles=100):
-    for _ in range(num_particles):
-        angle = random.uniform(0, 2 * math.pi)
-        position = pygame.Vector2(
-            center[0] + math.cos(angle) * radius,
-            center[1] + math.sin(angle) * radius
-        )
-        velocity = pygame.Vector2(random.uniform(-2, 2), random.uniform(-2, 2))
-        color = pygame.Color(0)
-        color.hsla = (hue, 100, 50, 100)
-        lifespan = random.randint(30, 50)
-        particles.append(Particle(position, velocity, color, lifespan))
+    particles.emit_ring(center, radius, num_particles, 2, hue_color(hue))
 
 # Main loop
 clock = pygame.time.Clock()
@@ -167,7 +125,7 @@ clock = pygame.time.Clock()
 # Start with two mini balls
 mini_ball = MiniBall((255, 0, 0), (WIDTH / 2 - 10, HEIGHT / 2 - 90), radius=15, velocity=[-2, -2])
 
-particles = []
+particles = ParticlePool(gravity=gravity)
 
 running = False
 
@@ -199,9 +157,12 @@ big_ball4_visible = True  # Flag to control visibility of the big ball
 
 while True:
     clock.tick(60)
+    note_scheduler.update()
 
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
+            note_scheduler.flush()
+            audio_output.stop()
             pygame.quit()
             midi_output.close()
             sys.exit(0)
@@ -232,10 +193,9 @@ while True:
         # ----------------------------------------------------------------------------------------------------------------
         # Check collisions for mini_ball
         if big_ball_visible:
-            big_ball_mask, big_ball_image = create_big_ball_mask(big_ball_radius, hue1, 5, start_angle, end_angle)
-            big_ball_rect = big_ball_image.get_rect(center=big_ball_center)
+            big_ball = RingSector(big_ball_center, big_ball_radius, 5, start_angle, end_angle)
 
-            if mini_ball.check_collision(big_ball_mask, big_ball_rect):
+            if mini_ball.check_collision(big_ball):
                 normal = (mini_ball.position - pygame.Vector2(big_ball_center)).normalize()
                 mini_ball.bounce(particles, normal, big_ball_radius)
                 MiniBall.play_collision_note()
@@ -258,10 +218,9 @@ while True:
         # ----------------------------------------------------------------------------------------------------------------
         # Check collisions for mini_ball
         if big_ball2_visible:
-            big_ball2_mask, big_ball2_image = create_big_ball_mask(big_ball2_radius, hue2, 5, start_angle2, end_angle2)
-            big_ball2_rect = big_ball2_image.get_rect(center=big_ball_center)
+            big_ball2 = RingSector(big_ball_center, big_ball2_radius, 5, start_angle2, end_angle2)
 
-            if mini_ball.check_collision(big_ball2_mask, big_ball2_rect):
+            if mini_ball.check_collision(big_ball2):
                 normal = (mini_ball.position - pygame.Vector2(big_ball_center)).normalize()
                 mini_ball.bounce(particles, normal, big_ball2_radius)
                 MiniBall.play_collision_note()
@@ -284,10 +243,9 @@ while True:
         # ----------------------------------------------------------------------------------------------------------------
         # Check collisions for mini_ball
         if big_ball3_visible:
-            big_ball3_mask, big_ball3_image = create_big_ball_mask(big_ball3_radius, hue3, 5, start_angle3, end_angle3)
-            big_ball3_rect = big_ball3_image.get_rect(center=big_ball_center)
+            big_ball3 = RingSector(big_ball_center, big_ball3_radius, 5, start_angle3, end_angle3)
 
-            if mini_ball.check_collision(big_ball3_mask, big_ball3_rect):
+            if mini_ball.check_collision(big_ball3):
                 normal = (mini_ball.position - pygame.Vector2(big_ball_center)).normalize()
                 mini_ball.bounce(particles, normal, big_ball3_radius)
                 MiniBall.play_collision_note()
@@ -310,10 +268,9 @@ while True:
         # ----------------------------------------------------------------------------------------------------------------
         # Check collisions for mini_ball
         if big_ball4_visible:
-            big_ball4_mask, big_ball4_image = create_big_ball_mask(big_ball4_radius, hue4, 5, start_angle4, end_angle4)
-            big_ball4_rect = big_ball4_image.get_rect(center=big_ball_center)
+            big_ball4 = RingSector(big_ball_center, big_ball4_radius, 5, start_angle4, end_angle4)
 
-            if mini_ball.check_collision(big_ball4_mask, big_ball4_rect):
+            if mini_ball.check_collision(big_ball4):
                 normal = (mini_ball.position - pygame.Vector2(big_ball_center)).normalize()
                 mini_ball.bounce(particles, normal, big_ball4_radius)
                 MiniBall.play_collision_note()
@@ -335,26 +292,23 @@ while True:
                 big_ball4_visible = False
 
         # Update and draw particles
-        for particle in particles:
-            particle.update()
-        particles = [particle for particle in particles if particle.lifespan > 0]
+        particles.update()
 
         # Draw everything
         screen.fill(BLACK)
 
         if big_ball_visible:
-            screen.blit(big_ball_image, big_ball_rect.topleft)
+            draw_big_ball(screen, big_ball, hue1)
         if big_ball2_visible:
-            screen.blit(big_ball2_image, big_ball2_rect.topleft)
+            draw_big_ball(screen, big_ball2, hue2)
         if big_ball3_visible:
-            screen.blit(big_ball3_image, big_ball3_rect.topleft)
+            draw_big_ball(screen, big_ball3, hue3)
         if big_ball4_visible:
-            screen.blit(big_ball4_image, big_ball4_rect.topleft)
+            draw_big_ball(screen, big_ball4, hue4)
 
         mini_ball.draw(screen)
 
-        for particle in particles:
-            particle.draw(screen)
+        particles.draw(screen)
 
         # Status text
         drawText(f"Size: {round(mini_ball.radius, 2)}", font, (255, 255, 255), screen, WIDTH / 2, 45, 26, 1000)
@@ -2,8 +2,13 @@ import pygame
 import sys
 import math
 import pygame.midi
-from mido import MidiFile
-import random
+from engine.notes import NoteSequence
+from engine.output import OutputWorker
+from engine.voices import NoteScheduler
+from engine.arc_cache import ArcCache
+from engine.tails import TailCache
+from engine.text import TextCache
+from engine.particles import ParticlePool
 
 # Initialize Pygame
 pygame.init()
@@ -12,6 +17,10 @@ pygame.midi.init()
 midi_output = pygame.midi.Output(pygame.midi.get_default_output_id())
 midi_output.set_instrument(15)
 
+# MIDI notes and sound effects are sent from a background thread
+audio_output = OutputWorker(midi_output)
+note_scheduler = NoteScheduler(audio_output)
+
 # Screen dimensions
 WIDTH, HEIGHT = 800, 800
 screen = pygame.display.set_mode((WIDTH, HEIGHT))
@@ -27,33 +36,17 @@ big_ball_center = (WIDTH // 2, HEIGHT // 2)
 gravity = pygame.Vector2(0, 0.18)
 
 # Load MIDI file
-midi_file = MidiFile("midi/levelll.mid")
-note_on_messages = [msg for msg in midi_file if msg.type == 'note_on']
-note_index = 0
+note_sequence = NoteSequence.load("midi/levelll.mid")
+note_cursor = note_sequence.cursor()
 
 # Font initialization
 font = pygame.font.Font(None, 36)
+text_cache = TextCache()
 
-baba_sound = pygame.mixer.Sound("sounds/BABABOI.mp3")
-
-class Particle:
-    def __init__(self, position, velocity, color, lifespan):
-        self.position = pygame.Vector2(position)
-        self.velocity = pygame.Vector2(velocity)
-        self.color = color
-        self.lifespan = lifespan
-
-    def update(self):
-        self.position += self.velocity
-        self.lifespan -= 2
-        if self.lifespan < 0: 
-            self.lifespan = 0
+# Faded tail sprites for MiniBall.draw_tail
+tail_cache = TailCache()
 
-    def draw(self, screen):
-        if self.lifespan > 0:
-            alpha = int(255 * (self.lifespan / 50))
-            color = self.color + (alpha,)
-            pygame.draw.circle(screen, color, (int(self.position.x), int(self.position.y)), 3)
+baba_sound = pygame.mixer.Sound("sounds/BABABOI.mp3")
 
 class MiniBall:
     def __init__(self, color, initial_position, radius, velocity):
@@ -80,17 +73,14 @@ class MiniBall:
             self.tail.pop(0)
 
     def draw_tail(self, screen):
-        tail_length = len(self.tail)
         self.tail_color_phase += 0.01  # Update the phase to animate the wave more slowly
-        for i in range(tail_length):
-            alpha = int(255 * (i / tail_length))  # Fading effect
+        colors = []
+        for i in range(len(self.tail)):
             hue = (self.tail_color_phase + i * 0.08) % 1.0  # Calculate hue for the wave effect, adjust step for slower change
             tail_color = pygame.Color(0)
-            tail_color.hsva = (hue * 360, 100, 100)  # Convert HSV to RGB
-            tail_color.a = alpha  # Set the alpha value separately
-            tail_surface = pygame.Surface((2 * self.radius, 2 * self.radius), pygame.SRCALPHA)
-            pygame.draw.circle(tail_surface, tail_color, (self.radius, self.radius), self.radius)
-            screen.blit(tail_surface, (self.tail[i].x - self.radius, self.tail[i].y - self.radius))
+            tail_color.hsva = (int(hue * 360), 100, 100)  # Whole degrees, so the cached sprites get reused
+            colors.append(tail_color)
+        tail_cache.draw(screen, "circle", self.radius, None, self.tail, colors=colors)
 
     def check_collision(self, big_mask, big_ball_rect):
         mini_ball_rect = self.image.get_rect(center=(int(self.position.x), int(self.position.y)))
@@ -101,16 +91,11 @@ class MiniBall:
 
     @staticmethod
     def play_collision_note():
-        global note_index
-        if note_index >= len(note_on_messages):
-            note_index = 0
-
-        msg = note_on_messages[note_index]
-        note_index += 1
+        msg = note_cursor.next()
 
         velocity = 100  # Volume (0-127)
         pitch = msg.note + 2  # Transpose up one octave
-        midi_output.note_on(pitch, velocity)
+        note_scheduler.note_on(pitch, velocity, msg.duration)
 
     def bounce(self, normal, particles):
         # Calculate the collision point
@@ -130,11 +115,7 @@ class MiniBall:
         self.createParticles(collision_point, particles)
 
     def createParticles(self, collision_point, particles, num_particles=10):
-        for _ in range(num_particles):
-            velocity = pygame.Vector2(random.uniform(-3, 3), random.uniform(-3, 3))
-            color = (255, 255, 255)
-            lifespan = random.randint(30, 50)
-            particles.append(Particle(collision_point, velocity, color, lifespan))
+        particles.emit(collision_point, num_particles, 3, (255, 255, 255))
 
     def explode(self, particles):
         collision_point = self.position
@@ -149,35 +130,38 @@ class MiniBall:
             pygame.draw.circle(screen, WHITE, (self.position.x, self.position.y), self.radius, 10)
 
 def drawText(text, font, color, surface, x, y, size=36, alpha=255):
-    font = pygame.font.Font(None, size)
-    textobj = font.render(text, True, color)
-    textobj.set_alpha(alpha)
-    textrect = textobj.get_rect()
-    textrect.center = (x, y)
-    surface.blit(textobj, textrect)
+    text_cache.draw(surface, text, size, color, (x, y), alpha)
 
 # Create the big ball mask with gaps at specified angles
 def create_big_ball_mask(radius, color, arc_width=10, gaps=[]):
     image = pygame.Surface((2 * radius, 2 * radius), pygame.SRCALPHA)
     rect = image.get_rect()
-    full_circle = 2 * math.pi
 
     if not gaps:
         pygame.draw.circle(image, color, (radius, radius), radius, arc_width + 1)
     else:
-        gaps = sorted(gaps)
-        start_angle = 0
-        for gap_start, gap_end in gaps:
-            if start_angle < gap_start:
-                pygame.draw.arc(image, color, rect, start_angle, gap_start, arc_width)
-            start_angle = gap_end
-        if start_angle < full_circle:
-            pygame.draw.arc(image, color, rect, start_angle, full_circle, arc_width)
+        for start_angle, end_angle in arc_segments(gaps):
+            pygame.draw.arc(image, color, rect, start_angle, end_angle, arc_width)
 
     mask = pygame.mask.from_surface(image)
 
     return mask, image
 
+# The arcs left between the gaps
+def arc_segments(gaps, offset=0):
+    segments = []
+    start_angle = 0
+    for gap_start, gap_end in sorted(gaps):
+        if start_angle < gap_start:
+            segments.append((start_angle + offset, gap_start + offset))
+        start_angle = gap_end
+    if start_angle < 2 * math.pi:
+        segments.append((start_angle + offset, 2 * math.pi + offset))
+    return segments
+
+# Rotated images of the gapped ring, reused until the gaps change
+arc_cache = ArcCache()
+
 # Main loop
 clock = pygame.time.Clock()
 
@@ -190,7 +174,7 @@ colorDir = 1
 
 # Start with one mini ball
 mini_ball = MiniBall((0, 0, 0), (WIDTH / 2, HEIGHT / 2), radius=55, velocity=[-6, -6])
-particles = []
+particles = ParticlePool()
 
 running = False
 
@@ -199,16 +183,20 @@ rotation_angle = 0  # Initialize rotation angle
 rotation_speed = 0.6  # Rotation speed
 
 # Initialize big ball masks and images
-big_ball_mask, big_ball_image = create_big_ball_mask(big_ball_radius, (color.r, color.g, color.b), 9, collision_points)
+big_ball_color = (color.r, color.g, color.b)
+big_ball_mask, big_ball_image = create_big_ball_mask(big_ball_radius, big_ball_color, 9, collision_points)
 big_ball_rect = big_ball_image.get_rect(center=big_ball_center)
 
 bounce_count = 0  # Initialize bounce counter
 
 while True:
     clock.tick(60)
+    note_scheduler.update()
 
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
+            note_scheduler.flush()
+            audio_output.stop()
             pygame.quit()
             midi_output.close()
             sys.exit(0)
@@ -243,12 +231,13 @@ while True:
                     current_start, current_end = start, end
             merged_gaps.append((current_start, current_end))
             collision_points = merged_gaps
-            big_ball_mask, big_ball_image = create_big_ball_mask(big_ball_radius, (color.r, color.g, color.b), 9, collision_points)
+            big_ball_color = (color.r, color.g, color.b)
+            big_ball_mask, big_ball_image = create_big_ball_mask(big_ball_radius, big_ball_color, 9, collision_points)
             big_ball_rect = big_ball_image.get_rect(center=big_ball_center)
 
         # Trigger explosion after 60 bounces
         if bounce_count >= 60 and mini_ball.radius > 0:
-            baba_sound.play()
+            audio_output.play(baba_sound)
             mini_ball.explode(particles)
 
         # Changing color effect
@@ -262,22 +251,22 @@ while True:
             colorDir = 1
 
         # Update and draw particles
-        for particle in particles:
-            particle.update()
-        particles = [particle for particle in particles if particle.lifespan > 0]
+        particles.update()
 
         # Draw everything
         screen.fill(BLACK)
 
         # Rotate the big ball image
         rotation_angle += rotation_speed  # Adjust the rotation speed as needed
-        rotated_big_ball_image = pygame.transform.rotate(big_ball_image, rotation_angle)
+        if collision_points:
+            _, rotated_big_ball_image = arc_cache.get_arcs(big_ball_radius, big_ball_color, 9, arc_segments(collision_points, math.radians(rotation_angle)))
+        else:
+            rotated_big_ball_image = big_ball_image
         rotated_rect = rotated_big_ball_image.get_rect(center=big_ball_center)
         screen.blit(rotated_big_ball_image, rotated_rect.topleft)
         
         mini_ball.draw(screen, bounce_count)
 
-        for particle in particles:
-            particle.draw(screen)
+        particles.draw(screen)
 
         pygame.display.flip()
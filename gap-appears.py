@@ -2,7 +2,11 @@ import pygame
 import sys
 import math
 import pygame.midi
-from mido import MidiFile
+from engine.notes import NoteSequence
+from engine.output import OutputWorker
+from engine.voices import NoteScheduler
+from engine.tails import TailCache
+from engine.text import TextCache
 
 # Initialize Pygame
 pygame.init()
@@ -11,6 +15,10 @@ output_device_id = 0
 midi_output = pygame.midi.Output(output_device_id)
 midi_output.set_instrument(38)
 
+# MIDI notes are sent from a background thread
+audio_output = OutputWorker(midi_output)
+note_scheduler = NoteScheduler(audio_output)
+
 # Screen dimensions
 WIDTH, HEIGHT = 800, 800
 screen = pygame.display.set_mode((WIDTH, HEIGHT))
@@ -26,10 +34,14 @@ big_ball_center = (WIDTH // 2, HEIGHT // 2)
 gravity = pygame.Vector2(0, 0.15)
 
 # Load MIDI file
-midi_file = MidiFile("midi/tokyo.mid")
+note_sequence = NoteSequence.load("midi/tokyo.mid")
 
 # Font initialization
 font = pygame.font.Font(None, 36)
+text_cache = TextCache()
+
+# Faded tail sprites for MiniBall.draw_tail
+tail_cache = TailCache()
 
 class MiniBall:
     def __init__(self, color, initial_position, radius, velocity):
@@ -37,7 +49,7 @@ class MiniBall:
         self.prevPos = self.position.copy()
         self.radius = radius
         self.velocity = pygame.Vector2(velocity)
-        self.note_iterator = iter(midi_file)  # MIDI note iterator
+        self.note_cursor = note_sequence.cursor()  # Position in the song
         self.color = color
         self.image = pygame.Surface((2 * radius, 2 * radius), pygame.SRCALPHA)
         pygame.draw.circle(self.image, color, (radius, radius), radius)
@@ -56,13 +68,7 @@ class MiniBall:
             self.tail.pop(0)
 
     def draw_tail(self, screen):
-        tail_length = len(self.tail)
-        for i in range(tail_length):
-            alpha = int(200 * (i / tail_length))  # Fading effect
-            tail_color = (*self.color[:3], alpha)
-            tail_surface = pygame.Surface((2 * self.radius, 2 * self.radius), pygame.SRCALPHA)
-            pygame.draw.circle(tail_surface, tail_color, (self.radius, self.radius), self.radius)
-            screen.blit(tail_surface, (self.tail[i].x - self.radius, self.tail[i].y - self.radius))
+        tail_cache.draw(screen, "circle", self.radius, self.color, self.tail, 200)
 
     def check_collision(self, big_mask, big_ball_rect):
         mini_ball_rect = self.image.get_rect(center=(int(self.position.x), int(self.position.y)))
@@ -72,20 +78,12 @@ class MiniBall:
         return False
 
     def play_collision_note(self):
-        msg = next(self.note_iterator, None)
-        while msg and msg.type != "note_on":
-            msg = next(self.note_iterator, None)
-
-        if msg is None:
-            self.note_iterator = iter(midi_file)
-            msg = next(self.note_iterator, None)
-            while msg and msg.type != "note_on":
-                msg = next(self.note_iterator, None)
+        msg = self.note_cursor.next()
 
         if msg:
             velocity = 100  # Volume (0-127)
             pitch = msg.note + 10 # Transpose up one octave
-            midi_output.note_on(pitch, velocity)
+            note_scheduler.note_on(pitch, velocity, msg.duration)
 
     def bounce(self, normal):
         # Use previous position to bounce
@@ -101,12 +99,7 @@ class MiniBall:
         screen.blit(self.image, (int(self.position.x) - self.radius, int(self.position.y) - self.radius))
 
 def drawText(text, font, color, surface, x, y, size=36, alpha=255):
-    font = pygame.font.Font(None, size)
-    textobj = font.render(text, True, color)
-    textobj.set_alpha(alpha)
-    textrect = textobj.get_rect()
-    textrect.center = (x, y)
-    surface.blit(textobj, textrect)
+    text_cache.draw(surface, text, size, color, (x, y), alpha)
 
 # Create the big ball mask with gaps at specified angles
 def create_big_ball_mask(radius, color, arc_width=10, gaps=[]):
@@ -166,9 +159,12 @@ big_ball_rect = big_ball_image.get_rect(center=big_ball_center)
 
 while True:
     clock.tick(60)
+    note_scheduler.update()
 
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
+            note_scheduler.flush()
+            audio_output.stop()
             pygame.quit()
             midi_output.close()
             sys.exit(0)
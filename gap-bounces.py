@@ -3,7 +3,13 @@ import sys
 import math
 import random
 import pygame.midi
-from mido import MidiFile, MidiTrack, Message
+from engine.notes import NoteSequence
+from engine.output import OutputWorker
+from engine.voices import NoteScheduler
+from engine import RingSector
+from engine.tails import TailCache
+from engine.text import TextCache
+from engine.particles import ParticlePool
 
 # Initialize Pygame
 pygame.init()
@@ -12,6 +18,10 @@ output_device_id = 0
 midi_output = pygame.midi.Output(output_device_id)
 midi_output.set_instrument(38)
 
+# MIDI notes are sent from a background thread
+audio_output = OutputWorker(midi_output)
+note_scheduler = NoteScheduler(audio_output)
+
 # Screen dimensions
 WIDTH, HEIGHT = 800, 800
 screen = pygame.display.set_mode((WIDTH, HEIGHT))
@@ -28,30 +38,15 @@ big_ball_center = (WIDTH // 2, HEIGHT // 2)
 gravity = pygame.Vector2(0, 0.25)
 
 # Load MIDI file
-midi_file = MidiFile("midi/alonewalker.mid")
-midi_iterator = iter(midi_file)
+note_sequence = NoteSequence.load("midi/alonewalker.mid")
+note_cursor = note_sequence.cursor()
 
 # Font initialization
 font = pygame.font.Font(None, 36)
+text_cache = TextCache()
 
-class Particle:
-    def __init__(self, position, velocity, color, lifespan):
-        self.position = pygame.Vector2(position)
-        self.velocity = pygame.Vector2(velocity)
-        self.color = color
-        self.lifespan = lifespan
-
-    def update(self):
-        self.position += self.velocity
-        self.lifespan -= 2
-        if self.lifespan < 0:
-            self.lifespan = 0
-
-    def draw(self, screen):
-        if self.lifespan > 0:
-            alpha = int(255 * (self.lifespan / 50))
-            color = self.color + (alpha,)
-            pygame.draw.circle(screen, color, (int(self.position.x), int(self.position.y)), 3)
+# Faded tail sprites for MiniBall.draw_tail
+tail_cache = TailCache()
 
 class MiniBall:
     def __init__(self, color, initial_position, radius, velocity):
@@ -81,12 +76,8 @@ class MiniBall:
         if len(self.tail) > 20:  # Limit the tail length
             self.tail.pop(0)
 
-    def check_collision(self, big_mask, big_ball_rect):
-        mini_ball_rect = self.image.get_rect(center=(int(self.position.x), int(self.position.y)))
-        offset = (mini_ball_rect.left - big_ball_rect.left, mini_ball_rect.top - big_ball_rect.top)
-        if big_mask.overlap(self.mask, offset):
-            return True
-        return False
+    def check_collision(self, ring):
+        return ring.contact(self.position, self.radius) is not None
 
     def check_collision_with_stationary(self, stationary_balls):
         for ball in stationary_balls:
@@ -96,21 +87,12 @@ class MiniBall:
         return False, None
 
     def play_collision_note():
-        global midi_iterator
-        msg = next(midi_iterator, None)
-        while msg and msg.type != "note_on":
-            msg = next(midi_iterator, None)
-
-        if msg is None:
-            midi_iterator = iter(midi_file)
-            msg = next(midi_iterator, None)
-            while msg and msg.type != "note_on":
-                msg = next(midi_iterator, None)
+        msg = note_cursor.next()
 
         if msg:
             velocity = 100  # Volume (0-127)
             pitch = msg.note + 2  # Transpose up one octave
-            midi_output.note_on(pitch, velocity)
+            note_scheduler.note_on(pitch, velocity, msg.duration)
 
     def bounce(self, particles):
         # Calculate the collision point
@@ -166,21 +148,10 @@ class MiniBall:
         self.bounce_count += 1  # Increment bounce count
 
     def draw_tail(self, screen):
-        tail_length = len(self.tail)
-        for i in range(tail_length):
-            alpha = int(255 * (i / tail_length))  # Fading effect
-            tail_color = (*self.color[:3], alpha)
-            tail_surface = pygame.Surface((2 * self.radius, 2 * self.radius), pygame.SRCALPHA)
-            pygame.draw.circle(tail_surface, tail_color, (self.radius, self.radius), self.radius, 3)
-            screen.blit(tail_surface, (self.tail[i].x - self.radius, self.tail[i].y - self.radius))
+        tail_cache.draw(screen, "ring", (self.radius, 3), self.color, self.tail)
 
     def createParticles(self, collision_point, particles):
-        num_particles = 10
-        for _ in range(num_particles):
-            velocity = pygame.Vector2(random.uniform(-3, 3), random.uniform(-3, 3))
-            color = (random.randint(200, 255), random.randint(100, 255), random.randint(100, 255))
-            lifespan = random.randint(30, 50)
-            particles.append(Particle(collision_point, velocity, color, lifespan))
+        particles.emit(collision_point, 10, 3)
 
     def update_color(self, h):
         self.color.hsla = (h, self.saturation, self.lightness, 100)
@@ -200,21 +171,11 @@ class MiniBall:
         pygame.draw.circle(screen, WHITE, (self.position.x, self.position.y), self.radius, 3)
 
 def drawText(text, font, color, surface, x, y, size=36, alpha=255):
-    textobj = font.render(text, True, color)
-    textobj.set_alpha(alpha)
-    textrect = textobj.get_rect()
-    textrect.center = (x, y)
-    surface.blit(textobj, textrect)
-
-# Create the big ball mask with an arc and a customizable gap
-def create_big_ball_mask(radius, color, arc_width=10, start_angle=0.5, end_angle=2 * math.pi):
-    image = pygame.Surface((2 * radius, 2 * radius), pygame.SRCALPHA)
-    rect = image.get_rect()
-    pygame.draw.arc(image, color, rect, start_angle, end_angle, arc_width)
-
-    mask = pygame.mask.from_surface(image)
+    text_cache.draw(surface, text, font, color, (x, y), alpha)
 
-    return mask, image
+# Draw the big ball arc straight onto the screen, collisions are tested analytically
+def draw_big_ball(surface, ring, color):
+    pygame.draw.arc(surface, color, ring.bounds, ring.start_angle, ring.end_angle, ring.thickness)
 
 def change_gap_position():
     global start_angle, end_angle
@@ -237,7 +198,7 @@ colorDir = 1
 # Start with one mini ball
 mini_balls = [MiniBall((color.r, color.g, color.b), (WIDTH / 2 -10, HEIGHT / 2 - 90), radius=15, velocity=[-4, -4])]
 stationary_balls = []
-particles = []
+particles = ParticlePool()
 
 running = False
 
@@ -249,9 +210,12 @@ timer = 0
 
 while True:
     clock.tick(60)
+    note_scheduler.update()
 
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
+            note_scheduler.flush()
+            audio_output.stop()
             pygame.quit()
             midi_output.close()
             sys.exit(0)
@@ -277,10 +241,9 @@ while True:
             # start_angle += angle_increment
             # end_angle += angle_increment
 
-            big_ball_mask, big_ball_image = create_big_ball_mask(big_ball_radius, (color.r, color.g, color.b), 10, start_angle, end_angle)
-            big_ball_rect = big_ball_image.get_rect(center=big_ball_center)
+            big_ball = RingSector(big_ball_center, big_ball_radius, 10, start_angle, end_angle)
 
-            if mini_ball.check_collision(big_ball_mask, big_ball_rect):
+            if mini_ball.check_collision(big_ball):
                 mini_ball.bounce(particles)
                 MiniBall.play_collision_note()
 
@@ -299,13 +262,11 @@ while True:
                 break
 
             # Update and draw particles
-            for particle in particles:
-                particle.update()
-            particles = [particle for particle in particles if particle.lifespan > 0]
+            particles.update()
 
             # Draw everything
             screen.fill(BLACK)
-            screen.blit(big_ball_image, big_ball_rect.topleft)
+            draw_big_ball(screen, big_ball, (color.r, color.g, color.b))
 
             for stationary_ball in stationary_balls:
                 stationary_ball.draw(screen, mini_ball.bounce_count, True)
@@ -313,8 +274,7 @@ while True:
             for mini_ball in mini_balls:
                 mini_ball.draw(screen, mini_ball.bounce_count)
 
-            for particle in particles:
-                particle.draw(screen)
+            particles.draw(screen)
 
         # Spawn a new ball if the list is empty
         if not mini_balls:
@@ -3,7 +3,14 @@ import sys
 import math
 import random
 import pygame.midi
-from mido import MidiFile
+from engine.notes import NoteSequence
+from engine.output import OutputWorker
+from engine.voices import NoteScheduler
+from engine import FixedStep
+from engine.arc_cache import ArcCache
+from engine.particles import ParticlePool
+from engine.tails import TailCache
+from engine.text import TextCache
 
 # Initialize Pygame
 pygame.init()
@@ -13,6 +20,10 @@ output_device_id = 0
 midi_output = pygame.midi.Output(output_device_id)
 midi_output.set_instrument(38)
 
+# MIDI notes and sound effects are sent from a background thread
+audio_output = OutputWorker(midi_output)
+note_scheduler = NoteScheduler(audio_output)
+
 # Screen dimensions
 WIDTH, HEIGHT = 800, 800
 screen = pygame.display.set_mode((WIDTH, HEIGHT))
@@ -30,33 +41,17 @@ big_ball_center = (WIDTH // 2, HEIGHT // 2)
 gravity = pygame.Vector2(0, 0.25)
 
 # Load MIDI file
-midi_file = MidiFile("midi/aloneloop.mid")
-midi_iterator = iter(midi_file)
+note_sequence = NoteSequence.load("midi/aloneloop.mid")
+note_cursor = note_sequence.cursor()
 
 # Font initialization
 font = pygame.font.Font(None, 36)
+text_cache = TextCache()
 
-explode_sound = pygame.mixer.Sound("sounds/explode.wav")
-
-class Particle:
-    def __init__(self, position, velocity, color, lifespan):
-        self.position = pygame.Vector2(position)
-        self.velocity = pygame.Vector2(velocity)
-        self.color = color
-        self.lifespan = lifespan
-
-    def update(self):
-        self.position += self.velocity
-        self.velocity += gravity
-        self.lifespan -= 2
-        if self.lifespan < 0:
-            self.lifespan = 0
+# Faded tail sprites for MiniBall.draw_tail
+tail_cache = TailCache()
 
-    def draw(self, screen):
-        if self.lifespan > 0:
-            alpha = int(255 * (self.lifespan / 50))
-            color = (*self.color, alpha)
-            pygame.draw.circle(screen, color, (int(self.position.x), int(self.position.y)), 3)
+explode_sound = pygame.mixer.Sound("sounds/explode.wav")
 
 class MiniBall:
     def __init__(self, color, initial_position, radius, velocity):
@@ -103,21 +98,12 @@ class MiniBall:
 
     @staticmethod
     def play_collision_note():
-        global midi_iterator
-        msg = next(midi_iterator, None)
-        while msg and msg.type != "note_on":
-            msg = next(midi_iterator, None)
-
-        if msg is None:
-            midi_iterator = iter(midi_file)
-            msg = next(midi_iterator, None)
-            while msg and msg.type != "note_on":
-                msg = next(midi_iterator, None)
+        msg = note_cursor.next()
 
         if msg:
             velocity = 100  # Volume (0-127)
             pitch = msg.note + 24  # Transpose up one octave
-            midi_output.note_on(pitch, velocity)
+            note_scheduler.note_on(pitch, velocity, msg.duration)
 
     def bounce(self, particles, radius, normal):
         # Calculate the collision point
@@ -150,63 +136,42 @@ class MiniBall:
         self.velocity = self.velocity.reflect(direction.normalize())
 
     def draw_tail(self, screen):
-        tail_length = len(self.tail)
-        for i in range(tail_length):
-            alpha = int(255 * (i / tail_length))  # Fading effect
-            tail_color = (*self.color[:3], alpha)
-            tail_surface = pygame.Surface((2 * self.radius, 2 * self.radius), pygame.SRCALPHA)
-            pygame.draw.circle(tail_surface, tail_color, (self.radius, self.radius), self.radius)
-            screen.blit(tail_surface, (self.tail[i].x - self.radius, self.tail[i].y - self.radius))
+        tail_cache.draw(screen, "circle", self.radius, self.color, self.tail)
 
     def createParticles(self, collision_point, particles):
-        num_particles = 20
-        for _ in range(num_particles):
-            velocity = pygame.Vector2(random.uniform(-3, 3), random.uniform(-3, 3))
-            color = (random.randint(200, 255), random.randint(100, 255), random.randint(100, 255))
-            lifespan = random.randint(30, 50)
-            particles.append(Particle(collision_point, velocity, color, lifespan))
+        particles.emit(collision_point, 20, 3)
 
     def createExplosion(self, particles):
-        num_particles = 30  # Number of particles in the explosion
-        for _ in range(num_particles):
-            velocity = pygame.Vector2(random.uniform(-5, 5), random.uniform(-5, 5))
-            color = (random.randint(200, 255), random.randint(100, 255), random.randint(100, 255))
-            lifespan = random.randint(30, 50)
-            particles.append(Particle(self.position, velocity, color, lifespan))
+        particles.emit(self.position, 30, 5)
 
     def update_color(self, h):
         self.color.hsla = (h, self.saturation, self.lightness, 100)
         self.image.fill((0, 0, 0, 0))  # Clear the surface
         pygame.draw.circle(self.image, self.color, (self.radius, self.radius), self.radius)
 
-    def draw(self, screen):
-        screen.blit(self.image, (int(self.position.x) - self.radius, int(self.position.y) - self.radius))
+    def draw(self, screen, interpolation=1.0):
+        # Draw between the last two physics steps so motion stays smooth
+        position = self.prevPos.lerp(self.position, interpolation)
+        screen.blit(self.image, (int(position.x) - self.radius, int(position.y) - self.radius))
         
         self.draw_tail(screen)
         remaining_time = 7 - self.elapsed_time
         if remaining_time > 4:
-            drawText(str(int(remaining_time)), font, WHITE, screen, int(self.position.x), int(self.position.y - 40), 45)
+            drawText(str(int(remaining_time)), font, WHITE, screen, int(position.x), int(position.y - 40), 45)
         else:
-            drawText(str(int(remaining_time)), font, RED, screen, int(self.position.x), int(self.position.y - 40), 45)
+            drawText(str(int(remaining_time)), font, RED, screen, int(position.x), int(position.y - 40), 45)
         
-        pygame.draw.circle(screen, WHITE, (self.position.x, self.position.y), self.radius, 3)
+        pygame.draw.circle(screen, WHITE, (position.x, position.y), self.radius, 3)
 
 def drawText(text, font, color, surface, x, y, size=36, alpha=255):
-    textobj = font.render(text, True, color)
-    textobj.set_alpha(alpha)
-    textrect = textobj.get_rect()
-    textrect.center = (x, y)
-    surface.blit(textobj, textrect)
+    text_cache.draw(surface, text, font, color, (x, y), alpha)
+
+# Spinning arcs only visit a fixed set of angles, reuse the rasterized ones
+arc_cache = ArcCache(angle_step=0.02)
 
 # Create the ball mask with an arc and a customizable gap
 def create_ball_mask(radius, color, arc_width=10, start_angle=0.5, end_angle=2 * math.pi):
-    image = pygame.Surface((2 * radius, 2 * radius), pygame.SRCALPHA)
-    rect = image.get_rect()
-    pygame.draw.arc(image, color, rect, start_angle, end_angle, arc_width)
-
-    mask = pygame.mask.from_surface(image)
-
-    return mask, image
+    return arc_cache.get(radius, color, arc_width, start_angle, end_angle)
 
 def random_point_in_circle(radius, center):
     angle = random.uniform(0, 2 * math.pi)
@@ -227,7 +192,7 @@ colorDir = 1
 
 # Start with one mini ball
 mini_balls = [MiniBall((color.r, color.g, color.b), (WIDTH / 2 - 10, HEIGHT / 2 - 90), radius=20, velocity=[-3, -3])]
-particles = []
+particles = ParticlePool(gravity=gravity)
 
 running = False
 
@@ -239,11 +204,23 @@ start_angle_bigger = 0.5 - 2.5
 end_angle_bigger = 2 * math.pi - 2.5
 angle_increment_bigger = -0.02
 
+big_ball_mask, big_ball_image = create_ball_mask(big_ball_radius, (237, 102, 138), 10, start_angle, end_angle)
+big_ball_rect = big_ball_image.get_rect(center=big_ball_center)
+bigger_ball_mask, bigger_ball_image = create_ball_mask(bigger_ball_radius, (102, 204, 237), 10, start_angle_bigger, end_angle_bigger)
+bigger_ball_rect = bigger_ball_image.get_rect(center=big_ball_center)
+
+# Physics runs in fixed 1/60 s steps whatever the frame rate, drawing
+# interpolates between the last two steps
+sim_clock = FixedStep(1 / 60)
+
 while True:
-    dt = clock.tick(60) / 1000.0
+    frame_time = clock.tick(60) / 1000.0  # Wall-clock length of the last frame
+    note_scheduler.update()
 
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
+            note_scheduler.flush()
+            audio_output.stop()
             pygame.quit()
             midi_output.close()
             sys.exit(0)
@@ -252,57 +229,63 @@ while True:
                 running = True
 
     if running:
-        # Changing color effect
-        color.hsla = (h, s, l, 100)
-        h += 2 * colorDir
-        if h >= 360:
-            h = 359  # Keep h in bounds
-            colorDir = -1
-        elif h <= 0:
-            h = 1
-            colorDir = 1
-
-        for mini_ball in mini_balls:
-            mini_ball.move(dt)
-
-            # Update angles to create spinning effect
-            start_angle += angle_increment
-            end_angle += angle_increment
-
-            start_angle_bigger += angle_increment_bigger
-            end_angle_bigger += angle_increment_bigger
-
-            big_ball_mask, big_ball_image = create_ball_mask(big_ball_radius, (237, 102, 138), 10, start_angle, end_angle)
-            big_ball_rect = big_ball_image.get_rect(center=big_ball_center)
-
-            bigger_ball_mask, bigger_ball_image = create_ball_mask(bigger_ball_radius, (102, 204, 237), 10, start_angle_bigger, end_angle_bigger)
-            bigger_ball_rect = bigger_ball_image.get_rect(center=big_ball_center)
-
-            if mini_ball.check_collision(big_ball_mask, big_ball_rect):
-                normal = (mini_ball.position - pygame.Vector2(big_ball_center)).normalize()
-                mini_ball.bounce(particles, big_ball_radius, normal)
-                MiniBall.play_collision_note()
-
-            if mini_ball.check_collision(bigger_ball_mask, bigger_ball_rect):
-                normal = (mini_ball.position - pygame.Vector2(big_ball_center)).normalize()
-                mini_ball.bounce(particles, bigger_ball_radius, normal)
-                MiniBall.play_collision_note()
-
-            if mini_ball.elapsed_time >= 6:
-                mini_ball.createExplosion(particles)  # Create explosion particles
-                explode_sound.play()
-                mini_balls.remove(mini_ball)  # Remove the ball from the list
-                break
-
-            # Check if the ball is out of bounds
-            if mini_ball.position.x < 0 or mini_ball.position.x > WIDTH or mini_ball.position.y < 0 or mini_ball.position.y > HEIGHT:
-                mini_balls.pop()
-                break
-
-        # Update and draw particles
-        for particle in particles:
-            particle.update()
-        particles = [particle for particle in particles if particle.lifespan > 0]
+        for _ in range(sim_clock.advance(frame_time)):
+            dt = sim_clock.step
+
+            # Changing color effect
+            color.hsla = (h, s, l, 100)
+            h += 2 * colorDir
+            if h >= 360:
+                h = 359  # Keep h in bounds
+                colorDir = -1
+            elif h <= 0:
+                h = 1
+                colorDir = 1
+
+            for mini_ball in mini_balls:
+                mini_ball.move(dt)
+
+                # Update angles to create spinning effect
+                start_angle += angle_increment
+                end_angle += angle_increment
+
+                start_angle_bigger += angle_increment_bigger
+                end_angle_bigger += angle_increment_bigger
+
+                big_ball_mask, big_ball_image = create_ball_mask(big_ball_radius, (237, 102, 138), 10, start_angle, end_angle)
+                big_ball_rect = big_ball_image.get_rect(center=big_ball_center)
+
+                bigger_ball_mask, bigger_ball_image = create_ball_mask(bigger_ball_radius, (102, 204, 237), 10, start_angle_bigger, end_angle_bigger)
+                bigger_ball_rect = bigger_ball_image.get_rect(center=big_ball_center)
+
+                if mini_ball.check_collision(big_ball_mask, big_ball_rect):
+                    normal = (mini_ball.position - pygame.Vector2(big_ball_center)).normalize()
+                    mini_ball.bounce(particles, big_ball_radius, normal)
+                    MiniBall.play_collision_note()
+
+                if mini_ball.check_collision(bigger_ball_mask, bigger_ball_rect):
+                    normal = (mini_ball.position - pygame.Vector2(big_ball_center)).normalize()
+                    mini_ball.bounce(particles, bigger_ball_radius, normal)
+                    MiniBall.play_collision_note()
+
+                if mini_ball.elapsed_time >= 6:
+                    mini_ball.createExplosion(particles)  # Create explosion particles
+                    audio_output.play(explode_sound)
+                    mini_balls.remove(mini_ball)  # Remove the ball from the list
+                    break
+
+                # Check if the ball is out of bounds
+                if mini_ball.position.x < 0 or mini_ball.position.x > WIDTH or mini_ball.position.y < 0 or mini_ball.position.y > HEIGHT:
+                    mini_balls.pop()
+                    break
+
+            # Update particles
+            particles.update()
+
+            # Spawn a new ball if the list is empty
+            if not mini_balls:
+                ball_color = (random.randint(0, 255), random.randint(0, 255), random.randint(0, 255))
+                mini_balls.append(MiniBall(ball_color, random_point_in_circle(big_ball_radius - 150, big_ball_center), radius=20, velocity=[-3, -3]))
 
         # Draw everything
         screen.fill(BLACK)
@@ -310,14 +293,8 @@ while True:
         screen.blit(big_ball_image, big_ball_rect.topleft)
 
         for mini_ball in mini_balls:
-            mini_ball.draw(screen)
-
-        for particle in particles:
-            particle.draw(screen)
+            mini_ball.draw(screen, sim_clock.alpha)
 
-        # Spawn a new ball if the list is empty
-        if not mini_balls:
-            ball_color = (random.randint(0, 255), random.randint(0, 255), random.randint(0, 255))
-            mini_balls.append(MiniBall(ball_color, random_point_in_circle(big_ball_radius - 150, big_ball_center), radius=20, velocity=[-3, -3]))
+        particles.draw(screen)
 
         pygame.display.flip()
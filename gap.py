@@ -3,7 +3,11 @@ import sys
 import math
 import random
 import pygame.midi
-from mido import MidiFile
+from engine.notes import NoteSequence
+from engine.output import OutputWorker
+from engine.voices import NoteScheduler
+from engine import RingSector
+from engine.text import TextCache
 
 # Initialize Pygame
 pygame.init()
@@ -12,6 +16,10 @@ output_device_id = 0
 midi_output = pygame.midi.Output(output_device_id)
 midi_output.set_instrument(15)
 
+# MIDI notes are sent from a background thread
+audio_output = OutputWorker(midi_output)
+note_scheduler = NoteScheduler(audio_output)
+
 # Screen dimensions
 WIDTH, HEIGHT = 800, 800
 screen = pygame.display.set_mode((WIDTH, HEIGHT))
@@ -27,10 +35,11 @@ big_ball_center = (WIDTH // 2, HEIGHT // 2)
 gravity = pygame.Vector2(0, 0.25)
 
 # Load MIDI file
-midi_file = MidiFile("midi/aloneloop.mid")
+note_sequence = NoteSequence.load("midi/aloneloop.mid")
 
 # Font initialization
 font = pygame.font.Font(None, 36)
+text_cache = TextCache()
 
 class MiniBall:
     def __init__(self, color, initial_position, radius, velocity):
@@ -38,7 +47,7 @@ class MiniBall:
         self.prevPos = self.position.copy()
         self.radius = radius
         self.velocity = pygame.Vector2(velocity)
-        self.note_iterator = iter(midi_file)  # MIDI note iterator
+        self.note_cursor = note_sequence.cursor()  # Position in the song
         self.color = color
         self.image = pygame.Surface((2 * radius, 2 * radius), pygame.SRCALPHA)
         pygame.draw.circle(self.image, color, (radius, radius), radius)
@@ -49,28 +58,16 @@ class MiniBall:
         self.velocity += gravity
         self.position += self.velocity
 
-    def check_collision(self, big_mask, big_ball_rect):
-        mini_ball_rect = self.image.get_rect(center=(int(self.position.x), int(self.position.y)))
-        offset = (mini_ball_rect.left - big_ball_rect.left, mini_ball_rect.top - big_ball_rect.top)
-        if big_mask.overlap(self.mask, offset):
-            return True
-        return False
+    def check_collision(self, ring):
+        return ring.contact(self.position, self.radius) is not None
 
     def play_collision_note(self):
-        msg = next(self.note_iterator, None)
-        while msg and msg.type != "note_on":
-            msg = next(self.note_iterator, None)
-
-        if msg is None:
-            self.note_iterator = iter(midi_file)
-            msg = next(self.note_iterator, None)
-            while msg and msg.type != "note_on":
-                msg = next(self.note_iterator, None)
+        msg = self.note_cursor.next()
 
         if msg:
             velocity = 100  # Volume (0-127)
             pitch = msg.note + 11  # Transpose up one octave
-            midi_output.note_on(pitch, velocity)
+            note_scheduler.note_on(pitch, velocity, msg.duration)
 
     def bounce(self):
         # Use previous position to bounce
@@ -100,22 +97,11 @@ class MiniBall:
         screen.blit(self.image, (int(self.position.x) - self.radius, int(self.position.y) - self.radius))
 
 def drawText(text, font, color, surface, x, y, size=36, alpha=255):
-    font = pygame.font.Font(None, size)
-    textobj = font.render(text, True, color)
-    textobj.set_alpha(alpha)
-    textrect = textobj.get_rect()
-    textrect.center = (x, y)
-    surface.blit(textobj, textrect)
-
-# Create the big ball mask with an arc and a customizable gap
-def create_big_ball_mask(radius, color, arc_width=10, start_angle=0.5, end_angle=2 * math.pi):
-    image = pygame.Surface((2 * radius, 2 * radius), pygame.SRCALPHA)
-    rect = image.get_rect()
-    pygame.draw.arc(image, color, rect, start_angle, end_angle, arc_width)
-
-    mask = pygame.mask.from_surface(image)
+    text_cache.draw(surface, text, size, color, (x, y), alpha)
 
-    return mask, image
+# Draw the big ball arc straight onto the screen, collisions are tested analytically
+def draw_big_ball(surface, ring, color):
+    pygame.draw.arc(surface, color, ring.bounds, ring.start_angle, ring.end_angle, ring.thickness)
 
 # Main loop
 clock = pygame.time.Clock()
@@ -138,9 +124,12 @@ angle_increment = 0.01
 
 while True:
     clock.tick(60)
+    note_scheduler.update()
 
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
+            note_scheduler.flush()
+            audio_output.stop()
             pygame.quit()
             midi_output.close()
             sys.exit(0)
@@ -165,16 +154,15 @@ while True:
         start_angle += angle_increment
         end_angle += angle_increment
 
-        big_ball_mask, big_ball_image = create_big_ball_mask(big_ball_radius, (color.r, color.g, color.b), 3, start_angle, end_angle)
-        big_ball_rect = big_ball_image.get_rect(center=big_ball_center)
+        big_ball = RingSector(big_ball_center, big_ball_radius, 3, start_angle, end_angle)
 
-        if mini_ball.check_collision(big_ball_mask, big_ball_rect):
+        if mini_ball.check_collision(big_ball):
             mini_ball.bounce()
             mini_ball.play_collision_note()
 
         # Draw everything
         screen.fill(BLACK)
-        screen.blit(big_ball_image, big_ball_rect.topleft)
+        draw_big_ball(screen, big_ball, (color.r, color.g, color.b))
         # pygame.draw.circle(screen, (color.r, color.g, color.b), big_ball_center, big_ball_radius, 6)
 
         mini_ball.draw(screen)
@@ -0,0 +1,97 @@
+import argparse
+import math
+import time
+from functools import partial
+
+import pygame
+
+from engine import Body, Ring, World
+from engine.sinks import PygameRenderer
+from engine.stack import StackRenderer, build_stack_world
+
+# Screen dimensions, same as the gap scenes
+WIDTH, HEIGHT = 800, 800
+CENTER = (WIDTH // 2, HEIGHT // 2)
+
+
+# The gap.py scene: one ball inside a spinning ring with a gap
+def build_world(seed):
+    world = World(gravity=(0, 0.25), bounds=(0, 0, WIDTH, HEIGHT), seed=seed, bounce_jitter=0.1)
+    world.add_ring(Ring(CENTER, 250, 3, 0.5, 2 * math.pi, spin=0.01, color=(66, 219, 68)))
+    world.add_body(Body(CENTER, (-4, -4), 20, (66, 219, 68)))
+    return world
+
+
+# --scene name: (world builder, renderer)
+SCENES = {
+    "gap": (build_world, PygameRenderer),
+    "gap-alot-bounces": (build_stack_world, StackRenderer),
+}
+
+
+class BounceCounter:
+    def __init__(self):
+        self.bounces = 0
+        self.escaped_at = None
+
+    def handle(self, world, events):
+        for event in events:
+            if event.kind == "bounce":
+                self.bounces += 1
+            elif event.kind == "escape" and self.escaped_at is None:
+                self.escaped_at = event.frame
+        if not world.bodies:
+            return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a scene without a display")
+    parser.add_argument("--scene", choices=sorted(SCENES), default="gap")
+    parser.add_argument("--runs", type=int, default=100)
+    parser.add_argument("--frames", type=int, default=60 * 60)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--window", action="store_true", help="watch the first run at 60 fps")
+    parser.add_argument("--export", metavar="PATH",
+                        help="render the first run to a video (.mp4 etc. via ffmpeg, .y4m, or a %%d .png sequence)")
+    parser.add_argument("--fps", type=int, default=60, help="frame rate of the exported video")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="render the export in parallel chunks with this many processes")
+    parser.add_argument("--audio", metavar="PATH",
+                        help="mix the first run's bounce and escape sounds into a .wav track")
+    args = parser.parse_args()
+
+    build, renderer = SCENES[args.scene]
+    started = time.perf_counter()
+    for run in range(args.runs):
+        world = build(args.seed + run)
+        counter = world.attach(BounceCounter())
+        if args.audio and run == 0:
+            from engine.audio import AudioTrack
+
+            track = world.attach(AudioTrack({"bounce": "sounds/bubble.wav", "escape": "sounds/explode.wav"}, args.fps))
+        if args.window and run == 0:
+            pygame.init()
+            world.attach(renderer(pygame.display.set_mode((WIDTH, HEIGHT)), fps=60))
+        if args.export and run == 0 and args.workers > 1:
+            from engine.parallel import export_parallel
+
+            frames = export_parallel(partial(build, args.seed + run), world, args.export, (WIDTH, HEIGHT),
+                                     args.frames, args.fps, args.workers, renderer=renderer)
+        else:
+            if args.export and run == 0:
+                from engine.sinks import VideoSink
+                from engine.video import open_writer
+
+                frame = pygame.Surface((WIDTH, HEIGHT))
+                world.attach(VideoSink(renderer(frame), open_writer(args.export, frame, args.fps)))
+            frames = world.run(args.frames)
+        if args.audio and run == 0:
+            track.write(args.audio, frames)
+        print(f"run {run}: {frames} frames, {counter.bounces} bounces, escaped at {counter.escaped_at}")
+
+    elapsed = time.perf_counter() - started
+    print(f"{args.runs} runs in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
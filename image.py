@@ -3,7 +3,10 @@ import sys
 import math
 import random
 import pygame.midi
-from mido import MidiFile
+from engine.notes import NoteSequence
+from engine.output import OutputWorker
+from engine.voices import NoteScheduler
+from engine.text import TextCache
 
 # Initialize Pygame
 pygame.init()
@@ -12,6 +15,10 @@ output_device_id = 0
 midi_output = pygame.midi.Output(output_device_id)
 midi_output.set_instrument(15)
 
+# MIDI notes are sent from a background thread
+audio_output = OutputWorker(midi_output)
+note_scheduler = NoteScheduler(audio_output)
+
 # Screen dimensions
 WIDTH, HEIGHT = 800, 800
 screen = pygame.display.set_mode((WIDTH, HEIGHT))
@@ -27,7 +34,7 @@ big_ball_center = (WIDTH // 2, HEIGHT // 2)
 gravity = pygame.Vector2(0, 0.25)
 
 # Load MIDI file
-midi_file = MidiFile("midi/aloneloop.mid")
+note_sequence = NoteSequence.load("midi/aloneloop.mid")
 
 # Load the image
 bouncing_image = pygame.image.load("images/trump.png")
@@ -35,6 +42,7 @@ bouncing_image = pygame.transform.scale(bouncing_image, (40, 40))  # Resize imag
 
 # Font initialization
 font = pygame.font.Font(None, 36)
+text_cache = TextCache()
 
 class BouncingImage:
     def __init__(self, image, initial_position, radius, velocity):
@@ -43,7 +51,7 @@ class BouncingImage:
         self.prevPos = self.position.copy()
         self.radius = radius
         self.velocity = pygame.Vector2(velocity)
-        self.note_iterator = iter(midi_file)  # MIDI note iterator
+        self.note_cursor = note_sequence.cursor()  # Position in the song
         self.mask = pygame.mask.from_surface(self.image)
 
     def move(self):
@@ -59,20 +67,12 @@ class BouncingImage:
         return False
 
     def play_collision_note(self):
-        msg = next(self.note_iterator, None)
-        while msg and msg.type != "note_on":
-            msg = next(self.note_iterator, None)
-
-        if msg is None:
-            self.note_iterator = iter(midi_file)
-            msg = next(self.note_iterator, None)
-            while msg and msg.type != "note_on":
-                msg = next(self.note_iterator, None)
+        msg = self.note_cursor.next()
 
         if msg:
             velocity = 100  # Volume (0-127)
             pitch = msg.note + 11  # Transpose up one octave
-            midi_output.note_on(pitch, velocity)
+            note_scheduler.note_on(pitch, velocity, msg.duration)
 
     def bounce(self):
         # Use previous position to bounce
@@ -102,12 +102,7 @@ class BouncingImage:
         screen.blit(self.image, (int(self.position.x) - self.radius, int(self.position.y) - self.radius))
 
 def drawText(text, font, color, surface, x, y, size=36, alpha=255):
-    font = pygame.font.Font(None, size)
-    textobj = font.render(text, True, color)
-    textobj.set_alpha(alpha)
-    textrect = textobj.get_rect()
-    textrect.center = (x, y)
-    surface.blit(textobj, textrect)
+    text_cache.draw(surface, text, size, color, (x, y), alpha)
 
 # Create the big ball mask with an arc and a customizable gap
 def create_big_ball_mask(radius, color, arc_width=10, start_angle=0.5, end_angle=2 * math.pi):
@@ -140,9 +135,12 @@ angle_increment = 0.01
 
 while True:
     clock.tick(60)
+    note_scheduler.update()
 
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
+            note_scheduler.flush()
+            audio_output.stop()
             pygame.quit()
             midi_output.close()
             sys.exit(0)
@@ -2,7 +2,14 @@ import pygame
 import sys
 import random
 import pygame.midi
-from mido import MidiFile
+from engine.notes import NoteSequence
+from engine.output import OutputWorker
+from engine.voices import NoteScheduler
+from engine.tails import TailCache
+from engine.fan import LineFan
+from engine.dirty import DirtyRects
+from engine.swept import circle_in_rect_impact, reflect, sweep
+from engine.text import TextCache
 
 # Initialize Pygame
 pygame.init()
@@ -11,6 +18,10 @@ output_device_id = 0
 midi_output = pygame.midi.Output(output_device_id)
 midi_output.set_instrument(38)
 
+# MIDI notes are sent from a background thread
+audio_output = OutputWorker(midi_output)
+note_scheduler = NoteScheduler(audio_output)
+
 # Screen dimensions
 WIDTH, HEIGHT = 800, 800
 screen = pygame.display.set_mode((WIDTH, HEIGHT))
@@ -27,107 +38,87 @@ rect_x = (WIDTH - rect_width) // 2
 rect_y = (HEIGHT - rect_height) // 2
 rect_border_width = 10
 
+# Where the ball's edge can go, inside the border
+container_rect = (rect_x + rect_border_width, rect_y + rect_border_width,
+                  rect_width - 2 * rect_border_width, rect_height - 2 * rect_border_width)
+
 # Load MIDI file
-midi_file = MidiFile("midi/tokyo.mid")
+note_sequence = NoteSequence.load("midi/tokyo.mid")
 
 # Font initialization
 font = pygame.font.Font(None, 36)
+text_cache = TextCache()
+
+# Faded tail sprites for MiniBall.draw_tail
+tail_cache = TailCache()
 
 class MiniBall:
     def __init__(self, color, initial_position, radius, velocity):
         self.position = pygame.Vector2(initial_position)
         self.radius = radius
         self.velocity = pygame.Vector2(velocity)
-        self.note_iterator = iter(midi_file)  # MIDI note iterator
+        self.note_cursor = note_sequence.cursor()  # Position in the song
         self.color = color
         self.image = pygame.Surface((2 * radius, 2 * radius), pygame.SRCALPHA)
         pygame.draw.circle(self.image, color, (radius, radius), radius)
         self.mask = pygame.mask.from_surface(self.image)
-        self.collision_points = []  # List to store collision points
+        self.collision_points = LineFan(cap=1024)  # Lines to every collision point
         self.tail = []
+        self.last_collision_point = None
 
     def move(self, color):
-        self.position += self.velocity
-        collision_point = None
-        self.update_tail()
         self.color = color
 
-        # Check for collision with the rectangle boundaries
-        if self.position.x - self.radius <= rect_x + rect_border_width:
-            self.velocity.x *= -1
-            self.play_collision_note()
-            collision_point = pygame.Vector2(rect_x + rect_border_width, self.position.y)
-            self.position.x = rect_x + rect_border_width + self.radius  # Adjust position to prevent sticking
-        elif self.position.x + self.radius >= rect_x + rect_width - rect_border_width:
-            self.velocity.x *= -1
-            self.play_collision_note()
-            collision_point = pygame.Vector2(rect_x + rect_width - rect_border_width, self.position.y)
-            self.position.x = rect_x + rect_width - rect_border_width - self.radius  # Adjust position to prevent sticking
-
-        if self.position.y - self.radius <= rect_y + rect_border_width:
-            self.velocity.y *= -1
-            self.play_collision_note()
-            collision_point = pygame.Vector2(self.position.x, rect_y + rect_border_width)
-            self.position.y = rect_y + rect_border_width + self.radius  # Adjust position to prevent sticking
-        elif self.position.y + self.radius >= rect_y + rect_height - rect_border_width:
-            self.velocity.y *= -1
-            self.play_collision_note()
-            collision_point = pygame.Vector2(self.position.x, rect_y + rect_height - rect_border_width)
-            self.position.y = rect_y + rect_height - rect_border_width - self.radius  # Adjust position to prevent sticking
-
-        if collision_point:
-            self.collision_points.append(collision_point)
+        # Movement, swept through the whole step so a fast ball bounces where
+        # it actually reaches the wall instead of tunnelling through it
+        def impact(position, displacement):
+            return circle_in_rect_impact(position, displacement, self.radius, container_rect)
+
+        position, velocity, bounces = sweep(self.position, self.velocity, impact, self.bounce)
+        self.position = pygame.Vector2(position)
+        self.velocity = pygame.Vector2(velocity)
+        self.update_tail()
+
+        if bounces:
+            self.collision_points.add(self.last_collision_point)
             self.radius += 2  # Increase the radius of the ball
 
         self.image = pygame.Surface((2 * self.radius, 2 * self.radius), pygame.SRCALPHA)
         pygame.draw.circle(self.image, self.color, (self.radius, self.radius), self.radius)
         self.mask = pygame.mask.from_surface(self.image)
 
+    def bounce(self, position, velocity, normal):
+        self.play_collision_note()
+
+        # The wall is one radius behind the centre, along the normal
+        self.last_collision_point = pygame.Vector2(position) - pygame.Vector2(normal) * self.radius
+        return reflect(velocity, normal)
+
     def update_tail(self):
         self.tail.append(self.position.copy())
         if len(self.tail) > 10:  # Limit the tail length
             self.tail.pop(0)
 
     def play_collision_note(self):
-        msg = next(self.note_iterator, None)
-        while msg and msg.type != "note_on":
-            msg = next(self.note_iterator, None)
-
-        if msg is None:
-            self.note_iterator = iter(midi_file)
-            msg = next(self.note_iterator, None)
-            while msg and msg.type != "note_on":
-                msg = next(self.note_iterator, None)
+        msg = self.note_cursor.next()
 
         if msg:
             velocity = 100  # Volume (0-127)
             pitch = msg.note + 10  # Transpose up one octave
-            midi_output.note_on(pitch, velocity)
+            note_scheduler.note_on(pitch, velocity, msg.duration)
 
     def draw_tail(self, screen):
-        tail_length = len(self.tail)
-        for i in range(tail_length):
-            alpha = int(255 * (i / tail_length))  # Fading effect
-            tail_color = (*self.color[:3], alpha)
-            tail_surface = pygame.Surface((2 * self.radius, 2 * self.radius), pygame.SRCALPHA)
-            pygame.draw.circle(tail_surface, tail_color, (self.radius, self.radius), self.radius)
-            screen.blit(tail_surface, (self.tail[i].x - self.radius, self.tail[i].y - self.radius))
+        return tail_cache.draw(screen, "circle", self.radius, self.color, self.tail)
 
-    def draw(self, screen, color):
-        for point in self.collision_points:
-            pygame.draw.line(screen, color, (self.position.x, self.position.y), point, 2)
+    def draw(self, screen, color, dirty):
+        dirty.mark(self.collision_points.draw(screen, color, self.position, 2))
 
-        self.draw_tail(screen)
+        dirty.mark(self.draw_tail(screen))
 
-        screen.blit(self.image, (int(self.position.x) - self.radius, int(self.position.y) - self.radius))
+        dirty.mark(screen.blit(self.image, (int(self.position.x) - self.radius, int(self.position.y) - self.radius)))
 
 def drawText(text, font, color, surface, x, y, size=36, alpha=255):
-    font = pygame.font.Font(None, size)
-    textobj = font.render(text, True, color)
-    textobj.set_alpha(alpha)
-    textrect = textobj.get_rect()
-    textrect.center = (x, y)
-    surface.blit(textobj, textrect)
+    text_cache.draw(surface, text, size, color, (x, y), alpha)
 
 # Main loop
 clock = pygame.time.Clock()
@@ -144,11 +135,20 @@ mini_ball = MiniBall((color.r, color.g, color.b), (WIDTH / 2 + 0, HEIGHT / 2 - 2
 
 running = False
 
+# Only what moves is redrawn, set enabled=False to redraw and flip the whole window every frame
+dirty = DirtyRects(screen, enabled=True)
+screen.fill(BLACK)
+pygame.draw.rect(screen, (255, 255, 255), (rect_x, rect_y, rect_width, rect_height), rect_border_width)
+dirty.capture()
+
 while True:
     clock.tick(60)
+    note_scheduler.update()
 
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
+            note_scheduler.flush()
+            audio_output.stop()
             pygame.quit()
             midi_output.close()
             sys.exit(0)
@@ -170,11 +170,10 @@ while True:
             colorDir = 1
 
         # Draw everything
-        screen.fill(BLACK)
-        pygame.draw.rect(screen, (255, 255, 255), (rect_x, rect_y, rect_width, rect_height), rect_border_width)
+        dirty.begin()
 
-        mini_ball.draw(screen, (color.r, color.g, color.b))
+        mini_ball.draw(screen, (color.r, color.g, color.b), dirty)
         pygame.draw.circle(screen, BLACK, mini_ball.position, mini_ball.radius)
-        pygame.draw.circle(screen, WHITE, mini_ball.position, mini_ball.radius, 5)
+        dirty.mark(pygame.draw.circle(screen, WHITE, mini_ball.position, mini_ball.radius, 5))
 
-        pygame.display.flip()
+        dirty.present()
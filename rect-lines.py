@@ -2,7 +2,13 @@ import pygame
 import sys
 import random
 import pygame.midi
-from mido import MidiFile
+from engine.notes import NoteSequence
+from engine.output import OutputWorker
+from engine.voices import NoteScheduler
+from engine.boxes import BoxBody, BoxImages, Container
+from engine.tails import TailCache
+from engine.fan import LineFan
+from engine.text import TextCache
 
 # Initialize Pygame
 pygame.init()
@@ -11,6 +17,10 @@ output_device_id = 0
 midi_output = pygame.midi.Output(output_device_id)
 midi_output.set_instrument(15)
 
+# MIDI notes and sound effects are sent from a background thread
+audio_output = OutputWorker(midi_output)
+note_scheduler = NoteScheduler(audio_output)
+
 # Screen dimensions
 WIDTH, HEIGHT = 800, 800
 screen = pygame.display.set_mode((WIDTH, HEIGHT))
@@ -26,69 +36,54 @@ rect_height = 625
 rect_x = (WIDTH - rect_width) // 2
 rect_y = (HEIGHT - rect_height) // 2
 rect_border_width = 10
+container = Container(rect_x, rect_y, rect_width, rect_height, rect_border_width)
 
 # Load MIDI file
-midi_file = MidiFile("midi/tokyo.mid")
+note_sequence = NoteSequence.load("midi/tokyo.mid")
 
 sound = pygame.mixer.Sound("sounds/BABABOI.mp3")
 
 # Font initialization
 font = pygame.font.Font(None, 36)
+text_cache = TextCache()
+
+# Faded tail sprites for MiniRect.draw_tail
+tail_cache = TailCache()
+
+# One image per rectangle size, recoloured through the palette
+box_images = BoxImages()
 
 class MiniRect:
     def __init__(self, color, initial_position, size, velocity):
-        self.position = pygame.Vector2(initial_position)
-        self.size = size
-        self.velocity = pygame.Vector2(velocity)
-        self.note_iterator = iter(midi_file)  # MIDI note iterator
+        self.body = BoxBody(initial_position, size, velocity)
+        self.note_cursor = note_sequence.cursor()  # Position in the song
         self.color = color
-        self.image = pygame.Surface((size[0], size[1]), pygame.SRCALPHA)
-        pygame.draw.rect(self.image, color, (0, 0, size[0], size[1]))
-        self.mask = pygame.mask.from_surface(self.image)
-        self.collision_points = []  # List to store collision points
+        self.collision_points = LineFan(cap=1024)  # Lines to every collision point
         self.tail = []
 
+    @property
+    def position(self):
+        return pygame.Vector2(self.body.position)
+
+    @property
+    def size(self):
+        return self.body.size
+
     def move(self, color):
-        self.position += self.velocity
-        collision_point = None
+        # Check for collision with the rectangle boundaries
+        hits, collision_point = self.body.step(container)
         self.update_tail()
         self.color = color
 
-        # Check for collision with the rectangle boundaries
-        if self.position.x <= rect_x + rect_border_width:
-            self.velocity.x *= -1
+        for _ in range(hits):
             # self.play_collision_note()
-            sound.play()
-            collision_point = pygame.Vector2(rect_x + rect_border_width, self.position.y)
-            self.position.x = rect_x + rect_border_width  # Adjust position to prevent sticking
-        elif self.position.x + self.size[0] >= rect_x + rect_width - rect_border_width:
-            self.velocity.x *= -1
-            # self.play_collision_note()
-            sound.play()
-            collision_point = pygame.Vector2(rect_x + rect_width - rect_border_width, self.position.y)
-            self.position.x = rect_x + rect_width - rect_border_width - self.size[0]  # Adjust position to prevent sticking
-
-        if self.position.y <= rect_y + rect_border_width:
-            self.velocity.y *= -1
-            # self.play_collision_note()
-            sound.play()
-            collision_point = pygame.Vector2(self.position.x, rect_y + rect_border_width)
-            self.position.y = rect_y + rect_border_width  # Adjust position to prevent sticking
-        elif self.position.y + self.size[1] >= rect_y + rect_height - rect_border_width:
-            self.velocity.y *= -1
-            # self.play_collision_note()
-            sound.play()
-            collision_point = pygame.Vector2(self.position.x, rect_y + rect_height - rect_border_width)
-            self.position.y = rect_y + rect_height - rect_border_width - self.size[1]  # Adjust position to prevent sticking
+            audio_output.play(sound)
 
         if collision_point:
-            self.collision_points.append(collision_point)
-            # self.size = (self.size[0] + 2, self.size[1] + 2)  # Increase the size of the rectangle
-            self.velocity *= 1.02
-
-        self.image = pygame.Surface((self.size[0], self.size[1]), pygame.SRCALPHA)
-        pygame.draw.rect(self.image, self.color, (0, 0, self.size[0], self.size[1]))
-        self.mask = pygame.mask.from_surface(self.image)
+            self.collision_points.add(collision_point)
+            # self.body.resize(self.size[0] + 2, self.size[1] + 2)  # Increase the size of the rectangle
+            self.body.vx *= 1.02
+            self.body.vy *= 1.02
 
     def update_tail(self):
         self.tail.append(self.position.copy())
@@ -96,47 +91,27 @@ class MiniRect:
             self.tail.pop(0)
 
     def play_collision_note(self):
-        msg = next(self.note_iterator, None)
-        while msg and msg.type != "note_on":
-            msg = next(self.note_iterator, None)
-
-        if msg is None:
-            self.note_iterator = iter(midi_file)
-            msg = next(self.note_iterator, None)
-            while msg and msg.type != "note_on":
-                msg = next(self.note_iterator, None)
+        msg = self.note_cursor.next()
 
         if msg:
             velocity = 100  # Volume (0-127)
             pitch = msg.note + 30  # Transpose up one octave
-            midi_output.note_on(pitch, velocity)
+            note_scheduler.note_on(pitch, velocity, msg.duration)
 
     def draw_tail(self, screen):
-        tail_length = len(self.tail)
-        for i in range(tail_length):
-            alpha = int(255 * (i / tail_length))  # Fading effect
-            tail_color = (*self.color[:3], alpha)
-            tail_surface = pygame.Surface((self.size[0], self.size[1]), pygame.SRCALPHA)
-            pygame.draw.rect(tail_surface, tail_color, (0, 0, self.size[0], self.size[1]))
-            screen.blit(tail_surface, (self.tail[i].x, self.tail[i].y))
+        tail_cache.draw(screen, "rect", self.size, self.color, self.tail)
 
     def draw(self, screen, color):
-        for point in self.collision_points:
-            pygame.draw.line(screen, color, (self.position.x, self.position.y), point, 1)
+        self.collision_points.draw(screen, color, self.position, 1)
 
         self.draw_tail(screen)
 
-        screen.blit(self.image, (int(self.position.x), int(self.position.y)))
+        screen.blit(box_images.get(self.size, self.color), (int(self.body.x), int(self.body.y)))
 
         pygame.draw.rect(screen, (0, 0, 0), (self.position.x, self.position.y, self.size[0] - 1, self.size[1] - 1))
 
 def drawText(text, font, color, surface, x, y, size=36, alpha=255):
-    font = pygame.font.Font(None, size)
-    textobj = font.render(text, True, color)
-    textobj.set_alpha(alpha)
-    textrect = textobj.get_rect()
-    textrect.center = (x, y)
-    surface.blit(textobj, textrect)
+    text_cache.draw(surface, text, size, color, (x, y), alpha)
 
 # Main loop
 clock = pygame.time.Clock()
@@ -155,9 +130,12 @@ running = False
 
 while True:
     clock.tick(60)
+    note_scheduler.update()
 
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
+            note_scheduler.flush()
+            audio_output.stop()
             pygame.quit()
             midi_output.close()
             sys.exit(0)
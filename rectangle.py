@@ -1,6 +1,9 @@
 import pygame
 import sys
 import colorsys
+from engine.output import OutputWorker
+from engine.dirty import DirtyRects
+from engine.trail import TrailCanvas
 
 # Initialize Pygame
 pygame.init()
@@ -23,8 +26,12 @@ rect_width, rect_height = 50, 50
 moving_rect = pygame.Rect(150, 150, rect_width, rect_height)
 rect_speed = [3, 3]  # Speed in x and y directions
 
-# List to store previous positions of the moving rectangle
-tail_positions = []
+# Retained layer the tail is stamped onto, in white so it can be tinted every frame
+tail_fade = 0  # Alpha the tail loses per frame, 0 keeps it forever
+tail_area = container_rect.inflate(20, 20)  # The tail never leaves the container
+tail_canvas = TrailCanvas(tail_area.size, tail_fade)
+tail_sprite = pygame.Surface((rect_width, rect_height), pygame.SRCALPHA)
+pygame.draw.rect(tail_sprite, (*WHITE, 100), tail_sprite.get_rect(), 2)  # 50% opacity for border
 
 # Hue value for the color changing effect
 hue = 0
@@ -39,11 +46,19 @@ clock = pygame.time.Clock()
 # Load the sound file
 bounce_sound = pygame.mixer.Sound('sounds/yeppe.mp3')  # Replace 'bounce.wav' with your sound file
 
+# Sounds play on a background thread, the frame only queues them
+audio_output = OutputWorker()
+
 def hsv_to_rgb(h, s, v):
     """Convert HSV to RGB color space."""
     rgb = colorsys.hsv_to_rgb(h, s, v)
     return tuple(int(i * 255) for i in rgb)
 
+# Only the container area changes, set enabled=False to redraw and flip the whole window every frame
+dirty = DirtyRects(screen, enabled=True)
+screen.fill(SCREEN_COLOR)
+dirty.capture()
+
 # Main loop
 running = False
 while True:
@@ -52,6 +67,7 @@ while True:
 
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
+            audio_output.stop()
             pygame.quit()
             sys.exit()
         elif event.type == pygame.KEYDOWN:
@@ -66,30 +82,29 @@ while True:
         # Bounce the rectangle off the edges of the container
         if moving_rect.left <= container_rect.left or moving_rect.right >= container_rect.right:
             rect_speed[0] = -rect_speed[0]
-            bounce_sound.play()  # Play sound on bounce
+            audio_output.play(bounce_sound)  # Play sound on bounce
         if moving_rect.top <= container_rect.top or moving_rect.bottom >= container_rect.bottom:
             rect_speed[1] = -rect_speed[1]
-            bounce_sound.play()  # Play sound on bounce
+            audio_output.play(bounce_sound)  # Play sound on bounce
 
         # Increment the tail recording counter
         tail_recording_counter += 1
 
-        # Record the current position to the tail_positions list every `tail_recording_frequency` frames
+        # Stamp the current position onto the tail every `tail_recording_frequency` frames
+        tail_canvas.decay()
         if tail_recording_counter >= tail_recording_frequency:
-            tail_positions.append((moving_rect.x, moving_rect.y))
+            tail_canvas.stamp(tail_sprite, (moving_rect.x - tail_area.x, moving_rect.y - tail_area.y))
             tail_recording_counter = 0
 
         # Update the hue value
         hue = (hue + 0.005) % 1  # Slower hue increment
         current_color = hsv_to_rgb(hue, 1, 1)  # Convert hue to RGB
 
-        # Fill the background (only draw moving rectangle and tail)
-        screen.fill(SCREEN_COLOR)
-        
-        for pos in tail_positions:
-            tail_surface = pygame.Surface((rect_width, rect_height), pygame.SRCALPHA)
-            pygame.draw.rect(tail_surface, (*current_color, 100), tail_surface.get_rect(), 2)  # 50% opacity for border
-            screen.blit(tail_surface, pos)
+        # Restore the background (only draw moving rectangle and tail)
+        dirty.begin()
+        dirty.mark(tail_area)
+
+        tail_canvas.draw(screen, current_color, tail_area.topleft)
 
         # Draw the moving rectangle
         pygame.draw.rect(screen, WHITE, moving_rect)
@@ -99,4 +114,4 @@ while True:
         pygame.draw.rect(screen, current_color, pygame.Rect(150, 150, 491, 515), 10)
 
         # Update the display
-        pygame.display.flip()
+        dirty.present()
@@ -3,8 +3,13 @@ import sys
 import math
 import random
 import pygame.midi
-from mido import MidiFile
+from engine.notes import NoteSequence
+from engine.output import OutputWorker
+from engine.voices import NoteScheduler
 import time
+from engine.arc_cache import ArcCache
+from engine.collision import annulus_hits
+from engine.text import TextCache
 
 # Initialize Pygame
 pygame.init()
@@ -13,6 +18,10 @@ output_device_id = 0
 midi_output = pygame.midi.Output(output_device_id)
 midi_output.set_instrument(38)
 
+# MIDI notes and sound effects are sent from a background thread
+audio_output = OutputWorker(midi_output)
+note_scheduler = NoteScheduler(audio_output)
+
 # Screen dimensions
 WIDTH, HEIGHT = 800, 800
 screen = pygame.display.set_mode((WIDTH, HEIGHT))
@@ -31,12 +40,13 @@ arc_width = 10
 gravity = pygame.Vector2(0, 0.25)
 
 # Load MIDI file
-midi_file = MidiFile("midi/faded.mid")
+note_sequence = NoteSequence.load("midi/faded.mid")
 
 bounce_sound = pygame.mixer.Sound("sounds/BABABOI.mp3")
 
 # Font initialization
 font = pygame.font.Font(None, 36)
+text_cache = TextCache()
 
 class MiniBall:
     def __init__(self, color, initial_position, radius, velocity):
@@ -44,7 +54,7 @@ class MiniBall:
         self.prevPos = self.position.copy()
         self.radius = radius
         self.velocity = pygame.Vector2(velocity)
-        self.note_iterator = iter(midi_file)  # MIDI note iterator
+        self.note_cursor = note_sequence.cursor()  # Position in the song
         self.hue = 0  # Start hue at 0
         self.saturation = 1  # Full saturation
         self.value = 1  # Full value
@@ -70,28 +80,17 @@ class MiniBall:
         # self.hue = (self.hue + 2) % 360  # Increment hue and wrap around at 360
         # self.update_color()
 
-    def check_collision(self, big_mask, big_ball_rect):
-        mini_ball_rect = self.image.get_rect(center=(int(self.position.x), int(self.position.y)))
-        offset = (mini_ball_rect.left - big_ball_rect.left, mini_ball_rect.top - big_ball_rect.top)
-        if big_mask.overlap(self.mask, offset):
-            return True
-        return False
+    def check_collision(self, circles):
+        rings = [(circle.radius, circle.arc_width) for circle in circles]
+        return bool(annulus_hits(big_ball_center, rings, self.position, self.radius))
 
     def play_collision_note(self):
-        msg = next(self.note_iterator, None)
-        while msg and msg.type != "note_on":
-            msg = next(self.note_iterator, None)
-
-        if msg is None:
-            self.note_iterator = iter(midi_file)
-            msg = next(self.note_iterator, None)
-            while msg and msg.type != "note_on":
-                msg = next(self.note_iterator, None)
+        msg = self.note_cursor.next()
 
         if msg:
             velocity = 100  # Volume (0-127)
             pitch = msg.note + 14  # Transpose up one octave
-            midi_output.note_on(pitch, velocity)
+            note_scheduler.note_on(pitch, velocity, msg.duration)
 
     def bounce(self):
         # Calculate the collision point
@@ -122,35 +121,30 @@ class MiniBall:
     def draw(self, screen):
         screen.blit(self.image, (int(self.position.x) - self.radius, int(self.position.y) - self.radius))
 
+# Ring images by whole-pixel radius, rasterized once and recoloured on lookup
+ring_images = ArcCache()
+
 class BigCircle:
+    # Just a (radius, arc_width) record: collisions are tested against the
+    # radius and the image comes from ring_images
     def __init__(self, radius, color, shrink_rate, arc_width):
         self.radius = radius
         self.color = color
         self.shrink_rate = shrink_rate
         self.arc_width = arc_width
-        self.mask, self.image = self.create_mask_and_image()
-
-    def create_mask_and_image(self):
-        image = pygame.Surface((2 * self.radius, 2 * self.radius), pygame.SRCALPHA)
-        rect = image.get_rect()
-        pygame.draw.arc(image, self.color, rect, 0, 2 * math.pi, self.arc_width)
-        mask = pygame.mask.from_surface(image)
-        return mask, image
 
     def shrink(self):
         self.radius -= self.shrink_rate
-        self.mask, self.image = self.create_mask_and_image()
 
     def draw(self, screen, center):
-        screen.blit(self.image, (center[0] - self.radius, center[1] - self.radius))
+        radius = int(self.radius)
+        if radius <= 0:
+            return
+        _, image = ring_images.get(radius, self.color, self.arc_width, 0, 2 * math.pi)
+        screen.blit(image, (center[0] - radius, center[1] - radius))
 
 def drawText(text, font, color, surface, x, y, size=36, alpha=255):
-    font = pygame.font.Font(None, size)
-    textobj = font.render(text, True, color)
-    textobj.set_alpha(alpha)
-    textrect = textobj.get_rect()
-    textrect.center = (x, y)
-    surface.blit(textobj, textrect)
+    text_cache.draw(surface, text, size, color, (x, y), alpha)
 
 # Main loop
 clock = pygame.time.Clock()
@@ -176,9 +170,12 @@ timer = 0
 
 while True:
     clock.tick(60)
+    note_scheduler.update()
 
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
+            note_scheduler.flush()
+            audio_output.stop()
             pygame.quit()
             midi_output.close()
             sys.exit(0)
@@ -209,19 +206,12 @@ while True:
 
         circles = [circle for circle in circles if circle.radius > 0]
 
-        big_ball_mask = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
-        big_ball_rect = big_ball_mask.get_rect(center=big_ball_center)
-        big_ball_mask.fill((0, 0, 0, 0))
-
         for circle in circles:
             circle.shrink()
-            pygame.draw.arc(big_ball_mask, (255, 255, 255, 255), (big_ball_center[0] - circle.radius, big_ball_center[1] - circle.radius, 2 * circle.radius, 2 * circle.radius), 0, 2 * math.pi, arc_width)
-
-        big_ball_mask = pygame.mask.from_surface(big_ball_mask)
 
-        if mini_ball.check_collision(big_ball_mask, big_ball_rect):
+        if mini_ball.check_collision(circles):
             mini_ball.bounce()
-            bounce_sound.play()
+            audio_output.play(bounce_sound)
             # mini_ball.play_collision_note()
             circles.pop(0)
 
@@ -0,0 +1,41 @@
+import math
+import random
+
+from engine.swept import circle_in_circle_impact, reflect, sweep
+
+CENTER = (400, 400)
+RADIUS = 20
+CONTAINER = 250
+
+
+def impact(position, displacement):
+    return circle_in_circle_impact(position, displacement, RADIUS, CENTER, CONTAINER)
+
+
+def test_ball_on_rim_moving_inwards_hits_the_far_wall():
+    # Exactly on the wall, as a ball is right after a bounce
+    hit = circle_in_circle_impact((630, 400), (-1000, 0), RADIUS, CENTER, CONTAINER)
+    assert hit is not None
+    t, normal = hit
+    assert math.isclose(t, 0.46)
+    assert normal == (1.0, -0.0)
+
+
+def test_ball_on_rim_moving_outwards_hits_at_once():
+    assert circle_in_circle_impact((630, 400), (10, 0), RADIUS, CENTER, CONTAINER)[0] == 0.0
+
+
+def test_short_step_inside_misses():
+    assert circle_in_circle_impact((400, 400), (5, 5), RADIUS, CENTER, CONTAINER) is None
+
+
+def test_fast_balls_never_leave_the_container():
+    rng = random.Random(0)
+    limit = CONTAINER - RADIUS
+    for _ in range(2000):
+        angle, distance = rng.uniform(0, 2 * math.pi), rng.uniform(0, limit)
+        position = (CENTER[0] + distance * math.cos(angle), CENTER[1] + distance * math.sin(angle))
+        velocity = (rng.uniform(-3000, 3000), rng.uniform(-3000, 3000))
+        for _ in range(5):
+            position, velocity, _ = sweep(position, velocity, impact, lambda p, v, n: reflect(v, n), max_bounces=1000)
+            assert math.hypot(position[0] - CENTER[0], position[1] - CENTER[1]) <= limit + 1e-6
@@ -3,7 +3,13 @@ import sys
 import math
 import random
 import pygame.midi
-from mido import MidiFile
+from engine.notes import NoteSequence
+from engine.output import OutputWorker
+from engine.voices import NoteScheduler
+from engine import FixedStep
+from engine.particles import ParticlePool
+from engine.tails import TailCache
+from engine.text import TextCache
 
 # Initialize Pygame
 pygame.init()
@@ -12,6 +18,10 @@ output_device_id = 0
 midi_output = pygame.midi.Output(output_device_id)
 midi_output.set_instrument(38)
 
+# MIDI notes and sound effects are sent from a background thread
+audio_output = OutputWorker(midi_output)
+note_scheduler = NoteScheduler(audio_output)
+
 # Screen dimensions
 WIDTH, HEIGHT = 800, 800
 screen = pygame.display.set_mode((WIDTH, HEIGHT))
@@ -27,32 +37,17 @@ big_ball_center = (WIDTH // 2, HEIGHT // 2)
 gravity = pygame.Vector2(0, 0.25)
 
 # Load MIDI file
-midi_file = MidiFile("midi/imbluee.mid")
-midi_iterator = iter(midi_file)
+note_sequence = NoteSequence.load("midi/imbluee.mid")
+note_cursor = note_sequence.cursor()
 
 # Font initialization
 font = pygame.font.Font(None, 36)
+text_cache = TextCache()
 
-explode_sound = pygame.mixer.Sound("sounds/bum.wav")
-
-class Particle:
-    def __init__(self, position, velocity, color, lifespan):
-        self.position = pygame.Vector2(position)
-        self.velocity = pygame.Vector2(velocity)
-        self.color = color
-        self.lifespan = lifespan
-
-    def update(self):
-        self.position += self.velocity
-        self.lifespan -= 2
-        if self.lifespan < 0:
-            self.lifespan = 0
+# Faded tail sprites for MiniTriangle.draw_tail
+tail_cache = TailCache()
 
-    def draw(self, screen):
-        if self.lifespan > 0:
-            alpha = int(255 * (self.lifespan / 50))
-            color = self.color + (alpha,)
-            pygame.draw.circle(screen, color, (int(self.position.x), int(self.position.y)), 3)
+explode_sound = pygame.mixer.Sound("sounds/bum.wav")
 
 class MiniTriangle:
     def __init__(self, color, initial_position, side_length, velocity):
@@ -102,21 +97,12 @@ class MiniTriangle:
         return False, None
 
     def play_collision_note(self):
-        global midi_iterator
-        msg = next(midi_iterator, None)
-        while msg and msg.type != "note_on":
-            msg = next(midi_iterator, None)
-
-        if msg is None:
-            midi_iterator = iter(midi_file)
-            msg = next(midi_iterator, None)
-            while msg and msg.type != "note_on":
-                msg = next(midi_iterator, None)
+        msg = note_cursor.next()
 
         if msg:
             velocity = 100  # Volume (0-127)
             pitch = msg.note + 24  # Transpose up one octave
-            midi_output.note_on(pitch, velocity)
+            note_scheduler.note_on(pitch, velocity, msg.duration)
 
     def bounce(self, particles, normal):
         # Calculate the collision point
@@ -149,50 +135,32 @@ class MiniTriangle:
         self.velocity = self.velocity.reflect(direction.normalize())
 
     def draw_tail(self, screen):
-        tail_length = len(self.tail)
-        for i in range(tail_length):
-            alpha = int(200 * (i / tail_length))  # Fading effect
-            tail_color = (*self.color[:3], alpha)
-            tail_surface = pygame.Surface((2 * self.side_length, 2 * self.side_length), pygame.SRCALPHA)
-            pygame.draw.polygon(tail_surface, tail_color, [(self.side_length, 0), (0, 2 * self.side_length), (2 * self.side_length, 2 * self.side_length)])
-            screen.blit(tail_surface, (self.tail[i].x - self.side_length, self.tail[i].y - self.side_length))
+        tail_cache.draw(screen, "triangle", self.side_length, self.color, self.tail, 200)
 
     def createParticles(self, collision_point, particles):
-        num_particles = 10
-        for _ in range(num_particles):
-            velocity = pygame.Vector2(random.uniform(-3, 3), random.uniform(-3, 3))
-            color = (random.randint(200, 255), random.randint(100, 255), random.randint(100, 255))
-            lifespan = random.randint(30, 50)
-            particles.append(Particle(collision_point, velocity, color, lifespan))
+        particles.emit(collision_point, 10, 3)
 
     def createExplosion(self, particles):
-        num_particles = 50  # Number of particles in the explosion
-        for _ in range(num_particles):
-            velocity = pygame.Vector2(random.uniform(-5, 5), random.uniform(-5, 5))
-            color = (random.randint(200, 255), random.randint(100, 255), random.randint(100, 255))
-            lifespan = random.randint(30, 50)
-            particles.append(Particle(self.position, velocity, color, lifespan))
+        particles.emit(self.position, 50, 5)
 
     def update_color(self, h):
         self.color.hsla = (h, self.saturation, self.lightness, 100)
         self.update_image()
 
-    def draw(self, screen, timer=0, isStationary=False):
+    def draw(self, screen, timer=0, isStationary=False, interpolation=1.0):
+        # Draw between the last two physics steps so motion stays smooth
+        position = self.prevPos.lerp(self.position, interpolation)
         self.draw_tail(screen)
-        screen.blit(self.image, (int(self.position.x) - self.side_length, int(self.position.y) - self.side_length))
+        screen.blit(self.image, (int(position.x) - self.side_length, int(position.y) - self.side_length))
         remaining_time = 7 - self.elapsed_time
         if remaining_time > 4:
-            drawText(str(int(remaining_time)), font, WHITE, screen, int(self.position.x), int(self.position.y - 40), 45)
+            drawText(str(int(remaining_time)), font, WHITE, screen, int(position.x), int(position.y - 40), 45)
         else:
-            drawText(str(int(remaining_time)), font, (255, 0, 0), screen, int(self.position.x), int(self.position.y - 40), 45)
-        pygame.draw.polygon(screen, WHITE, [(self.position.x, self.position.y - self.side_length), (self.position.x - self.side_length, self.position.y + self.side_length), (self.position.x + self.side_length, self.position.y + self.side_length)], 4)
+            drawText(str(int(remaining_time)), font, (255, 0, 0), screen, int(position.x), int(position.y - 40), 45)
+        pygame.draw.polygon(screen, WHITE, [(position.x, position.y - self.side_length), (position.x - self.side_length, position.y + self.side_length), (position.x + self.side_length, position.y + self.side_length)], 4)
 
 def drawText(text, font, color, surface, x, y, size=36, alpha=255):
-    textobj = font.render(text, True, color)
-    textobj.set_alpha(alpha)
-    textrect = textobj.get_rect()
-    textrect.center = (x, y)
-    surface.blit(textobj, textrect)
+    text_cache.draw(surface, text, font, color, (x, y), alpha)
 
 # Create the big ball mask with an arc and a customizable gap
 def create_big_ball_mask(radius, hue, arc_width=10, start_angle=0.5, end_angle=2 * math.pi):
@@ -224,7 +192,7 @@ colorDir = 1
 # Start with one mini triangle
 mini_triangles = [MiniTriangle((color.r, color.g, color.b), (WIDTH / 2 -10, HEIGHT / 2 - 90), side_length=20, velocity=[-4, -4])]
 stationary_triangles = []
-particles = []
+particles = ParticlePool()
 
 running = False
 
@@ -235,11 +203,21 @@ angle_increment = 0.02
 hue1 = 200
 hue_increment = 1
 
+big_ball_mask, big_ball_image = create_big_ball_mask(big_ball_radius, hue1, 10, start_angle, end_angle)
+big_ball_rect = big_ball_image.get_rect(center=big_ball_center)
+
+# Physics runs in fixed 1/60 s steps whatever the frame rate, drawing
+# interpolates between the last two steps
+sim_clock = FixedStep(1 / 60)
+
 while True:
-    dt = clock.tick(60) / 1000.0
+    frame_time = clock.tick(60) / 1000.0  # Wall-clock length of the last frame
+    note_scheduler.update()
 
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
+            note_scheduler.flush()
+            audio_output.stop()
             pygame.quit()
             midi_output.close()
             sys.exit(0)
@@ -248,64 +226,63 @@ while True:
                 running = True
 
     if running:
-        hue1 = (hue1 + hue_increment) % 360
-
-        # Update angles to create spinning effect
-        start_angle += angle_increment
-        end_angle += angle_increment
-
-        # Changing color effect
-        color.hsla = (h, s, l, 100)
-        h += 2 * colorDir
-        if h >= 360:
-            h = 359  # Keep h in bounds
-            colorDir = -1
-        elif h <= 0:
-            h = 1
-            colorDir = 1
+        for _ in range(sim_clock.advance(frame_time)):
+            dt = sim_clock.step
 
-        for mini_triangle in mini_triangles:
-            mini_triangle.update_color(h)
-            mini_triangle.move(dt)   
-
-            big_ball_mask, big_ball_image = create_big_ball_mask(big_ball_radius, hue1, 10, start_angle, end_angle)
-            big_ball_rect = big_ball_image.get_rect(center=big_ball_center)
-
-            if mini_triangle.check_collision(big_ball_mask, big_ball_rect):
-                normal = (mini_triangle.position - pygame.Vector2(big_ball_center)).normalize()
-                mini_triangle.bounce(particles, normal)
-                mini_triangle.play_collision_note()
-
-            # Check if the triangle is out of bounds
-            if mini_triangle.position.x < 0 or mini_triangle.position.x > WIDTH or mini_triangle.position.y < 0 or mini_triangle.position.y > HEIGHT:
-                mini_triangles.remove(mini_triangle)
-                break
-                
-            if mini_triangle.elapsed_time >= 6:
-                mini_triangle.createExplosion(particles)  # Create explosion particles
-                explode_sound.play()
-                mini_triangles.remove(mini_triangle)  # Remove the ball from the list
-                break
-
-            # Update and draw particles
-            for particle in particles:
-                particle.update()
-            particles = [particle for particle in particles if particle.lifespan > 0]
-
-            # Draw everything
-            screen.fill(BLACK)
-            screen.blit(big_ball_image, big_ball_rect.topleft)
+            hue1 = (hue1 + hue_increment) % 360
+
+            # Update angles to create spinning effect
+            start_angle += angle_increment
+            end_angle += angle_increment
+
+            # Changing color effect
+            color.hsla = (h, s, l, 100)
+            h += 2 * colorDir
+            if h >= 360:
+                h = 359  # Keep h in bounds
+                colorDir = -1
+            elif h <= 0:
+                h = 1
+                colorDir = 1
 
             for mini_triangle in mini_triangles:
-                mini_triangle.draw(screen)
+                mini_triangle.update_color(h)
+                mini_triangle.move(dt)
+
+                big_ball_mask, big_ball_image = create_big_ball_mask(big_ball_radius, hue1, 10, start_angle, end_angle)
+                big_ball_rect = big_ball_image.get_rect(center=big_ball_center)
+
+                if mini_triangle.check_collision(big_ball_mask, big_ball_rect):
+                    normal = (mini_triangle.position - pygame.Vector2(big_ball_center)).normalize()
+                    mini_triangle.bounce(particles, normal)
+                    mini_triangle.play_collision_note()
+
+                # Check if the triangle is out of bounds
+                if mini_triangle.position.x < 0 or mini_triangle.position.x > WIDTH or mini_triangle.position.y < 0 or mini_triangle.position.y > HEIGHT:
+                    mini_triangles.remove(mini_triangle)
+                    break
 
-            for particle in particles:
-                particle.draw(screen)
+                if mini_triangle.elapsed_time >= 6:
+                    mini_triangle.createExplosion(particles)  # Create explosion particles
+                    audio_output.play(explode_sound)
+                    mini_triangles.remove(mini_triangle)  # Remove the ball from the list
+                    break
+
+            # Update particles
+            particles.update()
+
+            # Spawn a new triangle if the list is empty
+            if not mini_triangles:
+                triangle_color = (random.randint(0, 255), random.randint(0, 255), random.randint(0, 255))
+                mini_triangles.append(MiniTriangle(triangle_color, random_point_in_circle(big_ball_radius - 150, big_ball_center), side_length=20, velocity=[-4, -4]))
+
+        # Draw everything
+        screen.fill(BLACK)
+        screen.blit(big_ball_image, big_ball_rect.topleft)
+
+        for mini_triangle in mini_triangles:
+            mini_triangle.draw(screen, interpolation=sim_clock.alpha)
 
-        # Spawn a new triangle if the list is empty
-        if not mini_triangles:
-            triangle_color = (random.randint(0, 255), random.randint(0, 255), random.randint(0, 255))
-            mini_triangles.append(MiniTriangle(triangle_color, random_point_in_circle(big_ball_radius - 150, big_ball_center), side_length=20, velocity=[-4, -4]))
-            timer = 0
+        particles.draw(screen)
 
         pygame.display.flip()
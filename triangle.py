@@ -3,7 +3,15 @@ import sys
 import math
 import random
 import pygame.midi
-from mido import MidiFile
+from engine.notes import NoteSequence
+from engine.output import OutputWorker
+from engine.voices import NoteScheduler
+from engine import SpatialHash
+from engine.arc_cache import ArcCache
+from engine.hue import hue_color
+from engine.tails import TailCache
+from engine.text import TextCache
+from engine.particles import ParticlePool
 
 # Initialize Pygame
 pygame.init()
@@ -12,6 +20,10 @@ output_device_id = 0
 midi_output = pygame.midi.Output(output_device_id)
 midi_output.set_instrument(38)
 
+# MIDI notes are sent from a background thread
+audio_output = OutputWorker(midi_output)
+note_scheduler = NoteScheduler(audio_output)
+
 # Screen dimensions
 WIDTH, HEIGHT = 800, 800
 screen = pygame.display.set_mode((WIDTH, HEIGHT))
@@ -27,30 +39,15 @@ big_ball_center = (WIDTH // 2, HEIGHT // 2)
 gravity = pygame.Vector2(0, 0.25)
 
 # Load MIDI file
-midi_file = MidiFile("midi/kerosene12.mid")
-midi_iterator = iter(midi_file)
+note_sequence = NoteSequence.load("midi/kerosene12.mid")
+note_cursor = note_sequence.cursor()
 
 # Font initialization
 font = pygame.font.Font(None, 36)
+text_cache = TextCache()
 
-class Particle:
-    def __init__(self, position, velocity, color, lifespan):
-        self.position = pygame.Vector2(position)
-        self.velocity = pygame.Vector2(velocity)
-        self.color = color
-        self.lifespan = lifespan
-
-    def update(self):
-        self.position += self.velocity
-        self.lifespan -= 2
-        if self.lifespan < 0:
-            self.lifespan = 0
-
-    def draw(self, screen):
-        if self.lifespan > 0:
-            alpha = int(255 * (self.lifespan / 50))
-            color = self.color + (alpha,)
-            pygame.draw.circle(screen, color, (int(self.position.x), int(self.position.y)), 3)
+# Faded tail sprites for MiniTriangle.draw_tail
+tail_cache = TailCache()
 
 class MiniTriangle:
     def __init__(self, color, initial_position, side_length, velocity):
@@ -90,29 +87,20 @@ class MiniTriangle:
             return True
         return False
 
-    def check_collision_with_stationary(self, stationary_triangles):
-        for triangle in stationary_triangles:
+    def check_collision_with_stationary(self, stationary_index):
+        for triangle in stationary_index.query(self.position, self.side_length):
             distance = self.position.distance_to(triangle.position)
             if distance <= self.side_length + triangle.side_length:
                 return True, triangle
         return False, None
 
     def play_collision_note(self):
-        global midi_iterator
-        msg = next(midi_iterator, None)
-        while msg and msg.type != "note_on":
-            msg = next(midi_iterator, None)
-
-        if msg is None:
-            midi_iterator = iter(midi_file)
-            msg = next(midi_iterator, None)
-            while msg and msg.type != "note_on":
-                msg = next(midi_iterator, None)
+        msg = note_cursor.next()
 
         if msg:
             velocity = 100  # Volume (0-127)
             pitch = msg.note + 10  # Transpose up one octave
-            midi_output.note_on(pitch, velocity)
+            note_scheduler.note_on(pitch, velocity, msg.duration)
 
     def bounce(self, particles, normal):
         # Calculate the collision point
@@ -145,21 +133,10 @@ class MiniTriangle:
         self.velocity = self.velocity.reflect(direction.normalize())
 
     def draw_tail(self, screen):
-        tail_length = len(self.tail)
-        for i in range(tail_length):
-            alpha = int(128 * (i / tail_length))  # Fading effect
-            tail_color = (*self.color[:3], alpha)
-            tail_surface = pygame.Surface((2 * self.side_length, 2 * self.side_length), pygame.SRCALPHA)
-            pygame.draw.polygon(tail_surface, tail_color, [(self.side_length, 0), (0, 2 * self.side_length), (2 * self.side_length, 2 * self.side_length)])
-            screen.blit(tail_surface, (self.tail[i].x - self.side_length, self.tail[i].y - self.side_length))
+        tail_cache.draw(screen, "triangle", self.side_length, self.color, self.tail, 128)
 
     def createParticles(self, collision_point, particles):
-        num_particles = 20
-        for _ in range(num_particles):
-            velocity = pygame.Vector2(random.uniform(-3, 3), random.uniform(-3, 3))
-            color = (random.randint(200, 255), random.randint(100, 255), random.randint(100, 255))
-            lifespan = random.randint(30, 50)
-            particles.append(Particle(collision_point, velocity, color, lifespan))
+        particles.emit(collision_point, 20, 3)
 
     def update_color(self, h):
         self.color.hsla = (h, self.saturation, self.lightness, 100)
@@ -175,21 +152,15 @@ class MiniTriangle:
         pygame.draw.polygon(screen, WHITE, [(self.position.x, self.position.y - self.side_length), (self.position.x - self.side_length, self.position.y + self.side_length), (self.position.x + self.side_length, self.position.y + self.side_length)], 3)
 
 def drawText(text, font, color, surface, x, y, size=36, alpha=255):
-    textobj = font.render(text, True, color)
-    textobj.set_alpha(alpha)
-    textrect = textobj.get_rect()
-    textrect.center = (x, y)
-    surface.blit(textobj, textrect)
+    text_cache.draw(surface, text, font, color, (x, y), alpha)
+
+# The spinning arc only visits a fixed set of angles: each one is rasterized
+# once in white and coloured through the palette on lookup
+arc_cache = ArcCache(angle_step=0.02)
 
 # Create the big ball mask with an arc and a customizable gap
 def create_big_ball_mask(radius, hue, arc_width=10, start_angle=0.5, end_angle=2 * math.pi):
-    color = pygame.Color(0)
-    color.hsla = (hue, 100, 50, 100)
-    image = pygame.Surface((2 * radius, 2 * radius), pygame.SRCALPHA)
-    rect = image.get_rect()
-    pygame.draw.arc(image, color, rect, start_angle, end_angle, arc_width)
-    mask = pygame.mask.from_surface(image)
-    return mask, image
+    return arc_cache.get(radius, hue_color(hue), arc_width, start_angle, end_angle)
 
 # Main loop
 clock = pygame.time.Clock()
@@ -204,7 +175,14 @@ colorDir = 1
 # Start with one mini triangle
 mini_triangles = [MiniTriangle((color.r, color.g, color.b), (WIDTH / 2 -10, HEIGHT / 2 - 90), side_length=20, velocity=[-4, -4])]
 stationary_triangles = []
-particles = []
+stationary_index = SpatialHash()  # Grid of stationary_triangles for collision lookups
+
+# Freeze a triangle in place and make it an obstacle for the moving ones
+def freeze(triangle):
+    stationary_triangles.append(triangle)
+    stationary_index.insert(triangle, triangle.position, triangle.side_length)
+
+particles = ParticlePool()
 
 running = False
 
@@ -219,9 +197,12 @@ hue_increment = 1
 
 while True:
     clock.tick(60)
+    note_scheduler.update()
 
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
+            note_scheduler.flush()
+            audio_output.stop()
             pygame.quit()
             midi_output.close()
             sys.exit(0)
@@ -233,7 +214,7 @@ while True:
         timer += clock.get_time() / 1000
 
         if timer >= 3:
-            stationary_triangles.append(mini_triangles.pop())
+            freeze(mini_triangles.pop())
             triangle_color = (random.randint(0, 255), random.randint(0, 255), random.randint(0, 255))
             mini_triangles.append(MiniTriangle(triangle_color, (WIDTH / 2 - 10, HEIGHT / 2 - 90), side_length=20, velocity=[-4, -4]))
             timer = 0
@@ -266,7 +247,7 @@ while True:
                 mini_triangle.bounce(particles, normal)
                 # mini_triangle.play_collision_note()
 
-            collision, stationary_triangle = mini_triangle.check_collision_with_stationary(stationary_triangles)
+            collision, stationary_triangle = mini_triangle.check_collision_with_stationary(stationary_index)
             if collision:
                 mini_triangle.resolve_collision_with_stationary(stationary_triangle)
                 # mini_triangle.play_collision_note()
@@ -277,9 +258,7 @@ while True:
                 break
 
             # Update and draw particles
-            for particle in particles:
-                particle.update()
-            particles = [particle for particle in particles if particle.lifespan > 0]
+            particles.update()
 
             # Draw everything
             screen.fill(BLACK)
@@ -291,8 +270,7 @@ while True:
             for mini_triangle in mini_triangles:
                 mini_triangle.draw(screen, timer)
 
-            for particle in particles:
-                particle.draw(screen)
+            particles.draw(screen)
 
         # Spawn a new triangle if the list is empty
         if not mini_triangles: